@@ -0,0 +1,334 @@
+import json
+import os
+import socket
+import threading
+import time
+
+import numpy as np
+
+from instrument import timed
+
+
+# A rule is a plain dict:
+#   name         unique id, also the dedup key together with the host
+#   metric       a sampler field, e.g. 'cpu' or 'disk_read'
+#   window       seconds of samples to aggregate
+#   aggregation  one of AGGREGATIONS
+#   op           '>' (too high) or '<' (too low)
+#   threshold    fires once the aggregate has been past this for `for` seconds
+#   for          seconds the condition must hold before firing (0 fires on the first breach)
+#   clear        resolves only once the aggregate is back past this; defaults to threshold
+#   severity     free-form label passed through to notifications
+DEFAULT_RULES = [
+    {'name': 'cpu_high', 'metric': 'cpu', 'window': 60, 'aggregation': 'avg', 'op': '>', 'threshold': 90,
+     'for': 120, 'clear': 75, 'severity': 'critical'},
+    {'name': 'cpu_busy', 'metric': 'cpu', 'window': 300, 'aggregation': 'p95', 'op': '>', 'threshold': 75,
+     'for': 300, 'clear': 60, 'severity': 'warning'},
+    {'name': 'memory_high', 'metric': 'memory', 'window': 60, 'aggregation': 'min', 'op': '>', 'threshold': 90,
+     'for': 60, 'clear': 85, 'severity': 'critical'},
+    {'name': 'disk_read_saturated', 'metric': 'disk_read', 'window': 120, 'aggregation': 'avg', 'op': '>', 'threshold': 400,
+     'for': 120, 'clear': 300, 'severity': 'warning'},
+    {'name': 'disk_write_saturated', 'metric': 'disk_write', 'window': 120, 'aggregation': 'avg', 'op': '>', 'threshold': 400,
+     'for': 120, 'clear': 300, 'severity': 'warning'},
+    {'name': 'network_upload_high', 'metric': 'net_sent', 'window': 120, 'aggregation': 'avg', 'op': '>', 'threshold': 80,
+     'for': 120, 'clear': 50, 'severity': 'warning'},
+]
+
+AGGREGATIONS = ('avg', 'min', 'max', 'last', 'p95')
+
+# alerts.log goes here unless ANALYZER_ALERT_LOG names a file: $ANALYZER_DATA_DIR, or data/
+# next to this module, not wherever the dashboard happened to be started
+DATA_DIR = os.environ.get('ANALYZER_DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
+OPS = {'>': 1.0, '<': -1.0}
+
+OK, PENDING, FIRING = 0, 1, 2
+
+
+def load_rules(path=None):
+    # JSON list of rule dicts; ANALYZER_ALERT_RULES names the file, otherwise the defaults
+    path = path or os.environ.get('ANALYZER_ALERT_RULES')
+    if not path:
+        return [dict(rule) for rule in DEFAULT_RULES]
+    with open(path) as f:
+        return json.load(f)
+
+
+def _aggregate(values, aggregation):
+    # values: (n, fields) -> (fields,); an empty window is NaN
+    if not len(values):
+        return np.full(values.shape[1], np.nan)
+    if aggregation == 'avg':
+        return values.mean(axis=0)
+    if aggregation == 'min':
+        return values.min(axis=0)
+    if aggregation == 'max':
+        return values.max(axis=0)
+    if aggregation == 'last':
+        return values[-1]
+    return np.percentile(values, 95, axis=0)
+
+
+class RuleSet:
+    # Rules compiled to parallel arrays. evaluate() computes each distinct (window,
+    # aggregation) once across every field, gathers each rule's value from that table and
+    # steps all state machines together; the cost per tick barely depends on the rule count.
+
+    def __init__(self, rules, fields):
+        names = [rule['name'] for rule in rules]
+        if len(set(names)) != len(names):
+            raise ValueError("alert rule names must be unique")
+        for rule in rules:
+            if rule['metric'] not in fields:
+                raise ValueError(f"alert rule {rule['name']!r}: unknown metric {rule['metric']!r}")
+            if rule.get('aggregation', 'avg') not in AGGREGATIONS:
+                raise ValueError(f"alert rule {rule['name']!r}: aggregation must be one of {AGGREGATIONS}")
+            if rule.get('op', '>') not in OPS:
+                raise ValueError(f"alert rule {rule['name']!r}: op must be '>' or '<'")
+            if OPS[rule.get('op', '>')] * (rule.get('clear', rule['threshold']) - rule['threshold']) > 0:
+                raise ValueError(f"alert rule {rule['name']!r}: clear must not be past the threshold")
+
+        self.rules = [dict(rule) for rule in rules]
+        self.fields = tuple(fields)
+        self.metric = np.array([self.fields.index(rule['metric']) for rule in rules], dtype=np.intp)
+        self.sign = np.array([OPS[rule.get('op', '>')] for rule in rules])
+        self.threshold = np.array([rule['threshold'] for rule in rules], dtype=np.float64)
+        self.clear = np.array([rule.get('clear', rule['threshold']) for rule in rules], dtype=np.float64)
+        self.hold = np.array([rule.get('for', 0) for rule in rules], dtype=np.float64)
+        self.window = max((rule.get('window', 60) for rule in rules), default=0)
+
+        # Distinct (window, aggregation) pairs, and which one each rule reads
+        pairs = sorted({(rule.get('window', 60), rule.get('aggregation', 'avg')) for rule in rules})
+        self.pairs = pairs
+        self.pair = np.array([pairs.index((rule.get('window', 60), rule.get('aggregation', 'avg'))) for rule in rules],
+                             dtype=np.intp)
+
+        n = len(rules)
+        self.state = np.zeros(n, dtype=np.int8)
+        self.since = np.full(n, np.nan)  # start of the current breach
+        self.value = np.full(n, np.nan)
+
+    def __len__(self):
+        return len(self.rules)
+
+    def evaluate(self, times, values, now):
+        # times: (n,) ascending; values: (n, fields). Returns (fired, resolved) rule indices.
+        table = np.empty((len(self.pairs), len(self.fields)))
+        for i, (window, aggregation) in enumerate(self.pairs):
+            start = np.searchsorted(times, now - window, side='right')
+            table[i] = _aggregate(values[start:], aggregation)
+        value = table[self.pair, self.metric]
+        self.value = value
+
+        # NaN (no samples in the window) neither breaches nor recovers, so state holds
+        with np.errstate(invalid='ignore'):
+            breach = self.sign * value > self.sign * self.threshold
+            recovered = self.sign * value < self.sign * self.clear
+        firing = self.state == FIRING
+
+        self.since = np.where(breach, np.where(np.isnan(self.since), now, self.since), np.nan)
+        fired = ~firing & breach & (now - self.since >= self.hold)
+        resolved = firing & recovered
+
+        state = np.where(breach, PENDING, OK)
+        state[firing & ~resolved] = FIRING
+        state[fired] = FIRING
+        self.state = state.astype(np.int8)
+        return np.flatnonzero(fired), np.flatnonzero(resolved)
+
+    def active(self):
+        return [self.rules[i]['name'] for i in np.flatnonzero(self.state == FIRING)]
+
+
+class RateLimiter:
+    # Token bucket: `rate` sends per minute on average, up to `burst` back to back
+
+    def __init__(self, rate=6, burst=3):
+        self.rate = rate / 60.0
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+
+    def allow(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            return True
+        return False
+
+
+class LogFileSink:
+    # One JSON line per alert event
+
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, events):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, 'a') as f:
+            f.write(''.join(json.dumps(event, sort_keys=True) + '\n' for event in events))
+
+
+class WebhookSink:
+    # POSTs {"alerts": [...]} as JSON, one request per batch
+
+    def __init__(self, url, timeout=5.0):
+        import requests
+
+        self.url = url
+        self.timeout = timeout
+        self._session = requests.Session()
+
+    def send(self, events):
+        response = self._session.post(self.url, json={'alerts': events}, timeout=self.timeout)
+        response.raise_for_status()
+
+
+class Notifier:
+    # Collects alert events and hands them to each sink in batches, at most every
+    # `batch_interval` seconds and within each sink's rate limit. Events are keyed by
+    # (rule, host, state), so repeats waiting in the queue collapse into the latest one
+    # and a rate-limited or failing sink holds at most one event per key.
+
+    def __init__(self, sinks, batch_interval=5.0, rate=6, burst=3):
+        self.sinks = list(sinks)
+        self.batch_interval = batch_interval
+        self._pending = [{} for _ in self.sinks]
+        self._limits = [RateLimiter(rate, burst) for _ in self.sinks]
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.sent = 0
+        self.failures = 0
+
+    def submit(self, events):
+        with self._lock:
+            for pending in self._pending:
+                for event in events:
+                    pending[(event['rule'], event['host'], event['state'])] = event
+
+    def flush(self):
+        for sink, pending, limit in zip(self.sinks, self._pending, self._limits):
+            with self._lock:
+                if not pending or not limit.allow():
+                    continue
+                events = sorted(pending.values(), key=lambda event: event['time'])
+                pending.clear()
+            try:
+                sink.send(events)
+                self.sent += len(events)
+            except Exception:
+                # Keep them for the next flush unless something newer for the same key arrived
+                self.failures += 1
+                with self._lock:
+                    for event in events:
+                        pending.setdefault((event['rule'], event['host'], event['state']), event)
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="alert-notifier", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.batch_interval):
+            self.flush()
+
+
+def make_notifier(log_path=None, webhook=None, **kwargs):
+    # ANALYZER_ALERT_LOG (default DATA_DIR/alerts.log) and, if set, ANALYZER_ALERT_WEBHOOK
+    sinks = [LogFileSink(log_path or os.environ.get('ANALYZER_ALERT_LOG', os.path.join(DATA_DIR, 'alerts.log')))]
+    webhook = webhook or os.environ.get('ANALYZER_ALERT_WEBHOOK')
+    if webhook:
+        sinks.append(WebhookSink(webhook))
+    return Notifier(sinks, **kwargs)
+
+
+class AlertEngine:
+    # Follows a sampler's ring in the background and evaluates every rule once per tick.
+    # Time is the samples' own timestamps, so `for` durations hold for replayed data too.
+
+    def __init__(self, sampler, rules=None, notifier=None, interval=None, host=None):
+        self.sampler = sampler
+        self.interval = interval or getattr(sampler, 'interval', 1.0)
+        self.host = host or socket.gethostname()
+        fields = [field for field in sampler.buffer.fields if field != 'time']
+        self.rules = RuleSet(load_rules() if rules is None else rules, fields)
+        self.notifier = make_notifier() if notifier is None else notifier
+        self._columns = [sampler.buffer.fields.index(field) for field in fields]
+        self._time = sampler.buffer.fields.index('time')
+        self._last_time = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @timed
+    def evaluate(self):
+        sample_interval = getattr(self.sampler, 'interval', 1.0) or 1.0
+        rows = self.sampler.buffer.last(int(self.rules.window / sample_interval) + 2)
+        if not len(rows):
+            return []
+        now = float(rows[-1, self._time])
+        if now <= self._last_time:
+            return []
+        self._last_time = now
+
+        fired, resolved = self.rules.evaluate(rows[:, self._time], rows[:, self._columns], now)
+        events = [self._event(i, 'firing', now) for i in fired.tolist()]
+        events += [self._event(i, 'resolved', now) for i in resolved.tolist()]
+        if events:
+            self.notifier.submit(events)
+        return events
+
+    def _event(self, i, state, now):
+        rule = self.rules.rules[i]
+        value = float(self.rules.value[i])
+        threshold = rule['threshold'] if state == 'firing' else rule.get('clear', rule['threshold'])
+        verb = 'above' if rule.get('op', '>') == '>' else 'below'
+        if state == 'resolved':
+            verb = 'below' if verb == 'above' else 'above'
+        return {
+            'rule': rule['name'],
+            'host': self.host,
+            'state': state,
+            'severity': rule.get('severity', 'warning'),
+            'metric': rule['metric'],
+            'value': round(value, 3),
+            'threshold': threshold,
+            'time': now,
+            'message': f"{rule['metric']} {rule.get('aggregation', 'avg')} over {rule.get('window', 60)}s "
+                       f"is {value:.1f}, {verb} {threshold}",
+        }
+
+    def start(self):
+        if self._thread is None:
+            self.notifier.start()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="alert-engine", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.notifier.stop()
+
+    def _run(self):
+        while True:
+            try:
+                self.evaluate()
+            except Exception:
+                # A bad tick must not stop alerting; the next one retries
+                pass
+            if self._stop.wait(self.interval):
+                break
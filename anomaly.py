@@ -0,0 +1,238 @@
+import threading
+import time
+
+import numpy as np
+
+
+HOST_FEATURES = ('cpu', 'memory', 'disk_read', 'disk_write', 'net_sent', 'net_recv')
+PROCESS_FEATURES = ('cpu_percent', 'memory_percent', 'read_bytes_per_sec', 'write_bytes_per_sec', 'ctx_switches_per_sec')
+
+# Smallest spread each feature's baseline may have (%, %, MB/s, MB/s, MB/s, MB/s)
+HOST_FLOOR = (1.0, 0.5, 0.5, 0.5, 0.1, 0.1)
+# (%, %, B/s, B/s, switches/s)
+PROCESS_FLOOR = (1.0, 0.1, 65536.0, 65536.0, 10.0)
+
+# Robust z-score cutoffs for the severity labels
+SEVERITY_LEVELS = ((6.0, 'critical'), (4.0, 'high'), (3.0, 'warning'))
+
+# Mean absolute deviation * this ~ standard deviation for normal data
+MAD_TO_SIGMA = 1.2533
+
+
+def severity_label(score):
+    for cutoff, label in SEVERITY_LEVELS:
+        if score >= cutoff:
+            return label
+    return None
+
+
+class _Baseline:
+    # Per-entity, per-feature streaming state; every array is (entities, features)
+
+    def __init__(self, n_entities, n_features):
+        shape = (n_entities, n_features)
+        self.count = np.zeros(n_entities, dtype=np.int64)
+        self.mean = np.zeros(shape)
+        self.var = np.zeros(shape)
+        self.median = np.zeros(shape)
+        self.mad = np.zeros(shape)
+
+    def take(self, index):
+        # Reorder to the incoming ids; entities with index -1 are new and start empty
+        out = _Baseline(0, self.mean.shape[1])
+        keep = index >= 0
+        for name in ('count', 'mean', 'var', 'median', 'mad'):
+            current = getattr(self, name)
+            fresh = np.zeros((len(index),) + current.shape[1:], dtype=current.dtype)
+            fresh[keep] = current[index[keep]]
+            setattr(out, name, fresh)
+        return out
+
+    def scale(self, floor):
+        return np.maximum(self.mad * MAD_TO_SIGMA, floor)
+
+    def update(self, X, alpha, eta, floor, clip):
+        first = self.count == 0
+        self.mean[first] = X[first]
+        self.median[first] = X[first]
+
+        # Winsorize around the current median so a single spike barely moves the baseline
+        scale = self.scale(floor)
+        X = np.clip(X, self.median - clip * scale, self.median + clip * scale)
+
+        delta = X - self.mean
+        self.mean += alpha * delta
+        self.var = (1 - alpha) * (self.var + alpha * delta * delta)
+
+        # Stochastic-approximation median, step proportional to the current spread
+        self.median += eta * scale * np.sign(X - self.median)
+        self.mad += alpha * (np.abs(X - self.median) - self.mad)
+        self.count += 1
+
+
+class AnomalyDetector:
+    # EWMA mean/variance plus a streaming median and absolute deviation for every
+    # (entity, feature); each update is O(1) per value and vectorized across the matrix.
+    # With seasonal=True a separate baseline is kept per hour of day and used once warm.
+
+    def __init__(self, features, alpha=0.02, eta=0.05, warmup=30, seasonal=False, clip=5.0, floor=None):
+        self.features = tuple(features)
+        self.alpha = alpha
+        self.eta = eta
+        self.warmup = warmup
+        self.seasonal = seasonal
+        self.clip = clip
+        # Minimum spread per feature so a perfectly flat metric doesn't make every blip infinite
+        self.floor = np.full(len(self.features), 1e-3) if floor is None else np.asarray(floor, dtype=np.float64)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self._global = _Baseline(0, len(self.features))
+        self._hourly = [_Baseline(0, len(self.features)) for _ in range(24)] if seasonal else None
+
+    def _align(self, ids):
+        if len(ids) == len(self.ids) and np.array_equal(ids, self.ids):
+            return
+        # Map each incoming id to its row in the previous state (-1 if it is new)
+        if len(self.ids):
+            order = np.argsort(self.ids)
+            sorted_ids = self.ids[order]
+            pos = np.clip(np.searchsorted(sorted_ids, ids), 0, len(sorted_ids) - 1)
+            index = np.where(sorted_ids[pos] == ids, order[pos], -1)
+        else:
+            index = np.full(len(ids), -1)
+
+        self._global = self._global.take(index)
+        if self.seasonal:
+            self._hourly = [baseline.take(index) for baseline in self._hourly]
+        self.ids = np.array(ids, dtype=np.int64)
+
+    def update(self, X, ids=None, now=None):
+        # Scores X against the baseline learned so far, then folds X into it.
+        # Returns (robust z per value, severity per entity); both are 0 during warm-up.
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        ids = np.zeros(1, dtype=np.int64) if ids is None else np.asarray(ids, dtype=np.int64)
+        self._align(ids)
+
+        baseline = self._global
+        hourly = None
+        if self.seasonal:
+            hour = time.localtime(time.time() if now is None else now).tm_hour
+            hourly = self._hourly[hour]
+
+        center = baseline.median.copy()
+        spread = baseline.scale(self.floor)
+        warm = baseline.count >= self.warmup
+        if hourly is not None:
+            # Prefer the time-of-day baseline wherever it has enough history of its own
+            seasonal_warm = hourly.count >= self.warmup
+            center[seasonal_warm] = hourly.median[seasonal_warm]
+            spread[seasonal_warm] = hourly.scale(self.floor)[seasonal_warm]
+
+        z = np.where(warm[:, None], (X - center) / spread, 0.0)
+        # Only excess load counts as a bottleneck; an idle resource is not an anomaly
+        severity = np.maximum(z, 0.0).max(axis=1) if z.size else np.zeros(len(ids))
+
+        baseline.update(X, self.alpha, self.eta, self.floor, self.clip)
+        if hourly is not None:
+            hourly.update(X, self.alpha, self.eta, self.floor, self.clip)
+        return z, severity
+
+    def baseline(self, index=0):
+        # Learned center and spread for one entity, keyed by feature
+        return {feature: (float(self._global.median[index, i]), float(self._global.scale(self.floor)[index, i]))
+                for i, feature in enumerate(self.features)}
+
+    def warm(self, index=0):
+        return len(self._global.count) > index and self._global.count[index] >= self.warmup
+
+    def progress(self, index=0):
+        return int(self._global.count[index]) if len(self._global.count) > index else 0
+
+
+class HostAnomalyMonitor:
+    # Follows a sampler's ring and keeps the host detector up to date with every new sample.
+    # start() does so on a background thread, so the baseline keeps learning whether or not the
+    # Bottlenecks page is open; get() is the state that page reads, also set on `output` (e.g. a
+    # SharedLabels) for other processes.
+
+    def __init__(self, sampler, output=None, interval=None, **kwargs):
+        self.sampler = sampler
+        features = HOST_FEATURES
+        self.detector = AnomalyDetector(features, seasonal=True, floor=HOST_FLOOR, **kwargs)
+        self.scores = np.zeros(len(features))
+        self.severity = 0.0
+        self.values = np.zeros(len(features))
+        self.output = output
+        self.interval = interval or getattr(sampler, 'interval', 1.0)
+        self._last_time = 0.0
+        self._state = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="host-anomalies", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while True:
+            try:
+                self.follow().publish()
+            except Exception:
+                # A bad tick must not stop learning; the next one retries
+                pass
+            if self._stop.wait(self.interval):
+                break
+
+    def follow(self):
+        fields = self.sampler.buffer.fields
+        # Usually only a row or two is new: read a short tail and widen it only while every row
+        # in it is new (a short read means the ring had no more)
+        n = 16
+        while True:
+            rows = self.sampler.buffer.last(n)
+            times = rows[:, fields.index('time')]
+            if len(rows) < n or times[0] <= self._last_time:
+                break
+            n *= 8
+        new = rows[times > self._last_time]
+        if not len(new):
+            return self
+        columns = [fields.index(feature) for feature in self.detector.features]
+        for row in new:
+            z, severity = self.detector.update(row[columns], now=row[fields.index('time')])
+            self.scores, self.severity, self.values = z[0], float(severity[0]), row[columns]
+        self._last_time = new[-1, fields.index('time')]
+        return self
+
+    def anomalies(self):
+        # [(feature, value, baseline center, robust z, severity label)], worst first
+        baseline = self.detector.baseline()
+        found = []
+        for feature, value, z in zip(self.detector.features, self.values.tolist(), self.scores.tolist()):
+            label = severity_label(z)
+            if label is not None:
+                found.append((feature, value, baseline[feature][0], z, label))
+        return sorted(found, key=lambda item: -item[3])
+
+    def state(self):
+        # JSON-able: how far the baseline has got, and anomalies() once it is warm
+        return {'warm': bool(self.detector.warm()), 'progress': self.detector.progress(), 'warmup': self.detector.warmup,
+                'anomalies': [list(item) for item in self.anomalies()] if self.detector.warm() else []}
+
+    def publish(self):
+        self._state = self.state()
+        if self.output is not None:
+            self.output.set(self._state)
+        return self
+
+    def get(self):
+        # Last published state(); None before the first
+        return self._state
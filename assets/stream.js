@@ -0,0 +1,171 @@
+// Live metrics come over one Server-Sent Events connection per tab (/stream, see stream.py)
+// instead of a callback round-trip per tick. Samples are batched per animation frame and put
+// into the live-stream store; render() then extends the chart and gauges in the browser.
+// Per-core/per-device rows come on the same connection and breakdown() appends them.
+(function () {
+    var dc = window.dash_clientside = window.dash_clientside || {};
+    var source = null;
+    var following = null;
+    var chartHost = null;
+    var lastTime = {};
+    var pending = [];
+    var scheduled = false;
+    // Device rows not yet on the breakdown figures, what those figures hold, and the redraw asked for
+    var HELD_ROWS = 64;
+    var held = [];
+    var heldTick = 0;
+    var drawn = null;
+    var requested = null;
+
+    function flush() {
+        var batch = pending;
+        pending = [];
+        scheduled = false;
+        if (batch.length) {
+            dc.set_props('live-stream', {data: batch});
+        }
+        if (held.length) {
+            heldTick += 1;
+            dc.set_props('device-stream', {data: heldTick});
+        }
+    }
+
+    function schedule() {
+        if (!scheduled) {
+            scheduled = true;
+            window.requestAnimationFrame(flush);
+        }
+    }
+
+    function follow(style, host) {
+        // One EventSource while the Dashboard page is visible, for the selected host
+        var visible = !style || style.display !== 'none';
+        var key = visible ? (host || 'local') : null;
+        if (key === following) {
+            return dc.no_update;
+        }
+        if (source) {
+            source.close();
+            source = null;
+        }
+        following = key;
+        pending = [];
+        held = [];
+        if (key !== null) {
+            // Switching hosts starts the chart over (reset_live), so that needs the whole
+            // backlog; coming back to the same host only asks for what the chart hasn't got yet
+            if (key !== chartHost) {
+                delete lastTime[key];
+                chartHost = key;
+            }
+            var url = 'stream?host=' + encodeURIComponent(key) + (lastTime[key] ? '&since=' + lastTime[key] : '');
+            source = new EventSource(url);
+            source.addEventListener('sample', function (event) {
+                var sample = JSON.parse(event.data);
+                lastTime[key] = sample.time;
+                pending.push(sample);
+                schedule();
+            });
+            source.addEventListener('devices', function (event) {
+                held.push(JSON.parse(event.data));
+                if (held.length > HELD_ROWS) {
+                    held.shift();
+                }
+                schedule();
+            });
+        }
+        return key;
+    }
+
+    function text(config, metric, value) {
+        var unit = config.percent.indexOf(metric) >= 0 ? '%' : 'MB/s';
+        return '📌 Current ' + config.titles[metric] + ': ' + value.toFixed(2) + ' ' + unit;
+    }
+
+    function render(batch, config, gauges) {
+        // Same updates update_live used to send from the server: extendData for the chart,
+        // new values for whichever gauges are on screen
+        if (!batch || !batch.length) {
+            return dc.no_update;
+        }
+        var x = batch.map(function (sample) { return Math.round(sample.time * 1000); });
+        var extend = [
+            {
+                x: config.fields.map(function () { return x; }),
+                y: config.fields.map(function (field) {
+                    return batch.map(function (sample) { return Math.round(sample[field] * 100) / 100; });
+                })
+            },
+            config.fields.map(function (_, i) { return i; }),
+            config.window
+        ];
+
+        var latest = batch[batch.length - 1];
+        var outputs = dc.callback_context.outputs_list;
+        var figures = outputs[1].map(function (output, i) {
+            var value = latest[config.gauges[output.id.metric]];
+            var figure = Object.assign({}, gauges[i]);
+            var trace = Object.assign({}, figure.data[0]);
+            var gauge = Object.assign({}, trace.gauge);
+            gauge.steps = [Object.assign({}, gauge.steps[0], {range: [0, value]}),
+                           Object.assign({}, gauge.steps[1], {range: [value, 100]})];
+            trace.value = value;
+            trace.gauge = gauge;
+            figure.data = [trace];
+            return figure;
+        });
+        var texts = outputs[2].map(function (output) {
+            return text(config, output.id.metric, latest[config.gauges[output.id.metric]]);
+        });
+        return [extend, figures, texts];
+    }
+
+    function breakdown(tick, state, config) {
+        // extendData for the heatmap and each sparkline graph, then a redraw request for
+        // update_breakdown when the figures are for another host or an older device set
+        var unchanged = [dc.no_update].concat(config.sparklines.map(function () { return dc.no_update; }));
+        var triggered = dc.callback_context.triggered.map(function (t) { return t.prop_id; });
+        if (triggered.indexOf('breakdown-state.data') >= 0) {
+            drawn = state && state.version ? {host: state.host, version: state.version, time: state.time} : null;
+            requested = null;
+        }
+        if (!held.length) {
+            return unchanged.concat([dc.no_update]);
+        }
+        var version = held[held.length - 1].version;
+        if (!drawn || drawn.host !== following || drawn.version !== version) {
+            var want = following + ' ' + version;
+            if (want === requested) {
+                return unchanged.concat([dc.no_update]);
+            }
+            requested = want;
+            return unchanged.concat([{host: following, version: version}]);
+        }
+
+        var rows = held.filter(function (row) { return row.version === version && row.time > drawn.time; });
+        held = [];
+        if (!rows.length) {
+            return unchanged.concat([dc.no_update]);
+        }
+        drawn.time = rows[rows.length - 1].time;
+        var x = rows.map(function (row) { return Math.round(row.time * 1000); });
+        var cores = [{x: [x], z: [rows.map(function (row) { return row.cpu; })]}, [0], config.window];
+        var sparklines = config.sparklines.map(function (spec) {
+            // Traces are device-major: (device 0 read, device 0 write, device 1 read, ...)
+            var fields = spec[1];
+            var y = [];
+            for (var i = 0; i < rows[0][fields[0]].length; i++) {
+                fields.forEach(function (field) {
+                    y.push(rows.map(function (row) { return row[field][i]; }));
+                });
+            }
+            if (!y.length) {
+                return dc.no_update;
+            }
+            return [{x: y.map(function () { return x; }), y: y}, y.map(function (_, j) { return j; }), config.window];
+        });
+        return [cores].concat(sparklines, [dc.no_update]);
+    }
+
+    dc.stream = {follow: follow, render: render, breakdown: breakdown};
+})();
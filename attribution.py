@@ -0,0 +1,78 @@
+import numpy as np
+
+
+# Resource -> (process column, label, unit formatter)
+RESOURCES = {
+    'cpu': ('cpu_percent', "CPU", lambda v: f"{v:.1f}%"),
+    'memory': ('rss_growth_per_sec', "RSS growth", lambda v: f"{v / 1048576:.2f} MB/s"),
+    'disk_read': ('read_bytes_per_sec', "disk reads", lambda v: f"{v / 1048576:.2f} MB/s"),
+    'disk_write': ('write_bytes_per_sec', "disk writes", lambda v: f"{v / 1048576:.2f} MB/s"),
+    'ctx_switches': ('ctx_switches_per_sec', "context switches", lambda v: f"{v:.0f}/s"),
+}
+
+# The same resources in a CgroupCollector frame (no per-container context switch count)
+CONTAINER_RESOURCES = {
+    'cpu': ('cpu_percent', "CPU", lambda v: f"{v:.1f}%"),
+    'memory': ('memory_growth_per_sec', "memory growth", lambda v: f"{v / 1048576:.2f} MB/s"),
+    'disk_read': ('read_bytes_per_sec', "disk reads", lambda v: f"{v / 1048576:.2f} MB/s"),
+    'disk_write': ('write_bytes_per_sec', "disk writes", lambda v: f"{v / 1048576:.2f} MB/s"),
+}
+
+# Host anomaly features -> the resource whose per-process deltas explain them
+FEATURE_RESOURCES = {
+    'cpu': 'cpu',
+    'memory': 'memory',
+    'disk_read': 'disk_read',
+    'disk_write': 'disk_write',
+}
+
+
+def top_contributors(values, k=5):
+    # Indices of the k largest positive values, largest first, and each one's share of the total.
+    # argpartition keeps this O(n) no matter how many processes there are.
+    values = np.nan_to_num(np.asarray(values, dtype=np.float64))
+    positive = np.maximum(values, 0.0)
+    total = positive.sum()
+    if total <= 0:
+        return np.zeros(0, dtype=np.intp), np.zeros(0)
+    k = min(k, int(np.count_nonzero(positive)))
+    idx = np.argpartition(-positive, k - 1)[:k]
+    idx = idx[np.argsort(-positive[idx])]
+    return idx, positive[idx] / total
+
+
+def attribute(frame, resources=RESOURCES, k=5, table=RESOURCES, key='pid'):
+    # {resource: [(id, name, value, share), ...]} for each resource the snapshot can explain;
+    # id is the key column: the pid, or the cgroup path with table=CONTAINER_RESOURCES, key='cgroup'
+    if not len(frame):
+        return {}
+    ids = frame[key].to_numpy()
+    names = frame['name'].to_numpy()
+    result = {}
+    for resource in resources:
+        if resource not in table or table[resource][0] not in frame:
+            continue
+        values = frame[table[resource][0]].to_numpy(dtype=np.float64)
+        idx, shares = top_contributors(values, k)
+        result[resource] = [(ident, str(names[i]), float(values[i]), float(share))
+                            for ident, i, share in zip(ids[idx].tolist(), idx, shares)]
+    return result
+
+
+def explain(anomalies, frame, k=5, table=RESOURCES, key='pid'):
+    # Which processes (or containers) make up each anomalous resource's host total
+    # (HostAnomalyMonitor.anomalies() items); CPU anomalies also look at context switches
+    resources = [FEATURE_RESOURCES[feature] for feature, *_ in anomalies if feature in FEATURE_RESOURCES]
+    if 'cpu' in resources:
+        resources.append('ctx_switches')
+    return attribute(frame, resources, k, table, key) if resources and frame is not None else {}
+
+
+def describe(resource, offenders):
+    _, label, fmt = RESOURCES[resource]
+    return [f"{name} (PID {pid}): {fmt(value)}, {share:.0%} of host {label}" for pid, name, value, share in offenders]
+
+
+def describe_containers(resource, offenders):
+    _, label, fmt = CONTAINER_RESOURCES[resource]
+    return [f"📦 {name}: {fmt(value)}, {share:.0%} of container {label}" for _, name, value, share in offenders]
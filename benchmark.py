@@ -0,0 +1,366 @@
+import argparse
+import gc
+import importlib
+import json
+import os
+import platform
+import re
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from fake_psutil import FakePsutil
+
+
+# Modules that hold a module-level reference to psutil
+PATCHED_MODULES = ('rates', 'sampler', 'collector', 'monitor')
+
+
+def install(fake):
+    for name in PATCHED_MODULES:
+        importlib.import_module(name).psutil = fake
+
+
+def load_dashboard(fake):
+    install(fake)
+    import dashboard
+    # Stop the background threads; the harness drives sampling itself so timings stay quiet
+    dashboard.sampler.stop()
+    dashboard.forecaster.stop()
+    if dashboard.alert_engine is not None:
+        dashboard.alert_engine.stop()
+    for history in dashboard.histories.values():
+        history.stop()
+    return dashboard
+
+
+def fill_history(sampler, rows=600):
+    for _ in range(rows):
+        sampler._tick()
+
+
+def callback_context(triggered=None, outputs_list=None):
+    # Mimics what Dash sets up around a callback so ctx.triggered_id / outputs_list work
+    from dash._utils import AttributeDict
+
+    inputs = [{'prop_id': f"{triggered}.n_clicks", 'value': 1}] if triggered else []
+    return AttributeDict(triggered_inputs=inputs, outputs_list=outputs_list or [])
+
+
+def payload_size(result):
+    import plotly
+    return len(json.dumps(result, cls=plotly.utils.PlotlyJSONEncoder).encode())
+
+
+def measure(fn, iterations, between=None, context=None):
+    from dash._callback_context import context_value
+
+    def call():
+        if context is None:
+            return fn()
+        token = context_value.set(context)
+        try:
+            return fn()
+        finally:
+            context_value.reset(token)
+
+    result = call()  # warm-up, also primes stateful collectors
+    timings = np.empty(iterations)
+    gc.collect()
+    for i in range(iterations):
+        if between is not None:
+            between()
+        start = time.perf_counter_ns()
+        result = call()
+        timings[i] = time.perf_counter_ns() - start
+
+    # Allocations are measured in a separate pass so tracemalloc overhead doesn't skew latency
+    alloc_iterations = max(1, min(iterations, 5))
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    for _ in range(alloc_iterations):
+        if between is not None:
+            between()
+        call()
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, 'filename') if stat.size_diff > 0)
+
+    ms = timings / 1e6
+    return {
+        'iterations': iterations,
+        'latency_ms': {
+            'mean': float(ms.mean()),
+            'p50': float(np.percentile(ms, 50)),
+            'p90': float(np.percentile(ms, 90)),
+            'p99': float(np.percentile(ms, 99)),
+            'max': float(ms.max()),
+        },
+        'alloc_peak_bytes': int(peak),
+        'alloc_retained_bytes_per_call': int(allocated / alloc_iterations),
+    }, result
+
+
+def run_scenario(processes, disks, nics, iterations, dashboard=None, procfs=False, cpus=8):
+    fake = FakePsutil(processes=processes, disks=disks, nics=nics, cpus=cpus)
+    install(fake)
+    import monitor
+    from collector import ProcessCollector
+    from rates import IORates
+
+    results = {}
+    io_rates = IORates(min_interval=0)
+    collector = ProcessCollector()
+    monitor.io_rates = IORates(min_interval=0)
+    monitor.process_collector = ProcessCollector()
+
+    # -- collectors --
+    results['rates.IORates.sample'], _ = measure(io_rates.sample, iterations)
+    results['collector.ProcessCollector.collect'], _ = measure(collector.collect, iterations, between=fake.advance)
+    results['monitor.calculate_phs'], _ = measure(monitor.calculate_phs, iterations)
+    results['monitor.get_process_data'], _ = measure(monitor.get_process_data, iterations, between=fake.advance)
+    # The adaptive cadence's degraded tick: only the heaviest processes of the last full scan
+    top = monitor.top_pids(monitor.get_process_data(), 20)
+    results['monitor.get_process_data[top]'], _ = measure(lambda: monitor.get_process_data(top), iterations,
+                                                          between=fake.advance)
+    if procfs:
+        results.update(run_procfs(processes, iterations))
+
+    # -- dashboard callbacks, called directly --
+    if dashboard is not None:
+        from process_table import ProcessTable
+        dashboard.sampler.io_rates = IORates(min_interval=0)
+        dashboard.process_table = ProcessTable(max_age=5.0)
+        fill_history(dashboard.sampler)
+        dashboard.forecaster.refit()
+
+        results['sampler.MetricsSampler.sample'], _ = measure(dashboard.sampler.sample, iterations)
+        results['dashboard.calculate_phs'], _ = measure(dashboard.calculate_phs, iterations)
+        results['dashboard.detect_bottlenecks'], _ = measure(lambda: dashboard.detect_bottlenecks(1, 0), iterations)
+
+        stats, output = measure(lambda: dashboard.update_metric('all'), iterations)
+        stats['payload_bytes'] = payload_size(output)
+        results['dashboard.update_metric'] = stats
+
+        # Same callback through the HTTP endpoint; after the warm-up every call is a cache hit
+        client = dashboard.app.server.test_client()
+        body = {'output': 'selected-metric-container.children',
+                'outputs': {'id': 'selected-metric-container', 'property': 'children'},
+                'inputs': [{'id': 'metric-dropdown', 'property': 'value', 'value': 'all'},
+                           {'id': 'host-select', 'property': 'value', 'value': 'local'}],
+                'changedPropIds': ['metric-dropdown.value'], 'state': []}
+        dashboard.callback_cache.ttl = 3600.0
+        stats, response = measure(lambda: client.post('/_dash-update-component', json=body), iterations)
+        stats['payload_bytes'] = len(response.data)
+        results['dashboard.update_metric.cached'] = stats
+
+        sort_by = [{'column_id': 'cpu_percent', 'direction': 'desc'}]
+        stats, output = measure(lambda: dashboard.list_active_processes(1, 0, 0, 25, sort_by, ''), iterations,
+                                between=fake.advance, context=callback_context('btn-processes'))
+        stats['payload_bytes'] = payload_size(output)
+        results['dashboard.list_active_processes.refresh'] = stats
+
+        stats, output = measure(lambda: dashboard.list_active_processes(1, 0, 3, 25, sort_by, '{name} contains proc'), iterations,
+                                context=callback_context('process-table'))
+        stats['payload_bytes'] = payload_size(output)
+        results['dashboard.list_active_processes.page'] = stats
+
+        stats, output = measure(lambda: dashboard.predict_cpu_usage(1, 'cpu', 10), iterations)
+        stats['payload_bytes'] = payload_size(output)
+        results['dashboard.predict_cpu_usage'] = stats
+
+        stats, output = measure(lambda: dashboard.update_history('cpu', 3600, []), iterations, context=callback_context('history-range'))
+        stats['payload_bytes'] = payload_size(output)
+        results['dashboard.update_history'] = stats
+
+        results['sampler.MetricsSampler.sample_devices'], _ = measure(lambda: dashboard.sampler.sample_devices(time.time()), iterations)
+        stats, output = measure(lambda: dashboard.update_breakdown(dashboard.LOCAL_HOST, None), iterations)
+        stats['payload_bytes'] = payload_size(output)
+        results['dashboard.update_breakdown.full'] = stats
+
+        # After that each tick's device row goes out on the stream, encoded once however many tabs watch
+        from stream import encode_devices
+        labels, rows = dashboard.sampler.device_history(1)
+        stats, output = measure(lambda: encode_devices(labels, rows[-1]), iterations)
+        stats['payload_bytes'] = len(output)
+        results['stream.encode_devices'] = stats
+
+        # A large rule set over the same ring; evaluation is shared per (window, aggregation)
+        from alerts import AGGREGATIONS, RuleSet
+        buffer = dashboard.sampler.buffer
+        fields = [field for field in buffer.fields if field != 'time']
+        rules = RuleSet([{'name': f"rule{i}", 'metric': fields[i % len(fields)], 'window': (5, 30, 60, 300)[i % 4],
+                          'aggregation': AGGREGATIONS[i % len(AGGREGATIONS)], 'op': '>', 'threshold': 50 + i % 40,
+                          'for': 10, 'clear': 40} for i in range(1000)], fields)
+        rows = buffer.last(302)
+        columns = [buffer.fields.index(field) for field in fields]
+        results['alerts.RuleSet.evaluate[1000]'], _ = measure(
+            lambda: rules.evaluate(rows[:, 0], rows[:, columns], float(rows[-1, 0])), iterations)
+
+    return {'processes': processes, 'disks': disks, 'nics': nics, 'cpus': cpus, 'results': results}
+
+
+def run_procfs(processes, iterations):
+    # Both process backends against the same synthetic /proc tree: real psutil pointed at it
+    # through PROCFS_PATH, and ProcCollector reading it directly
+    import psutil
+    import collector
+    from fake_procfs import FakeProcfs
+    from proc_collector import ProcCollector
+
+    root = tempfile.mkdtemp(prefix='fake-procfs-')
+    procfs = FakeProcfs(FakePsutil(processes=processes), os.path.join(root, 'proc'))
+    patched, collector.psutil = collector.psutil, psutil
+    psutil.PROCFS_PATH = procfs.root
+    results = {}
+    try:
+        results['collector.ProcessCollector.collect[procfs]'], _ = measure(
+            collector.ProcessCollector().collect, iterations, between=procfs.advance)
+        proc = ProcCollector(proc_root=procfs.root)
+        results['proc_collector.ProcCollector.collect[procfs]'], _ = measure(proc.collect, iterations, between=procfs.advance)
+        proc.close()
+    finally:
+        psutil.PROCFS_PATH = '/proc'
+        collector.psutil = patched
+        shutil.rmtree(root, ignore_errors=True)
+    return results
+
+
+def run_cgroups(containers, iterations):
+    # CgroupCollector against a synthetic cgroup v2 tree; the tree is walked once up front
+    from cgroup_collector import CgroupCollector
+    from fake_cgroupfs import FakeCgroupfs
+
+    root = tempfile.mkdtemp(prefix='fake-cgroupfs-')
+    cgroupfs = FakeCgroupfs(os.path.join(root, 'cgroup'), containers=containers)
+    try:
+        cgroups = CgroupCollector(cgroupfs.root, rescan=float('inf'))
+        stats, _ = measure(cgroups.collect, iterations, between=cgroupfs.advance)
+        stats['containers'] = containers
+        stats['reads_per_tick'] = len(cgroups._keys) * len(cgroups.files) - len(cgroups._missing)
+    finally:
+        cgroupfs.close()
+        shutil.rmtree(root, ignore_errors=True)
+    return {'cgroup_collector.CgroupCollector.collect': stats}
+
+
+def run_first_paint(dashboard, iterations):
+    # Everything the browser fetches before Dash can render the Home page: the index, the
+    # stylesheets and scripts it links, then the layout and callback graph. Timed through the
+    # Flask test client, so this is server time and bytes on the wire, not a real paint.
+    client = dashboard.app.server.test_client()
+    headers = {'Accept-Encoding': 'gzip, br'}
+    html = client.get('/').get_data(as_text=True)
+    urls = re.findall(r'<(?:link[^>]*href|script[^>]*src)="([^"]+)"', html)
+    local = [url for url in urls if not url.startswith(('http://', 'https://', '//'))]
+    external = [url for url in urls if url not in local]
+    # Dash escapes "/" in the layout JSON
+    external += re.findall(r'"(https?://[^"]+)"', json.dumps(client.get('/_dash-layout').get_json()))
+
+    def load():
+        return {url: client.get(url, headers=headers) for url in ['/'] + local + ['/_dash-layout', '/_dash-dependencies']}
+
+    stats, requests = measure(load, iterations)
+    stats['requests'] = {url: {'status': response.status_code, 'encoding': response.content_encoding,
+                               'bytes': len(response.data)} for url, response in requests.items()}
+    stats['wire_bytes'] = sum(len(response.data) for response in requests.values())
+    stats['external'] = sorted(set(external))
+    return stats
+
+
+def run_phs_batch(hosts, seconds, iterations):
+    # One vectorized PHS call over (hosts, seconds) of history, with and without reasons
+    from phs import DEFAULT_SCORER
+
+    rng = np.random.default_rng(0)
+    columns = {'cpu': rng.uniform(0, 100, (hosts, seconds)), 'memory': rng.uniform(0, 100, (hosts, seconds)),
+               'disk_read': rng.uniform(0, 800, (hosts, seconds)), 'net_sent': rng.uniform(0, 150, (hosts, seconds))}
+    results = {'hosts': hosts, 'seconds': seconds}
+    for name, reasons in (('score', True), ('score.no_reasons', False)):
+        stats, _ = measure(lambda: DEFAULT_SCORER.score(columns, reasons), iterations)
+        stats['samples_per_second'] = hosts * seconds / (stats['latency_ms']['p50'] / 1000)
+        results[f"phs.PHSScorer.{name}"] = stats
+    return results
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    old_runs = {(s['processes'], s['disks'], s['nics']): s['results'] for s in old['scenarios']}
+    for scenario in new['scenarios']:
+        key = (scenario['processes'], scenario['disks'], scenario['nics'])
+        print(f"== {key[0]} processes, {key[1]} disks, {key[2]} nics")
+        before = old_runs.get(key, {})
+        for name, stats in scenario['results'].items():
+            p50 = stats['latency_ms']['p50']
+            if name in before:
+                ratio = p50 / before[name]['latency_ms']['p50'] if before[name]['latency_ms']['p50'] else float('inf')
+                print(f"  {name:45s} {before[name]['latency_ms']['p50']:10.3f} -> {p50:10.3f} ms  x{ratio:.2f}")
+            else:
+                print(f"  {name:45s} {'new':>10s} -> {p50:10.3f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark collectors and Dash callbacks against a synthetic psutil")
+    parser.add_argument('--processes', type=int, nargs='+', default=[100, 1000, 20000])
+    parser.add_argument('--disks', type=int, default=4)
+    parser.add_argument('--nics', type=int, default=2)
+    parser.add_argument('--cpus', type=int, default=8)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--no-dashboard', action='store_true', help="only benchmark collectors")
+    parser.add_argument('--procfs', action='store_true',
+                        help="also compare the psutil and /proc process backends on a synthetic /proc tree (Linux only, slow to set up)")
+    parser.add_argument('--first-paint', action='store_true',
+                        help="also measure the bytes and server time behind the first render of the Home page")
+    parser.add_argument('--phs-batch', nargs=2, type=int, metavar=('HOSTS', 'SECONDS'),
+                        help="also time batch PHS scoring over this much history, e.g. 100 86400")
+    parser.add_argument('--cgroups', type=int, metavar='CONTAINERS',
+                        help="also time the cgroup v2 container collector on a synthetic tree of this many containers")
+    parser.add_argument('--output', help="write JSON results here instead of stdout")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="diff two result files and exit")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    dashboard = None if args.no_dashboard else load_dashboard(FakePsutil(processes=10, disks=args.disks, nics=args.nics, cpus=args.cpus))
+    report = {
+        'meta': {
+            'time': time.time(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'iterations': args.iterations,
+        },
+        'scenarios': [run_scenario(n, args.disks, args.nics, args.iterations, dashboard,
+                                   procfs=args.procfs and sys.platform.startswith('linux'), cpus=args.cpus)
+                      for n in args.processes],
+    }
+    if args.first_paint and dashboard is not None:
+        report['first_paint'] = run_first_paint(dashboard, args.iterations)
+
+    if args.phs_batch:
+        report['phs_batch'] = run_phs_batch(*args.phs_batch, args.iterations)
+
+    if args.cgroups:
+        report['cgroups'] = run_cgroups(args.cgroups, args.iterations)
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+import argparse
+import ast
+import glob
+import os
+import re
+import shutil
+import subprocess
+import sys
+
+
+# Builds assets/tailwind.min.css with the Tailwind standalone CLI, so the page doesn't need
+# the Play CDN (which downloads a compiler and builds the CSS in the browser on every load).
+# The CLI scans the module(s) named in tailwind.input.css and emits only the utilities in use,
+# minified. The output is committed, so deploying needs no build tools; only changing a
+# className does: pip install tailwindcss-bin==4.3.3 (or put the CLI on PATH as $TAILWINDCSS).
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+ASSETS = os.path.join(ROOT, 'assets')
+INPUT = os.path.join(ROOT, 'tailwind.input.css')
+OUTPUT = os.path.join(ASSETS, 'tailwind.min.css')
+
+# Pinned so the committed CSS can be rebuilt byte for byte
+TAILWIND_VERSION = '4.3.3'
+
+_CLASS = re.compile(r'\.((?:\\.|[\w-])+)')
+
+
+def find_cli():
+    cli = os.environ.get('TAILWINDCSS') or shutil.which('tailwindcss')
+    if cli is None:
+        sys.exit(f"tailwindcss not found: pip install tailwindcss-bin=={TAILWIND_VERSION}, or set $TAILWINDCSS")
+    banner = subprocess.run([cli, '--help'], capture_output=True, text=True).stdout
+    version = re.search(r'tailwindcss v(\S+)', banner)
+    if version is None or version.group(1) != TAILWIND_VERSION:
+        sys.exit(f"{cli} is {version.group(1) if version else 'an unknown version'}, expected v{TAILWIND_VERSION}")
+    return cli
+
+
+def class_names(paths):
+    # Tokens written in a className=... argument
+    names = set()
+    for path in paths:
+        with open(path) as f:
+            tree = ast.parse(f.read(), path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.keyword) and node.arg == 'className':
+                for part in ast.walk(node.value):
+                    if isinstance(part, ast.Constant) and isinstance(part.value, str):
+                        names.update(part.value.split())
+    return names
+
+
+def defined_classes():
+    # Classes any stylesheet in assets/ defines, the generated one included
+    names = set()
+    for path in glob.glob(os.path.join(ASSETS, '*.css')):
+        with open(path) as f:
+            names.update(re.sub(r'\\(.)', r'\1', name) for name in _CLASS.findall(f.read()))
+    return names
+
+
+def build(output=OUTPUT):
+    subprocess.run([find_cli(), '--input', INPUT, '--output', output, '--minify'], cwd=ROOT, check=True,
+                   capture_output=True)
+    missing = sorted(class_names(sorted(glob.glob(os.path.join(ROOT, '*.py')))) - defined_classes())
+    return os.path.getsize(output), missing
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build assets/tailwind.min.css with the pinned Tailwind CLI")
+    parser.add_argument('--output', default=OUTPUT)
+    parser.add_argument('--strict', action='store_true', help="fail if a className uses a class nothing defines")
+    args = parser.parse_args(argv)
+
+    size, missing = build(args.output)
+    print(f"{args.output}: {size} bytes")
+    if missing:
+        print(f"warning: no CSS for {', '.join(missing)}", file=sys.stderr)
+        if args.strict:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+
+from instrument import REGISTRY
+
+
+# File entries: expiry (float64 epoch) followed by the cached bytes
+_EXPIRY = struct.Struct('<d')
+
+
+class MemoryBackend:
+    # Per-process LRU; fine for a single worker or the dev server
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def lock(self, key):
+        return nullcontext()
+
+
+class FileBackend:
+    # One file per key in a directory every gunicorn worker can see (a tmpfs such as /dev/shm
+    # keeps it in memory). Writes are atomic renames; an flock per key lets only one worker
+    # compute a missing entry. LRU order is the files' mtimes, which get() bumps.
+
+    def __init__(self, directory, maxsize=256):
+        import fcntl
+
+        self._fcntl = fcntl
+        self.directory = directory
+        self.maxsize = maxsize
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key, suffix='.bin'):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + suffix)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        if len(data) < _EXPIRY.size or _EXPIRY.unpack_from(data)[0] < time.time():
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return data[_EXPIRY.size:]
+
+    def set(self, key, value, ttl):
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(_EXPIRY.pack(time.time() + ttl) + value)
+        os.replace(tmp, path)
+        self._writes += 1
+        if self._writes % 32 == 0:
+            self._evict()
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.bin'):
+                try:
+                    entries.append((os.stat(os.path.join(self.directory, name)).st_mtime, name))
+                except FileNotFoundError:
+                    continue
+        entries.sort()
+        for _, name in entries[:max(len(entries) - self.maxsize, 0)]:
+            for suffix in ('.bin', '.lock'):
+                try:
+                    os.remove(os.path.join(self.directory, name[:-4] + suffix))
+                except FileNotFoundError:
+                    pass
+
+    @contextmanager
+    def lock(self, key):
+        with open(self._path(key, '.lock'), 'a') as f:
+            self._fcntl.flock(f, self._fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                self._fcntl.flock(f, self._fcntl.LOCK_UN)
+
+
+class ResultCache:
+    # TTL cache with single-flight: concurrent misses on one key (threads in this worker,
+    # and other workers with a FileBackend) wait for a single computation and share it
+
+    def __init__(self, backend=None, ttl=1.0):
+        self.backend = MemoryBackend() if backend is None else backend
+        self.ttl = ttl
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    @contextmanager
+    def _flight(self, key):
+        with self._locks_lock:
+            lock, waiters = self._locks.get(key, (None, 0))
+            if lock is None:
+                lock = threading.Lock()
+            self._locks[key] = (lock, waiters + 1)
+        try:
+            with lock, self.backend.lock(key):
+                yield
+        finally:
+            with self._locks_lock:
+                lock, waiters = self._locks[key]
+                if waiters == 1:
+                    del self._locks[key]
+                else:
+                    self._locks[key] = (lock, waiters - 1)
+
+    def get_or_compute(self, key, compute, ttl=None, stats=None):
+        # compute() -> bytes to cache, or None to hand back without caching
+        value = self.backend.get(key)
+        if value is not None:
+            if stats is not None:
+                stats.cache_hits.inc()
+            return value
+        with self._flight(key):
+            # Whoever held the flight before us has probably filled it
+            value = self.backend.get(key)
+            if value is not None:
+                if stats is not None:
+                    stats.cache_hits.inc()
+                return value
+            if stats is not None:
+                stats.cache_misses.inc()
+            value = compute()
+            if value is not None:
+                self.backend.set(key, value, self.ttl if ttl is None else ttl)
+            return value
+
+
+def make_backend(maxsize=256):
+    # ANALYZER_CACHE_DIR shares entries between workers; gunicorn.conf.py points it at /dev/shm
+    directory = os.environ.get('ANALYZER_CACHE_DIR')
+    return FileBackend(directory, maxsize) if directory else MemoryBackend(maxsize)
+
+
+def cache_callbacks(app, rules, cache=None, registry=REGISTRY):
+    # Serves repeated Dash callback requests from the cache as already-serialized JSON, so a
+    # hit skips the callback, Dash's output validation and Plotly's serialization.
+    # rules: {callback function: vary}; vary lists the "id.prop" inputs whose values change
+    # the answer (None means all of them). The triggering input is always part of the key.
+    import flask
+
+    cache = ResultCache(make_backend()) if cache is None else cache
+    server = app.server
+    endpoint = next(rule.endpoint for rule in server.url_map.iter_rules() if rule.rule.endswith('/_dash-update-component'))
+    dispatch = server.view_functions[endpoint]
+    by_output = {}
+
+    def resolve():
+        # Callbacks are registered after the app exists, so match them up on first use
+        if not by_output:
+            for output, entry in app.callback_map.items():
+                func = getattr(entry.get('callback'), '__wrapped__', None)
+                while func is not None and func not in rules and hasattr(func, '__wrapped__'):
+                    func = func.__wrapped__
+                if func in rules:
+                    by_output[output] = (f"{func.__module__}.{func.__qualname__}", rules[func])
+        return by_output
+
+    def cached_dispatch():
+        body = flask.request.get_json(silent=True) or {}
+        rule = resolve().get(body.get('output'))
+        if rule is None:
+            return dispatch()
+        name, vary = rule
+
+        values = {}
+        for item in body.get('inputs', []) + body.get('state', []):
+            for entry in item if isinstance(item, list) else [item]:
+                prop_id = f"{json.dumps(entry['id'], sort_keys=True) if isinstance(entry['id'], dict) else entry['id']}.{entry['property']}"
+                if vary is None or prop_id in vary:
+                    values[prop_id] = entry.get('value')
+        key = json.dumps([body['output'], sorted(body.get('changedPropIds', [])), values], sort_keys=True, default=str)
+
+        computed = []
+
+        def compute():
+            response = server.make_response(dispatch())
+            computed.append(response)
+            return response.get_data() if response.status_code == 200 else None
+
+        data = cache.get_or_compute(key, compute, stats=registry.stats(name))
+        if data is None:
+            # Computed here but not cacheable; hand Dash's own response back
+            return computed[0]
+        return flask.Response(data, mimetype='application/json')
+
+    server.view_functions[endpoint] = cached_dispatch
+    return cache
@@ -0,0 +1,111 @@
+import time
+
+import numpy as np
+
+from anomaly import HOST_FEATURES, HOST_FLOOR, AnomalyDetector
+
+
+# What a tick collects, most detailed first: every process, only the heaviest processes of
+# the last full scan, or host metrics alone
+LEVELS = ('full', 'top', 'host')
+
+# A move this big between two samples counts as rapid change (%, %, MB/s, MB/s, MB/s, MB/s)
+RAPID_CHANGE = (10.0, 5.0, 20.0, 20.0, 10.0, 10.0)
+
+# Robust z at which the host counts as anomalous (the 'warning' severity)
+ANOMALOUS = 3.0
+
+
+class AdaptiveCadence:
+    # Picks how long to sleep before the next tick and how much that tick collects.
+    # The pace jumps to min_interval while the host is anomalous or changing fast and backs off
+    # geometrically to max_interval once it is quiet. Overhead is held to `budget` (a fraction of
+    # one core) with a bucket of CPU seconds that fills at budget per wall second and pays for all
+    # of the process's CPU time, collector threads and store writes included. A tick runs at the
+    # most detailed level the bucket can pay for, judged by what that level has cost so far; when
+    # not even host-only fits, the tick waits until it does.
+
+    def __init__(self, min_interval=0.5, max_interval=30.0, interval=5.0, budget=0.01, backoff=1.5,
+                 alpha=0.3, burst=None):
+        if not 0 < min_interval <= max_interval:
+            raise ValueError("need 0 < min_interval <= max_interval")
+        if budget <= 0:
+            raise ValueError("overhead budget must be positive")
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min(max(interval, min_interval), max_interval)
+        self.budget = budget
+        self.backoff = backoff
+        self.alpha = alpha
+        # Most the bucket holds (CPU seconds); at least one full scan's worth, see _cap()
+        self.burst = budget * max_interval * 2 if burst is None else burst
+        self.detector = AnomalyDetector(HOST_FEATURES, floor=HOST_FLOOR)
+        self.rapid = np.asarray(RAPID_CHANGE)
+        # EWMA CPU seconds per tick at each level; None until measured
+        self.cost = dict.fromkeys(LEVELS)
+        self.credit = self.burst
+        self.level = None
+        self.spent = 0.0
+        self.severity = 0.0
+        self.active = False
+        self._previous = None
+        self._time = None
+        self._started = None
+        self._ended = None
+
+    def _cap(self):
+        return max(self.burst, self.cost['full'] or 0.0)
+
+    def _refill(self, now):
+        if self._time is not None:
+            self.credit = min(self.credit + self.budget * (now - self._time), self._cap())
+        self._time = now
+
+    def choose(self, available=LEVELS, now=None):
+        # Level for the tick about to run; available leaves out levels that can't run yet
+        # (e.g. 'top' before any full scan has ranked the processes)
+        self._refill(time.monotonic() if now is None else now)
+        for level in LEVELS:
+            if level in available and (self.cost[level] or 0.0) <= self.credit:
+                self.level = level
+                return level
+        self.level = LEVELS[-1]
+        return self.level
+
+    def begin(self):
+        self._started = time.process_time()
+        # Whatever ran between ticks (store flushes, compaction) is overhead too
+        if self._ended is not None:
+            self.credit -= max(self._started - self._ended, 0.0)
+
+    def end(self, metrics):
+        # After the tick: charge its CPU time and fold the host sample into the pace.
+        # Returns the seconds to sleep before the next tick.
+        self._ended = time.process_time()
+        self.spent = spent = self._ended - self._started
+        cost = self.cost[self.level]
+        self.cost[self.level] = spent if cost is None else cost + self.alpha * (spent - cost)
+        self.credit -= spent
+
+        values = np.array([metrics[feature] for feature in HOST_FEATURES], dtype=np.float64)
+        _, severity = self.detector.update(values)
+        self.severity = float(severity[0])
+        rapid = self._previous is not None and bool((np.abs(values - self._previous) >= self.rapid).any())
+        self._previous = values
+        self.active = rapid or self.severity >= ANOMALOUS
+        if self.active:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+        return self.wait()
+
+    def wait(self):
+        # The wanted interval, stretched if the bucket can't pay for even a host-only tick by then
+        cheapest = self.cost[LEVELS[-1]] or 0.0
+        short = cheapest - self.credit - self.budget * self.interval
+        return self.interval + max(short, 0.0) / self.budget
+
+    def overhead(self, level=None):
+        # Expected share of one core at the current pace, for one level or the level last run
+        cost = self.cost[level or self.level]
+        return None if cost is None else cost / self.interval
@@ -0,0 +1,220 @@
+import errno
+import os
+import re
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import psutil
+
+from instrument import timed
+from proc_collector import _read
+
+
+# ANALYZER_CGROUP_ROOT points the collector elsewhere, e.g. at a FakeCgroupfs tree
+CGROUP_ROOT = os.environ.get('ANALYZER_CGROUP_ROOT', '/sys/fs/cgroup')
+
+# Read for every container each tick: one open/read/close apiece, so a tick costs at most
+# len(CGROUP_FILES) reads per container (fewer once a file is known to be missing)
+CGROUP_FILES = ('cpu.stat', 'memory.current', 'memory.stat', 'io.stat', 'cpu.pressure', 'memory.pressure', 'io.pressure')
+
+# Values parsed per container; all but the gauges are cumulative and become rates
+COUNTERS = ('usage_usec', 'throttled_usec', 'pgmajfault', 'rbytes', 'wbytes', 'rios', 'wios',
+            'cpu_stall', 'memory_stall', 'io_stall')
+GAUGES = ('memory', 'anon', 'file')
+
+CONTAINER_FIELDS = ('cgroup', 'name', 'cpu_percent', 'throttled_percent', 'memory_bytes', 'memory_percent',
+                    'anon_bytes', 'file_bytes', 'memory_growth_per_sec', 'major_faults_per_sec',
+                    'read_bytes_per_sec', 'write_bytes_per_sec', 'read_iops', 'write_iops',
+                    'cpu_pressure', 'memory_pressure', 'io_pressure')
+
+# Runtime scope names -> short container names, e.g. docker-<64 hex>.scope -> docker:<12 hex>
+_RUNTIME_SCOPE = re.compile(r'^(docker|cri-containerd|crio|libpod)-([0-9a-f]{12})[0-9a-f]*\.scope$')
+_RUNTIMES = {'docker': 'docker', 'cri-containerd': 'containerd', 'crio': 'cri-o', 'libpod': 'podman'}
+
+_IO_KEYS = {key: re.compile(rb'\b' + key.encode() + rb'=(\d+)') for key in ('rbytes', 'wbytes', 'rios', 'wios')}
+
+
+def cgroup_v2_available(root=CGROUP_ROOT):
+    # The unified hierarchy has cgroup.controllers at its root; v1 and hybrid mounts don't
+    return os.path.exists(os.path.join(root, 'cgroup.controllers'))
+
+
+def container_name(path):
+    base = os.path.basename(path)
+    match = _RUNTIME_SCOPE.match(base)
+    return f"{_RUNTIMES[match.group(1)]}:{match.group(2)}" if match else base
+
+
+def _value(text, key):
+    # "key value" line of a flat keyed file (cpu.stat, memory.stat); 0 when absent
+    at = text.find(b'\n' + key + b' ')
+    if at < 0:
+        return 0
+    at += len(key) + 2
+    end = text.find(b'\n', at)
+    return int(text[at:end if end >= 0 else len(text)])
+
+
+def _stall(text):
+    # total= of the "some" line, which comes first: microseconds any task was stalled
+    at = text.find(b'total=') + 6
+    end = text.find(b'\n', at)
+    return int(text[at:end if end >= 0 else len(text)])
+
+
+class CgroupCollector:
+    # Container-level load from cgroup v2 accounting files instead of a per-process scan.
+    # Containers are the leaf cgroups under root, found by walking the tree at most every
+    # `rescan` seconds; in between a tick only reads CGROUP_FILES for the known ones. Counters
+    # go into numpy arrays and collect() returns one DataFrame row per container with rates
+    # over the time since the previous collect().
+
+    def __init__(self, root=CGROUP_ROOT, rescan=10.0, max_depth=8, total_memory=None, pressure=True):
+        self.root = root
+        self.rescan = rescan
+        self.max_depth = max_depth
+        self.total_memory = total_memory or psutil.virtual_memory().total
+        self.files = CGROUP_FILES if pressure else tuple(f for f in CGROUP_FILES if not f.endswith('.pressure'))
+        self._paths = []
+        self._keys = []
+        self._names = []
+        self._scanned = None
+        # (cgroup key, file) pairs that don't exist, e.g. io.stat without the io controller
+        self._missing = set()
+        self._previous = None
+        self._time = None
+        self._lock = threading.Lock()
+
+    def _walk(self, directory, depth, found):
+        children = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        children.append(entry)
+            inode = os.stat(directory).st_ino if not children and depth else None
+        except (FileNotFoundError, NotADirectoryError):
+            # Removed while we walked; gone from this scan
+            return
+        if inode is not None:
+            found.append((os.path.relpath(directory, self.root), inode))
+        if depth < self.max_depth:
+            for entry in children:
+                self._walk(entry.path, depth + 1, found)
+
+    def _discover(self, now):
+        found = []
+        self._walk(self.root, 0, found)
+        found.sort()
+        keys = [tuple(item) for item in found]
+        if keys != self._keys:
+            # Carry counters over by (path, inode) so rates survive the reshuffle; a recreated
+            # cgroup has a new inode and starts fresh
+            if self._previous is not None:
+                index = {key: i for i, key in enumerate(self._keys)}
+                rows = np.array([index.get(key, -1) for key in keys], dtype=np.intp)
+                keep = rows >= 0
+                for field, values in self._previous.items():
+                    carried = np.full(len(rows), -1, dtype=np.int64)
+                    carried[keep] = values[rows[keep]]
+                    self._previous[field] = carried
+            alive = set(keys)
+            self._missing = {item for item in self._missing if item[0] in alive}
+            self._keys = keys
+            self._paths = [os.path.join(self.root, path) for path, _ in keys]
+            self._names = [container_name(path) for path, _ in keys]
+        self._scanned = now
+
+    def _read_all(self):
+        n = len(self._keys)
+        values = {field: np.zeros(n, dtype=np.int64) for field in COUNTERS + GAUGES}
+        ok = np.zeros(n, dtype=bool)
+        missing = self._missing
+        for i, (path, key) in enumerate(zip(self._paths, self._keys)):
+            try:
+                for filename in self.files:
+                    if (key, filename) in missing:
+                        continue
+                    try:
+                        text = _read(f"{path}/{filename}")
+                    except OSError as e:
+                        # cpu.stat is in every v2 cgroup, so losing it means the cgroup is gone
+                        if filename == 'cpu.stat':
+                            raise
+                        # No such controller here, or PSI switched off: not going to change, stop asking
+                        if e.errno in (errno.ENOENT, errno.EOPNOTSUPP, errno.EINVAL):
+                            missing.add((key, filename))
+                        continue
+                    if filename == 'cpu.stat':
+                        text = b'\n' + text
+                        values['usage_usec'][i] = _value(text, b'usage_usec')
+                        values['throttled_usec'][i] = _value(text, b'throttled_usec')
+                    elif filename == 'memory.current':
+                        values['memory'][i] = int(text)
+                    elif filename == 'memory.stat':
+                        text = b'\n' + text
+                        values['anon'][i] = _value(text, b'anon')
+                        values['file'][i] = _value(text, b'file')
+                        values['pgmajfault'][i] = _value(text, b'pgmajfault')
+                    elif filename == 'io.stat':
+                        for field, pattern in _IO_KEYS.items():
+                            values[field][i] = sum(int(v) for v in pattern.findall(text))
+                    else:
+                        values[filename.split('.')[0] + '_stall'][i] = _stall(text)
+            except (OSError, ValueError):
+                continue
+            ok[i] = True
+        return values, ok
+
+    @timed
+    def collect(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._scanned is None or now - self._scanned >= self.rescan:
+                self._discover(now)
+            elapsed = now - self._time if self._time is not None else None
+            values, ok = self._read_all()
+            previous = self._previous
+            self._previous = {field: np.where(ok, values[field], -1) for field in COUNTERS + ('memory',)}
+            self._time = now
+
+            n = len(self._keys)
+            if previous is None or not elapsed:
+                seen = np.zeros(n, dtype=bool)
+                previous = {field: np.zeros(n, dtype=np.int64) for field in self._previous}
+            else:
+                # -1 marks a container that wasn't there (or couldn't be read) last tick
+                seen = previous['usage_usec'] >= 0
+            span = elapsed or 1.0
+
+            def rate(field, scale=1.0, clamp=True):
+                delta = (values[field] - previous[field]).astype(np.float64)
+                if clamp:
+                    delta = np.maximum(delta, 0.0)
+                return np.where(seen, delta * scale / span, 0.0)
+
+            frame = pd.DataFrame({
+                'cgroup': [path for path, _ in self._keys],
+                'name': self._names,
+                # usec per second -> % of one core, like a process's cpu_percent
+                'cpu_percent': rate('usage_usec', 1e-4),
+                'throttled_percent': rate('throttled_usec', 1e-4),
+                'memory_bytes': values['memory'],
+                'memory_percent': values['memory'] / self.total_memory * 100,
+                'anon_bytes': values['anon'],
+                'file_bytes': values['file'],
+                # Signed: shrinking containers report negative growth
+                'memory_growth_per_sec': rate('memory', clamp=False),
+                'major_faults_per_sec': rate('pgmajfault'),
+                'read_bytes_per_sec': rate('rbytes'),
+                'write_bytes_per_sec': rate('wbytes'),
+                'read_iops': rate('rios'),
+                'write_iops': rate('wios'),
+                # Stall time per second -> % of the interval some task waited on the resource
+                'cpu_pressure': rate('cpu_stall', 1e-4),
+                'memory_pressure': rate('memory_stall', 1e-4),
+                'io_pressure': rate('io_stall', 1e-4),
+            }, columns=list(CONTAINER_FIELDS))
+            return frame[ok].reset_index(drop=True)
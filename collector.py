@@ -0,0 +1,159 @@
+import os
+import time
+
+import psutil
+
+from instrument import timed
+from snapshot import SnapshotPool
+
+
+class _Tracked:
+    __slots__ = ('proc', 'name', 'io_denied', 'time', 'cpu_time', 'read_bytes', 'write_bytes', 'ctx_switches', 'rss')
+
+    def __init__(self, proc):
+        self.proc = proc
+        try:
+            self.name = proc.name()
+        except psutil.AccessDenied:
+            self.name = ''
+        self.io_denied = False
+        self.time = None
+        self.cpu_time = None
+        self.read_bytes = self.write_bytes = self.ctx_switches = self.rss = 0
+
+
+class ProcessCollector:
+    # Keeps psutil.Process handles between ticks so per-process work is limited to
+    # one oneshot() read for known PIDs; only new PIDs pay for Process() setup. A handle whose
+    # counters go backwards is checked against the PID's create time and replaced if reused.
+    # collect() fills one of two reusable ProcessSnapshots rather than building dicts.
+
+    def __init__(self):
+        self._tracked = {}
+        self._pool = SnapshotPool()
+
+    def _track(self, pid):
+        try:
+            return _Tracked(psutil.Process(pid))
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            return None
+
+    @timed
+    def collect(self, pids=None):
+        # pids: read only these (e.g. the heaviest from the last full scan). Rates are per
+        # process since its own last read, so skipping a process for a few ticks is fine.
+        now = time.monotonic()
+        total_memory = psutil.virtual_memory().total
+
+        alive = set(psutil.pids())
+        # Evict exited PIDs before anything else so the cache never grows unbounded
+        for pid in [pid for pid in self._tracked if pid not in alive]:
+            del self._tracked[pid]
+        pids = sorted(alive) if pids is None else [pid for pid in pids if pid in alive]
+
+        snapshot = self._pool.next(len(pids))
+        names = []
+        pid_col, cpu_col, mem_col, rss_col, threads_col = (snapshot.buffer(field) for field in (
+            'pid', 'cpu_percent', 'memory_percent', 'rss', 'num_threads'))
+        read_col, write_col, voluntary_col, involuntary_col = (snapshot.buffer(field) for field in (
+            'read_bytes', 'write_bytes', 'voluntary_ctx_switches', 'involuntary_ctx_switches'))
+        read_rate, write_rate, ctx_rate, rss_growth = (snapshot.buffer(field) for field in (
+            'read_bytes_per_sec', 'write_bytes_per_sec', 'ctx_switches_per_sec', 'rss_growth_per_sec'))
+
+        i = 0
+        for pid in pids:
+            entry = self._tracked.get(pid)
+            if entry is None:
+                entry = self._track(pid)
+                if entry is None:
+                    continue
+                self._tracked[pid] = entry
+
+            sample = self._read(entry)
+            if sample is not None and self._restarted(entry, sample) and not entry.proc.is_running():
+                # The PID belongs to a new process (is_running() compares the create time); a
+                # fresh handle gets its name and a first read instead of a rate against the old one
+                entry = self._tracked[pid] = self._track(pid)
+                sample = None if entry is None else self._read(entry)
+            if sample is None:
+                self._tracked.pop(pid, None)
+                continue
+            cpu_time, rss, num_threads, ctx, io = sample
+
+            read_bytes, write_bytes = (io.read_bytes, io.write_bytes) if io else (0, 0)
+            voluntary, involuntary = (ctx.voluntary, ctx.involuntary) if ctx else (0, 0)
+            ctx_switches = voluntary + involuntary
+            elapsed = now - entry.time if entry.time is not None else None
+            fresh = cpu_time is None or entry.cpu_time is None or not elapsed
+            pid_col[i] = pid
+            names.append(entry.name)
+            cpu_col[i] = 0.0 if fresh else (cpu_time - entry.cpu_time) / elapsed * 100
+            mem_col[i] = rss / total_memory * 100
+            rss_col[i] = rss
+            threads_col[i] = num_threads
+            read_col[i] = read_bytes
+            write_col[i] = write_bytes
+            voluntary_col[i] = voluntary
+            involuntary_col[i] = involuntary
+            read_rate[i] = 0.0 if fresh else max(read_bytes - entry.read_bytes, 0) / elapsed
+            write_rate[i] = 0.0 if fresh else max(write_bytes - entry.write_bytes, 0) / elapsed
+            ctx_rate[i] = 0.0 if fresh else max(ctx_switches - entry.ctx_switches, 0) / elapsed
+            # Signed: shrinking processes report negative growth
+            rss_growth[i] = 0.0 if fresh else (rss - entry.rss) / elapsed
+            entry.time = now
+            entry.cpu_time = cpu_time
+            entry.read_bytes = read_bytes
+            entry.write_bytes = write_bytes
+            entry.ctx_switches = ctx_switches
+            entry.rss = rss
+            i += 1
+
+        snapshot.n = i
+        snapshot.set_names(names)
+        return snapshot
+
+    @staticmethod
+    def _restarted(entry, sample):
+        # CPU time and context switches only grow for one process; the handle's create time is
+        # cached, so a counter going back is the cheap sign that someone else has the PID now
+        cpu_time, _, _, ctx, _ = sample
+        if cpu_time is None or entry.cpu_time is None:
+            return False
+        return cpu_time < entry.cpu_time or (ctx is not None and ctx.voluntary + ctx.involuntary < entry.ctx_switches)
+
+    @staticmethod
+    def _read(entry):
+        proc = entry.proc
+        try:
+            with proc.oneshot():
+                times = proc.cpu_times()
+                rss = proc.memory_info().rss
+                num_threads = proc.num_threads()
+                ctx = proc.num_ctx_switches()
+                io = None
+                if not entry.io_denied:
+                    try:
+                        io = proc.io_counters()
+                    except (psutil.AccessDenied, AttributeError, NotImplementedError):
+                        # Not going to change for this process; stop asking every tick
+                        entry.io_denied = True
+        except (psutil.NoSuchProcess, psutil.ZombieProcess):
+            return None
+        except psutil.AccessDenied:
+            # Listed with zeroed counters, as it always was; the handle stays so setup isn't redone
+            return None, 0, 0, None, None
+        return times.user + times.system, rss, num_threads, ctx, io
+
+
+# ANALYZER_COLLECTOR=proc selects the direct /proc reader (Linux only); snapshots are identical
+COLLECTOR_BACKENDS = ('psutil', 'proc')
+
+
+def make_collector(backend=None):
+    backend = backend or os.environ.get('ANALYZER_COLLECTOR', 'psutil')
+    if backend == 'proc':
+        from proc_collector import ProcCollector
+        return ProcCollector()
+    if backend != 'psutil':
+        raise ValueError(f"unknown collector backend {backend!r}, expected one of {COLLECTOR_BACKENDS}")
+    return ProcessCollector()
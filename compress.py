@@ -0,0 +1,102 @@
+import gzip
+import threading
+from collections import OrderedDict
+
+
+# Text types worth compressing; images other than SVG are compressed already
+COMPRESSIBLE = ('text/html', 'text/css', 'text/plain', 'text/javascript', 'application/javascript',
+                'application/json', 'image/svg+xml')
+
+# Static files (an ETag, as on assets/, or a max-age, as on Dash's fingerprinted bundles) are
+# compressed hard once and kept; dynamic responses such as callback JSON get a cheaper
+# setting every time
+STATIC_LEVELS = {'br': 11, 'gzip': 9}
+DYNAMIC_LEVELS = {'br': 4, 'gzip': 6}
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+class _CompressedCache:
+    # Compressed static bodies by (path, etag, encoding), LRU by total size
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+
+    def set(self, key, data):
+        with self._lock:
+            if key in self._entries:
+                self._size -= len(self._entries.pop(key))
+            self._entries[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes and self._entries:
+                self._size -= len(self._entries.popitem(last=False)[1])
+
+
+def compress_responses(server, min_size=500, cache_bytes=64 * 1024 * 1024):
+    # after_request hook: brotli when the client takes it and the module is installed
+    # (pip install Brotli; it isn't a requirement), else gzip
+    import flask
+
+    brotli = _brotli()
+    encoders = {'gzip': lambda data, level: gzip.compress(data, level, mtime=0)}
+    if brotli is not None:
+        encoders['br'] = lambda data, level: brotli.compress(data, quality=level)
+    cache = _CompressedCache(cache_bytes)
+
+    def choose(accept):
+        for encoding in ('br', 'gzip'):
+            if encoding in encoders and accept[encoding]:
+                return encoding
+        return None
+
+    @server.after_request
+    def compress(response):
+        if response.status_code != 200 or 'Content-Encoding' in response.headers or \
+                response.mimetype not in COMPRESSIBLE:
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = choose(flask.request.accept_encodings)
+        if encoding is None:
+            return response
+        if response.is_streamed and not response.direct_passthrough:
+            return response
+
+        # send_file hands the WSGI server a file wrapper; take the bytes here instead
+        response.direct_passthrough = False
+        body = response.get_data()
+        if len(body) < min_size:
+            return response
+
+        etag, _ = response.get_etag()
+        static = etag is not None or bool(response.cache_control.max_age)
+        key = (flask.request.full_path, etag, encoding)
+        data = cache.get(key) if static else None
+        if data is None:
+            data = encoders[encoding](body, (STATIC_LEVELS if static else DYNAMIC_LEVELS)[encoding])
+            if static:
+                cache.set(key, data)
+
+        response.set_data(data)
+        response.headers['Content-Encoding'] = encoding
+        if etag:
+            # The bytes differ per encoding, so the validator is only weakly equal now
+            response.set_etag(etag, weak=True)
+        return response
+
+    return server
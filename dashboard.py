@@ -1,43 +1,133 @@
-import psutil
+import os
+import time
 import dash
-from dash import dcc, html
-from dash.dependencies import Input, Output, State
+from dash import dcc, html, dash_table
+from dash.dependencies import Input, Output, State, ALL, ClientsideFunction
 import plotly.graph_objs as go
+import plotly.io as pio
 from dash.exceptions import PreventUpdate
 from dash import ctx
 import numpy as np
-from collections import deque
-cpu_usage_history = deque(maxlen=20)  
-
-app = dash.Dash(__name__, external_stylesheets=["https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css"])
+import pandas as pd
+from alerts import AlertEngine
+from anomaly import PROCESS_FEATURES, PROCESS_FLOOR, SEVERITY_LEVELS, AnomalyDetector, HostAnomalyMonitor, severity_label
+from attribution import CONTAINER_RESOURCES, FEATURE_RESOURCES, RESOURCES, describe, describe_containers, explain
+from cache import ResultCache, cache_callbacks, make_backend
+from cgroup_collector import cgroup_v2_available
+from compress import compress_responses
+from fleet import FleetStore, SharedFleetStore, register_collector
+from forecast import HORIZONS, Forecaster
+from instrument import REGISTRY, instrument_dash, timed
+from phs import DEFAULT_SCORER, phs_score
+from process_table import CONTAINER_COLUMNS, PROCESS_COLUMNS, ContainerTable, ProcessTable
+from rollup import MetricHistory
+from sampler import DEVICE_SLICES, MetricsSampler, SharedSampler
+from shm_ring import SharedLabels
+from stream import register_stream
+
+# Styles and icons are served from assets/ (see build_assets.py), nothing from a CDN.
+# Pages other than Home are added to the layout on first visit, hence suppress_callback_exceptions.
+app = dash.Dash(__name__, suppress_callback_exceptions=True)
 server = app.server
-def calculate_phs():
-    cpu_usage = psutil.cpu_percent()
-    memory_usage = psutil.virtual_memory().percent
-    disk_usage = psutil.disk_io_counters().read_bytes / (1024 * 1024) 
-    network_usage = psutil.net_io_counters().bytes_sent / (1024 * 1024)  
 
-    disk_usage = min(disk_usage / 500 * 100, 100)  
-    network_usage = min(network_usage / 100 * 100, 100) 
 
-    score = 100 - ((cpu_usage * 0.4) + (memory_usage * 0.3) + (disk_usage * 0.2) + (network_usage * 0.1))
+def icon(name):
+    return app.get_asset_url(f"icons/{name}.svg")
 
-    phs_score = max(0, min(100, score))
 
-    reasons = []
-    if phs_score < 80:
-        if cpu_usage > 70:
-            reasons.append("⚠️ High CPU usage detected.")
-        if memory_usage > 75:
-            reasons.append("💾 High memory usage detected.")
-        if disk_usage > 70:
-            reasons.append("📀 High disk activity detected.")
-        if network_usage > 50:
-            reasons.append("🌐 High network traffic detected.")
+# One sampler per host; callbacks only read its latest snapshot. Under gunicorn the
+# collector process from gunicorn.conf.py owns it and workers map its ring read-only.
+SHM_NAME = os.environ.get('ANALYZER_SHM')
+sampler = SharedSampler(SHM_NAME) if SHM_NAME else MetricsSampler(interval=1.0).start()
+
+# Forecast models train on the sampler's history off the request path
+forecaster = Forecaster(sampler).start()
+
+# Alert rules are evaluated next to whoever owns the sampler: here, or in the gunicorn collector
+alert_engine = None if SHM_NAME else AlertEngine(sampler).start()
+
+# Latest process snapshot, served to the Processes page one page at a time
+process_table = ProcessTable(max_age=5.0)
+
+# Container view from cgroup v2 accounting, on hosts that have the unified hierarchy
+container_table = ContainerTable(max_age=5.0) if cgroup_v2_available() else None
+
+# Streaming anomaly detection: the host baseline learns next to whoever owns the sampler (here,
+# or the gunicorn collector, which publishes its state); processes score each snapshot
+host_anomalies = SharedLabels(f"{SHM_NAME}-anomalies") if SHM_NAME else HostAnomalyMonitor(sampler).start()
+process_anomalies = AnomalyDetector(PROCESS_FEATURES, warmup=5, floor=PROCESS_FLOOR)
+
+
+def score_processes(frame):
+    _, severity = process_anomalies.update(frame[list(PROCESS_FEATURES)].to_numpy(dtype=float), frame['pid'].to_numpy())
+    frame['anomaly'] = severity
+
+
+process_table.listeners.append(score_processes)
+
+# gzip/brotli for every text response; registered first so it runs after the other hooks
+compress_responses(server)
+
+# Self-instrumentation: callback/collector latency histograms and host gauges on /metrics
+instrument_dash(app)
+
+
+def host_gauges():
+    metrics = sampler.latest() or {}
+    return [(f"analyzer_host_{field}", f"Latest sampled {field}.", value)
+            for field, value in metrics.items() if field != 'time']
+
+
+REGISTRY.add_gauges(host_gauges)
+
+# Collector for remote agents (python monitor.py --agent http://<this server>/ingest --token ...).
+# Under gunicorn every worker ingests into and reads from the same rings in ANALYZER_FLEET_DIR.
+LOCAL_HOST = 'local'
+FLEET_DIR = os.environ.get('ANALYZER_FLEET_DIR')
+fleet = SharedFleetStore(FLEET_DIR) if FLEET_DIR else FleetStore()
+register_collector(server, fleet)
+
+
+def metrics_source(host):
+    # The local sampler, or the ring of a remote agent; both share the latest()/buffer API
+    if host in (None, LOCAL_HOST):
+        return sampler
+    return fleet.view(host) or sampler
+
+
+# Live samples pushed to every open Dashboard page over Server-Sent Events (/stream?host=...):
+# each sample is read from the ring and encoded once per host, however many tabs are watching
+streams = register_stream(server, lambda host: sampler if host in (None, LOCAL_HOST) else fleet.view(host))
+
+
+def stream_gauges():
+    return [
+        ('analyzer_stream_subscribers', "Open /stream connections.", sum(len(b.subscribers) for b in streams.values())),
+        ('analyzer_stream_published_total', "Samples pushed to /stream subscribers.", sum(b.published for b in streams.values())),
+        ('analyzer_stream_dropped_total', "Subscribers dropped for falling behind.", sum(b.dropped for b in streams.values())),
+    ]
+
+
+REGISTRY.add_gauges(stream_gauges)
+
+
+# 1m/1h rollups per host for the long-range history chart; remote hosts start on first view
+histories = {LOCAL_HOST: MetricHistory(sampler).start()}
+
+
+def history_for(host):
+    if host in (None, LOCAL_HOST) or fleet.view(host) is None:
+        return histories[LOCAL_HOST]
+    if host not in histories:
+        histories[host] = MetricHistory(fleet.view(host)).start()
+    return histories[host]
+
+def calculate_phs(source=None):
+    # Scores the latest sample of the local sampler, or of any sampler-like source; None before the first sample
+    metrics = (source or sampler).latest()
+    return None if metrics is None else phs_score(metrics)
 
-    return phs_score, reasons
 
-  
 # Header Navigation Bar
 header = html.Div([
     html.Div([
@@ -65,7 +155,7 @@ header = html.Div([
                         className="px-6 py-1.5 mx-1 border border-gray-500 bg-transparent text-white text-sm font-medium rounded-md hover:bg-gray-600 hover:shadow-gray-400 hover:scale-105 transition-all duration-300 shadow-md active:scale-150"),
         ], className="flex gap-1.5 mr-4"),
         
-    ], className="flex justify-between items-center px-4 py-4 bg-opacity-90 bg-gray-900 shadow-lg border-b-2 border-cyan-500 backdrop-blur-lg relative"),
+    ], className="flex justify-between items-center px-4 py-4 bg-gray-900/90 shadow-lg border-b-2 border-cyan-500 backdrop-blur-lg relative"),
   
 ])
 
@@ -89,89 +179,89 @@ home_content = html.Div(
         html.Div(
             className="grid grid-cols-1 md:grid-cols-4 gap-6 px-10 mt-8",
             children=[
-                html.Div(className="bg-gray-800 bg-opacity-80 backdrop-blur-md p-8 rounded-lg shadow-xl "
+                html.Div(className="bg-gray-800/80 backdrop-blur-md p-8 rounded-lg shadow-xl "
                                    "transition-transform hover:scale-105 hover:shadow-cyan-500 w-96 h-56",
                          children=[
                              html.H2("🔍 AI-Powered Analysis", className="text-2xl font-semibold text-blue-300"),
                              html.P("AI continuously monitors & analyzes system performance\n"
                                     "to detect inefficiencies before issues occur.",
-                                    className="text-gray-300 text-md mt-2 leading-relaxed whitespace-pre-line"),
+                                    className="text-gray-300 text-base mt-2 leading-relaxed whitespace-pre-line"),
                          ]),
 
-                html.Div(className="bg-gray-800 bg-opacity-80 backdrop-blur-md p-8 rounded-lg shadow-xl "
+                html.Div(className="bg-gray-800/80 backdrop-blur-md p-8 rounded-lg shadow-xl "
                                    "transition-transform hover:scale-105 hover:shadow-yellow-500 w-96 h-56",
                          children=[
                              html.H2("📊 Predictive Insights", className="text-2xl font-semibold text-yellow-300"),
                              html.P("Forecasts future CPU, memory, and disk usage\n"
                                     "to help avoid sudden performance drops.",
-                                    className="text-gray-300 text-md mt-2 leading-relaxed whitespace-pre-line"),
+                                    className="text-gray-300 text-base mt-2 leading-relaxed whitespace-pre-line"),
                          ]),
 
-                html.Div(className="bg-gray-800 bg-opacity-80 backdrop-blur-md p-8 rounded-lg shadow-xl "
+                html.Div(className="bg-gray-800/80 backdrop-blur-md p-8 rounded-lg shadow-xl "
                                    "transition-transform hover:scale-105 hover:shadow-green-500 w-96 h-56",
                          children=[
                              html.H2("🚀 Smart Optimization", className="text-2xl font-semibold text-green-300"),
                              html.P("AI suggests optimizations to reduce lag,\n"
                                     "enhance performance, and save power.",
-                                    className="text-gray-300 text-md mt-2 leading-relaxed whitespace-pre-line"),
+                                    className="text-gray-300 text-base mt-2 leading-relaxed whitespace-pre-line"),
                          ]),
 
-                html.Div(className="bg-gray-800 bg-opacity-80 backdrop-blur-md p-8 rounded-lg shadow-xl "
+                html.Div(className="bg-gray-800/80 backdrop-blur-md p-8 rounded-lg shadow-xl "
                                    "transition-transform hover:scale-105 hover:shadow-indigo-500 w-96 h-56",
                          children=[
                              html.H2("📌 System Health Monitoring", className="text-2xl font-semibold text-indigo-300"),
                              html.P("Tracks real-time performance scores\n"
                                     "to ensure smooth system operation.",
-                                    className="text-gray-300 text-md mt-2 leading-relaxed whitespace-pre-line"),
+                                    className="text-gray-300 text-base mt-2 leading-relaxed whitespace-pre-line"),
                          ]),
             ]
         ),
 
        
         html.Div(className="relative w-full overflow-hidden mt-10", children=[
-            html.Div(className="animate-scroll flex space-x-6 whitespace-nowrap w-full", children=[
+            html.Div(className="animate-scroll flex space-x-6 whitespace-nowrap", children=[
                 html.Div(className="flex space-x-6", children=[
-                    html.Div(className="bg-gray-800 bg-opacity-80 backdrop-blur-md p-8 rounded-lg shadow-xl "
+                    html.Div(className="bg-gray-800/80 backdrop-blur-md p-8 rounded-lg shadow-xl "
                                        "w-96 h-64 overflow-hidden flex flex-col items-center transition-transform hover:scale-105 hover:shadow-cyan-500",
                              children=[
-                                 html.Img(src="https://cdn-icons-png.flaticon.com/512/4281/4281797.png", className="w-16 h-16"),
+                                 html.Img(src=icon("analysis"), className="w-16 h-16"),
                                  html.H2("🔍 AI-Powered Analysis", className="text-xl font-semibold text-blue-300 mt-2"),
                                  html.P("Monitors system efficiency in real time,\n"
                                         "ensuring proactive issue resolution before they impact performance.",
-                                        className="text-gray-300 text-md mt-2 leading-relaxed text-center whitespace-pre-line"),
+                                        className="text-gray-300 text-base mt-2 leading-relaxed text-center whitespace-pre-line"),
                              ]),
 
-                    html.Div(className="bg-gray-800 bg-opacity-80 backdrop-blur-md p-8 rounded-lg shadow-xl "
+                    html.Div(className="bg-gray-800/80 backdrop-blur-md p-8 rounded-lg shadow-xl "
                                        "w-96 h-64 overflow-hidden flex flex-col items-center transition-transform hover:scale-105 hover:shadow-yellow-500",
                              children=[
-                                 html.Img(src="https://cdn-icons-png.flaticon.com/512/2333/2333227.png", className="w-16 h-16"),
+                                 html.Img(src=icon("insights"), className="w-16 h-16"),
                                  html.H2("📊 Predictive Insights", className="text-xl font-semibold text-yellow-300 mt-2"),
                                  html.P("Forecasts CPU, memory, and disk usage\n"
                                         "to prevent performance bottlenecks.",
-                                        className="text-gray-300 text-md mt-2 leading-relaxed text-center whitespace-pre-line"),
+                                        className="text-gray-300 text-base mt-2 leading-relaxed text-center whitespace-pre-line"),
                              ]),
 
-                    html.Div(className="bg-gray-800 bg-opacity-80 backdrop-blur-md p-8 rounded-lg shadow-xl "
+                    html.Div(className="bg-gray-800/80 backdrop-blur-md p-8 rounded-lg shadow-xl "
                                        "w-96 h-64 overflow-hidden flex flex-col items-center transition-transform hover:scale-105 hover:shadow-green-500",
                              children=[
-                                 html.Img(src="https://cdn-icons-png.flaticon.com/512/1057/1057075.png", className="w-16 h-16"),
+                                 html.Img(src=icon("optimization"), className="w-16 h-16"),
                                  html.H2("🚀 Smart Optimization", className="text-xl font-semibold text-green-300 mt-2"),
                                  html.P("AI-based performance tuning suggests ways\n"
                                         "to improve efficiency, enhance responsiveness,\n"
                                         "and reduce power usage.",
-                                        className="text-gray-300 text-md mt-2 leading-relaxed text-center whitespace-pre-line"),
+                                        className="text-gray-300 text-base mt-2 leading-relaxed text-center whitespace-pre-line"),
                              ]),
 
-                    html.Div(className="bg-gray-800 bg-opacity-80 backdrop-blur-md p-8 rounded-lg shadow-xl "
+                    html.Div(className="bg-gray-800/80 backdrop-blur-md p-8 rounded-lg shadow-xl "
                                        "w-96 h-64 overflow-hidden flex flex-col items-center transition-transform hover:scale-105 hover:shadow-red-500",
                              children=[
-                                 html.Img(src="https://cdn-icons-png.flaticon.com/512/1611/1611179.png", className="w-16 h-16"),
+                                 html.Img(src=icon("security"), className="w-16 h-16"),
                                  html.H2("🛡️ Security & Anomaly Detection", className="text-xl font-semibold text-red-300 mt-2"),
                                  html.P("Detects and alerts you about unusual resource spikes,\n"
                                         "which may indicate security threats or software anomalies.",
-                                        className="text-gray-300 text-md mt-2 leading-relaxed text-center whitespace-pre-line"),
+                                        className="text-gray-300 text-base mt-2 leading-relaxed text-center whitespace-pre-line"),
                              ]),
-                ] * 2)  
+                ])
             ]),
         ]),
 
@@ -179,9 +269,9 @@ home_content = html.Div(
         html.Div(className="bg-gray-900 p-6 rounded-lg mt-10 flex flex-wrap justify-center gap-6 shadow-lg", children=[
             html.Button("🚀 Open Dashboard", id="start-dashboard", n_clicks=0,
                         className="px-6 py-3 text-white font-semibold rounded-lg bg-cyan-500 hover:bg-cyan-600 transition-all shadow-xl hover:shadow-cyan-500 animate-bounce"),
-            html.Button("📋 View Active Processes", id="btn-processes", n_clicks=0,
+            html.Button("📋 View Active Processes", id="start-processes", n_clicks=0,
                         className="px-6 py-3 text-white font-semibold rounded-lg bg-purple-600 hover:bg-purple-700 transition-all shadow-xl hover:shadow-purple-500"),
-            html.Button("🚨 Detect Bottlenecks", id="btn-bottlenecks", n_clicks=0,
+            html.Button("🚨 Detect Bottlenecks", id="start-bottlenecks", n_clicks=0,
                         className="px-6 py-3 text-white font-semibold rounded-lg bg-red-600 hover:bg-red-700 transition-all shadow-xl hover:shadow-red-500"),
         ]),
 
@@ -192,25 +282,107 @@ home_content = html.Div(
 )
 
 
-phs_content = html.Div(id='phs-content', style={'padding': '20px', 'display': 'none', 'textAlign': 'center', 'color': 'white'}, children=[
-    html.H2("📉 AI-Powered Performance Health Score (PHS)™", style={'color': '#00ccff'}),
-    dcc.Interval(id='phs-timer', interval=2000, max_intervals=1, disabled=True),  
+def phs_page(analyzing=False):
+    # The page is first sent in answer to a PHS click, so that copy starts out analyzing
+    return [
+        html.H2("📉 AI-Powered Performance Health Score (PHS)™", style={'color': '#00ccff'}),
+        dcc.Interval(id='phs-timer', interval=2000, max_intervals=1, disabled=not analyzing),
+
+        html.Div(id='phs-loading', style={'display': 'block' if analyzing else 'none'}, children=[
+            html.Div("⏳ Analyzing...", style={'fontSize': '22px', 'color': '#ffcc00'}),
+            html.Div(className="loading-circle", style={
+                'width': '50px', 'height': '50px', 'border': '5px solid #00ccff',
+                'borderTop': '5px solid transparent', 'borderRadius': '50%',
+                'animation': 'spin 1s linear infinite', 'margin': 'auto', 'marginTop': '10px'
+            })
+        ]),
+
+        dcc.Graph(id='phs-score', style={'display': 'none'}),
+        html.P(id='phs-details', style={'fontSize': '20px', 'color': 'white', 'display': 'none'})
+    ]
 
-    html.Div(id='phs-loading', style={'display': 'none'}, children=[
-        html.Div("⏳ Analyzing...", style={'fontSize': '22px', 'color': '#ffcc00'}),
-        html.Div(className="loading-circle", style={
-            'width': '50px', 'height': '50px', 'border': '5px solid #00ccff',
-            'borderTop': '5px solid transparent', 'borderRadius': '50%',
-            'animation': 'spin 1s linear infinite', 'margin': 'auto', 'marginTop': '10px'
-        })
-    ]),
 
-    dcc.Graph(id='phs-score', style={'display': 'none'}),
-    html.P(id='phs-details', style={'fontSize': '20px', 'color': 'white', 'display': 'none'})
-])
+phs_content = html.Div(id='phs-content', style={'padding': '20px', 'display': 'none', 'textAlign': 'center', 'color': 'white'},
+                       children=phs_page())
 
 
 # Dashboard Page
+LIVE_METRICS = [
+    ('cpu', "CPU Usage (%)", 'red'),
+    ('memory', "Memory Usage (%)", 'blue'),
+    ('disk_read', "Disk Read (MB/s)", 'yellow'),
+    ('net_sent', "Network Sent (MB/s)", 'green'),
+]
+LIVE_WINDOW = 300  # points kept in the browser per trace
+
+# Sampler field behind each dropdown metric
+METRIC_FIELDS = {'cpu': 'cpu', 'memory': 'memory', 'disk': 'disk_read', 'network': 'net_sent'}
+METRIC_TITLES = {'cpu': "CPU Usage", 'memory': "Memory Usage", 'disk': "Disk Read (MB/s)", 'network': "Network Sent (MB/s)"}
+
+live_figure = go.Figure([go.Scatter(x=[], y=[], mode='lines', name=label, line=dict(color=color))
+                         for _, label, color in LIVE_METRICS])
+live_figure.update_layout(title="Live Metrics", template="plotly_dark", xaxis={'type': 'date'},
+                          margin={'t': 40, 'b': 20}, uirevision='live')
+
+# Per-core heatmap and per-device sparklines for this machine. Each figure is built once
+# per device set; after that a tick appends one column (256 cores + 64 devices at most).
+DEVICE_SPARKLINES = [
+    ('disk-sparklines', "Disk MB/s per device", 'disk', [('disk_read', "read", 'yellow'), ('disk_write', "write", 'orange')]),
+    ('nic-sparklines', "Network MB/s per interface", 'nic', [('net_sent', "sent", 'green'), ('net_recv', "recv", 'cyan')]),
+]
+
+
+def device_columns(rows, series, labels, kind):
+    # Only the slots that have a device behind them
+    return rows[:, DEVICE_SLICES[series]][:, :len(labels[kind])]
+
+
+def core_figure(labels, rows):
+    cores = len(labels['cpu'])
+    figure = go.Figure(go.Heatmap(
+        x=(rows[:, 0] * 1000).round().tolist(),
+        # time x core, shown transposed; whole percents keep a 256-core window small on the wire
+        z=device_columns(rows, 'cpu', labels, 'cpu').round().astype(np.uint8),
+        transpose=True, zmin=0, zmax=100, colorscale='Inferno', colorbar={'title': '%'},
+        hovertemplate="core %{y}<br>%{z}%<extra></extra>"))
+    figure.update_layout(title=f"CPU per core ({cores} logical CPUs)", template="plotly_dark", xaxis={'type': 'date'},
+                         yaxis={'title': 'core'}, height=min(200 + 2 * cores, 700), margin={'t': 40, 'b': 20},
+                         uirevision='cores')
+    return figure
+
+
+# Sparkline figures are plain dicts: building 64 subplots through plotly's validators takes seconds
+DARK_TEMPLATE = go.layout.Template(pio.templates['plotly_dark']).to_plotly_json()
+
+
+def sparkline_figure(title, kind, series, labels, rows):
+    names = labels[kind]
+    if not names:
+        return go.Figure().update_layout(title=f"{title}: no devices", template="plotly_dark", height=150)
+    x = (rows[:, 0] * 1000).round().tolist()
+    columns = [device_columns(rows, field, labels, kind).round(3).T.tolist() for field, _, _ in series]
+    # One y axis per device, top to bottom, on a shared time axis.
+    # Trace order is device-major: (device 0 read, device 0 write, device 1 read, ...)
+    band = 1 / len(names)
+    data, layout = [], {}
+    for i, name in enumerate(names):
+        axis = f"y{i + 1}" if i else 'y'
+        layout[f"yaxis{i + 1}" if i else 'yaxis'] = {
+            'domain': [1 - (i + 1) * band + band * 0.1, 1 - i * band], 'anchor': 'x', 'nticks': 3, 'tickfont': {'size': 8},
+            'title': {'text': name, 'font': {'size': 10}}}
+        for (field, label, color), values in zip(series, columns):
+            data.append({'type': 'scatter', 'x': x, 'y': values[i], 'yaxis': axis, 'mode': 'lines', 'name': label,
+                         'legendgroup': label, 'showlegend': i == 0, 'line': {'color': color, 'width': 1}})
+    layout.update(title={'text': title}, template=DARK_TEMPLATE, height=80 + 60 * len(names),
+                  margin={'t': 40, 'b': 20}, uirevision=kind,
+                  xaxis={'type': 'date', 'anchor': f"y{len(names)}" if len(names) > 1 else 'y'})
+    return {'data': data, 'layout': layout}
+
+
+# Range -> seconds; longer ranges are served from rollups and downsampled to HISTORY_POINTS
+HISTORY_RANGES = [('1h', 3600), ('6h', 6 * 3600), ('24h', 86400), ('7d', 7 * 86400), ('30d', 30 * 86400)]
+HISTORY_POINTS = 2000
+
 dashboard_content = html.Div(id='dashboard-content', style={'padding': '0px',
         'width': '100%',
         'height': '100vh',
@@ -233,19 +405,113 @@ dashboard_content = html.Div(id='dashboard-content', style={'padding': '0px',
             ],
             placeholder="Select a metric...",
             style={'width': '50%', 'color': 'black'}
+        ),
+        html.Label("Host:", style={'color': 'white', 'fontSize': '18px'}),
+        dcc.Dropdown(
+            id="host-select",
+            options=[{'label': 'This machine', 'value': LOCAL_HOST}],
+            value=LOCAL_HOST,
+            clearable=False,
+            style={'width': '50%', 'color': 'black'}
         )
     ], style={'textAlign': 'center', 'marginBottom': '20px'}),
 
-    html.Div(id="selected-metric-container", style={'textAlign': 'center', 'backgroundColor': '#111', 'padding': '20px', 'borderRadius': '10px'})
+    html.Div(id="selected-metric-container", style={'textAlign': 'center', 'backgroundColor': '#111', 'padding': '20px', 'borderRadius': '10px'}),
+
+    # Live mode: samples arrive over /stream and are applied in the browser (assets/stream.js)
+    dcc.Store(id='live-stream'),
+    dcc.Store(id='stream-host'),
+    dcc.Store(id='stream-config', data={'fields': [field for field, _, _ in LIVE_METRICS], 'window': LIVE_WINDOW,
+                                        'gauges': METRIC_FIELDS, 'titles': METRIC_TITLES, 'percent': ['cpu', 'memory'],
+                                        'sparklines': [[kind, [field for field, _, _ in series]]
+                                                       for _, _, kind, series in DEVICE_SPARKLINES]}),
+    dcc.Graph(id='live-graph', figure=live_figure, config={'displayModeBar': False}),
+
+    # Per-core and per-device breakdown: drawn by update_breakdown for each host and device set,
+    # then extended in the browser from the device rows on the same stream
+    dcc.Store(id='device-stream'),
+    dcc.Store(id='breakdown-version'),
+    dcc.Store(id='breakdown-state'),
+    dcc.Graph(id='core-heatmap', config={'displayModeBar': False}),
+    html.Div([dcc.Graph(id=graph_id, config={'displayModeBar': False}, style={'flex': 1})
+              for graph_id, _, _, _ in DEVICE_SPARKLINES], style={'display': 'flex', 'gap': '20px'}),
+
+    # Fleet-wide view of every agent reporting to this server
+    dcc.Interval(id='fleet-interval', interval=5000, disabled=True),
+    html.Div(id='fleet-overview', style={'backgroundColor': '#111', 'padding': '20px', 'borderRadius': '10px', 'marginTop': '20px'}),
+
+    # Long-range history; zooming in re-queries the selected window at a finer resolution
+    html.Div([
+        dcc.Dropdown(id='history-metric', value='cpu', clearable=False, style={'width': '250px', 'color': 'black'},
+                     options=[{'label': label, 'value': field} for field, label, _ in LIVE_METRICS]),
+        dcc.RadioItems(id='history-range', value=3600, inline=True, style={'color': 'white'},
+                       options=[{'label': label, 'value': seconds} for label, seconds in HISTORY_RANGES]),
+        dcc.Checklist(id='history-envelope', options=[{'label': 'Keep spikes (min/max)', 'value': 'minmax'}], value=[],
+                      inline=True, style={'color': 'white'}),
+    ], style={'display': 'flex', 'gap': '20px', 'alignItems': 'center', 'marginTop': '20px'}),
+    dcc.Graph(id='history-graph', config={'displayModeBar': False})
 ])
 
 process_content = html.Div(id='process-content', style={'padding': '20px', 'display': 'none', 'color': 'white'}, children=[
     html.H2("📋 Active Processes", style={'color': '#00ccff', 'textAlign': 'center'}),
-    html.Div(id="process-list", style={'maxHeight': '400px', 'overflowY': 'scroll', 'backgroundColor': '#111', 'padding': '10px', 'borderRadius': '10px'})
+    dcc.RadioItems(id='process-view', value='processes', inline=True,
+                   style={'textAlign': 'center', 'color': 'white'},
+                   options=[{'label': ' Processes ', 'value': 'processes'},
+                            {'label': ' Containers ', 'value': 'containers', 'disabled': container_table is None}]),
+    html.P(id="process-count", style={'textAlign': 'center', 'color': '#aaa'}),
+    dash_table.DataTable(
+        id="process-table",
+        columns=PROCESS_COLUMNS,
+        page_current=0,
+        page_size=25,
+        page_action='custom',
+        sort_action='custom',
+        sort_mode='single',
+        sort_by=[{'column_id': 'cpu_percent', 'direction': 'desc'}],
+        filter_action='custom',
+        filter_query='',
+        style_table={'overflowX': 'auto', 'borderRadius': '10px'},
+        style_header={'backgroundColor': '#222', 'color': '#00ccff', 'fontWeight': 'bold'},
+        style_cell={'backgroundColor': '#111', 'color': 'white', 'border': '1px solid #333', 'padding': '5px'},
+        style_filter={'backgroundColor': '#1a1a1a', 'color': 'white'},
+    )
 ])
 
 
 # Bottlenecks Page
+process_image = icon("process")
+
+# Per host metric: (label, unit, image, tip when severe, tip when moderate)
+BOTTLENECK_INFO = {
+    'cpu': ("CPU Usage", "%", icon("cpu"),
+            "🔧 **Reduce background tasks, enable power-saving mode, and upgrade CPU if necessary.**",
+            "💡 **Reduce active applications and unnecessary browser tabs to free CPU resources.**"),
+    'memory': ("Memory Usage", "%", icon("memory"),
+               "🛠 **Increase virtual memory, close heavy applications, and upgrade RAM if needed.**",
+               "💡 **Clear cache, disable auto-start programs, and increase swap space.**"),
+    'disk_read': ("Disk Reads", " MB/s", icon("disk"),
+                  "💽 **Run disk cleanup, upgrade to an SSD, and disable background disk-heavy processes.**",
+                  "💡 **Avoid running multiple disk-heavy apps simultaneously.**"),
+    'disk_write': ("Disk Writes", " MB/s", icon("disk"),
+                   "💽 **Run disk cleanup, upgrade to an SSD, and disable background disk-heavy processes.**",
+                   "💡 **Avoid running multiple disk-heavy apps simultaneously.**"),
+    'net_sent': ("Network Upload", " MB/s", icon("network"),
+                 "🌍 **Limit streaming quality, check for malware, and optimize router settings.**",
+                 "💡 **Prioritize essential network tasks and close unnecessary network-consuming apps.**"),
+    'net_recv': ("Network Download", " MB/s", icon("network"),
+                 "🌍 **Limit streaming quality, check for malware, and optimize router settings.**",
+                 "💡 **Prioritize essential network tasks and close unnecessary network-consuming apps.**"),
+}
+
+# Containers stalled or throttled past this share of the interval are called out: (label, tip)
+CONTAINER_STALL_PERCENT = 10.0
+CONTAINER_STALLS = {
+    'cpu_pressure': ("waiting for CPU", "🔧 **Give it more CPU, or move busy neighbours off this host.**"),
+    'throttled_percent': ("throttled by its CPU limit", "🔧 **Raise its CPU limit (cpu.max) or spread the work over more replicas.**"),
+    'memory_pressure': ("stalled on memory", "🛠 **Raise its memory limit or cut its working set; it is reclaiming or swapping.**"),
+    'io_pressure': ("stalled on I/O", "💽 **Move it to faster storage or limit its I/O-heavy neighbours (io.max).**"),
+}
+
 bottlenecks_content = html.Div(id='bottlenecks-content', style={'padding': '20px', 'display': 'none', 'textAlign': 'center', 'color': 'white'}, children=[
     html.H2("🚨 Bottlenecks Detected", style={'color': 'red'}),
     html.Div(id="bottleneck-details")
@@ -258,64 +524,112 @@ optimization_content = html.Div(id='optimization-content', style={'padding': '20
 ])
 
 # Predictions Page
+FORECAST_OPTIONS = {
+    'cpu': ("CPU Usage", "CPU Usage (%)"),
+    'memory': ("Memory Usage", "Memory Usage (%)"),
+    'disk_read': ("Disk Read", "Disk Read (MB/s)"),
+    'net_sent': ("Network Sent", "Network Sent (MB/s)"),
+}
+
 predictions_content = html.Div(id='predictions-content', style={'padding': '20px', 'display': 'none', 'textAlign': 'center', 'color': 'white'}, children=[
     html.H2("🔮 Future Resource Forecast", style={'color': '#00ccff'}),
-    html.Button("📈 Predict CPU Usage", id="btn-cpu-predict", n_clicks=0, style={'padding': '10px 20px', 'borderRadius': '10px', 'backgroundColor': '#00ccff', 'color': 'white'}),
+    html.Div([
+        dcc.Dropdown(
+            id="forecast-metric",
+            options=[{'label': label, 'value': metric} for metric, (label, _) in FORECAST_OPTIONS.items()],
+            value='cpu',
+            clearable=False,
+            style={'width': '220px', 'color': 'black'}
+        ),
+        dcc.Dropdown(
+            id="forecast-horizon",
+            options=[{'label': f"Next {h} s", 'value': h} for h in HORIZONS],
+            value=HORIZONS[0],
+            clearable=False,
+            style={'width': '160px', 'color': 'black'}
+        ),
+    ], style={'display': 'flex', 'justifyContent': 'center', 'gap': '10px', 'marginBottom': '10px'}),
+    html.Button("📈 Predict", id="btn-cpu-predict", n_clicks=0, style={'padding': '10px 20px', 'borderRadius': '10px', 'backgroundColor': '#00ccff', 'color': 'white'}),
     dcc.Graph(id='cpu-forecast-graph', style={'display': 'none'})  # Initially hidden
 ])
 @app.callback(
     [Output('cpu-forecast-graph', 'figure'),
      Output('cpu-forecast-graph', 'style')],
-    [Input('btn-cpu-predict', 'n_clicks')]
+    [Input('btn-cpu-predict', 'n_clicks')],
+    [State('forecast-metric', 'value'),
+     State('forecast-horizon', 'value')]
 )
-def predict_cpu_usage(n_clicks):
+@timed
+def predict_cpu_usage(n_clicks, metric, horizon):
     if n_clicks == 0:
         raise PreventUpdate
 
-    # Generate real-time CPU usage history
-    cpu_usage_history.append(psutil.cpu_percent(interval=1))
-
-    # Simulate future predictions (simple trendline based on moving average)
-    history = list(cpu_usage_history)
-    future = [np.mean(history[-5:]) + np.random.uniform(-2, 2) for _ in range(10)]  # Predict next 10 points
+    label, axis_title = FORECAST_OPTIONS[metric]
 
-    # Generate x-axis labels
-    time_stamps = list(range(len(history)))
-    future_stamps = list(range(len(history), len(history) + len(future)))
+    # Forecasts are refit in the background; the request path only reads the cache
+    forecast = forecaster.get(metric, horizon)
+    rows = sampler.buffer.last(2 * horizon)
+    if not len(rows):
+        # Nothing sampled yet
+        return go.Figure().update_layout(title=f"📈 {label} Forecast (collecting history...)", template="plotly_dark"), {'display': 'block'}
+    fields = sampler.buffer.fields
+    now = rows[-1, fields.index('time')]
+    time_stamps = rows[:, fields.index('time')] - now
+    history = rows[:, fields.index(metric)]
 
-    # Create a forecast graph
     figure = go.Figure()
-    figure.add_trace(go.Scatter(x=time_stamps, y=history, mode='lines+markers', name='Historical CPU Usage', line=dict(color='yellow')))
-    figure.add_trace(go.Scatter(x=future_stamps, y=future, mode='lines+markers', name='Predicted CPU Usage', line=dict(color='red', dash='dot')))
-
-    figure.update_layout(title="📈 CPU Usage Forecast",
-                         xaxis_title="Time",
-                         yaxis_title="CPU Usage (%)",
+    figure.add_trace(go.Scatter(x=time_stamps, y=history, mode='lines+markers', name=f'Historical {label}', line=dict(color='yellow')))
+
+    if forecast is not None:
+        future_stamps = forecast['time'] - now + sampler.interval * np.arange(1, horizon + 1)
+        figure.add_trace(go.Scatter(x=future_stamps, y=forecast['upper'], mode='lines', line=dict(width=0), showlegend=False, hoverinfo='skip'))
+        figure.add_trace(go.Scatter(x=future_stamps, y=forecast['lower'], mode='lines', line=dict(width=0), fill='tonexty',
+                                    fillcolor='rgba(255, 0, 0, 0.2)', name='95% Confidence'))
+        figure.add_trace(go.Scatter(x=future_stamps, y=forecast['mean'], mode='lines+markers', name=f'Predicted {label}', line=dict(color='red', dash='dot')))
+
+    figure.update_layout(title=f"📈 {label} Forecast" if forecast is not None else f"📈 {label} Forecast (collecting history...)",
+                         xaxis_title="Seconds from now",
+                         yaxis_title=axis_title,
                          template="plotly_dark")
 
     return figure, {'display': 'block'}
 
 
 # Main Layout
+# Only the header and Home ship with the first load. The other pages start as empty
+# containers and navigate() sends each one's children the first time it is opened.
+LAZY_PAGES = [phs_content, dashboard_content, process_content, bottlenecks_content, optimization_content, predictions_content]
+
+
+def page_shell(page):
+    return html.Div(id=page.id, style=dict(page.style, display='none'))
+
+
 app.layout = html.Div([
     header,
     home_content,
-    phs_content, 
-    dashboard_content,
-    process_content,
-    bottlenecks_content,
-    optimization_content,
-    predictions_content
+    dcc.Store(id='loaded-pages', data=[]),
+    *[page_shell(page) for page in LAZY_PAGES]
 ], style={'backgroundColor': '#000', 'color': 'white', 'height': '100vh', 'padding': '10px'})
 
+# Page shown by each navigation button
+PAGE_BUTTONS = {
+    'btn-home': 'home-content',
+    'btn-dashboard': 'dashboard-content', 'start-dashboard': 'dashboard-content',
+    'btn-phs': 'phs-content',
+    'btn-bottlenecks': 'bottlenecks-content', 'start-bottlenecks': 'bottlenecks-content',
+    'btn-optimizations': 'optimization-content',
+    'btn-predictions': 'predictions-content',
+    'btn-processes': 'process-content', 'start-processes': 'process-content',
+}
+PAGE_ORDER = ['home-content', 'dashboard-content', 'phs-content', 'bottlenecks-content', 'optimization-content',
+              'predictions-content', 'process-content']
+
+
 @app.callback(
-    [Output('home-content', 'style'),
-     Output('dashboard-content', 'style'),
-     Output('phs-content', 'style'),  
-     Output('bottlenecks-content', 'style'),
-     Output('optimization-content', 'style'),
-     Output('predictions-content', 'style'),
-    Output('process-content', 'style')],
+    [Output(page, 'style') for page in PAGE_ORDER]
+    + [Output(page.id, 'children') for page in LAZY_PAGES]
+    + [Output('loaded-pages', 'data')],
     [Input('btn-home', 'n_clicks'),
      Input('btn-dashboard', 'n_clicks'),
      Input('btn-phs', 'n_clicks'), 
@@ -323,106 +637,134 @@ app.layout = html.Div([
      Input('btn-optimizations', 'n_clicks'),
      Input('btn-predictions', 'n_clicks'),
      Input('start-dashboard', 'n_clicks'),
-     Input('btn-processes', 'n_clicks')]
+     Input('btn-processes', 'n_clicks'),
+     Input('start-processes', 'n_clicks'),
+     Input('start-bottlenecks', 'n_clicks')],
+    State('loaded-pages', 'data')
 )
-def navigate(home, dashboard, phs, bottlenecks, optimizations, predictions, start,processes):
+@timed
+def navigate(home, dashboard, phs, bottlenecks, optimizations, predictions, start,processes, start_processes, start_bottlenecks, loaded):
     ctx = dash.callback_context
-    if not ctx.triggered:
-        return [{'display': 'block'}, {'display': 'none'}, {'display': 'none'}, {'display': 'none'}, {'display': 'none'}, {'display': 'none'},{'display': 'none'}]
+    shown = PAGE_BUTTONS.get(ctx.triggered[0]['prop_id'].split('.')[0]) if ctx.triggered else 'home-content'
 
-    button_id = ctx.triggered[0]['prop_id'].split('.')[0]
-    
-    return [
-        {'display': 'block' if button_id == 'btn-home' else 'none'},
-        {'display': 'block' if button_id in ['btn-dashboard', 'start-dashboard'] else 'none'},
-        {'display': 'block' if button_id == 'btn-phs' else 'none'},  
-        {'display': 'block' if button_id == 'btn-bottlenecks' else 'none'},
-        {'display': 'block' if button_id == 'btn-optimizations' else 'none'},
-        {'display': 'block' if button_id == 'btn-predictions' else 'none'},
-        {'display': 'block' if button_id == 'btn-processes' else 'none'}
-    ]
+    styles = [{'display': 'block' if page == shown else 'none'} for page in PAGE_ORDER]
+    children = [dash.no_update] * len(LAZY_PAGES)
+    loaded = loaded or []
+    if shown == 'home-content' or shown in loaded:
+        return styles + children + [dash.no_update]
+
+    # First visit: send the page's layout along with showing it
+    index = [page.id for page in LAZY_PAGES].index(shown)
+    children[index] = phs_page(analyzing=True) if shown == 'phs-content' else LAZY_PAGES[index].children
+    return styles + children + [loaded + [shown]]
 
 
 @app.callback(
-    Output('process-list', 'children'),
-    Input('btn-processes', 'n_clicks')
+    [Output('process-table', 'data'),
+     Output('process-table', 'page_count'),
+     Output('process-count', 'children'),
+     Output('process-table', 'columns'),
+     Output('process-table', 'page_current')],
+    [Input('btn-processes', 'n_clicks'),
+     Input('start-processes', 'n_clicks'),
+     Input('process-table', 'page_current'),
+     Input('process-table', 'page_size'),
+     Input('process-table', 'sort_by'),
+     Input('process-table', 'filter_query'),
+     Input('process-view', 'value')]
 )
-def list_active_processes(n_clicks):
-    if n_clicks == 0:
+@timed
+def list_active_processes(n_clicks, start_clicks, page_current, page_size, sort_by, filter_query, view='processes'):
+    if not (n_clicks or start_clicks):
         raise PreventUpdate
 
-   
+    containers = view == 'containers' and container_table is not None
+    table, columns, noun = (container_table, CONTAINER_COLUMNS, "containers") if containers else \
+        (process_table, PROCESS_COLUMNS, "processes")
+
+    # Re-sample on button clicks; paging, sorting and filtering reuse the held snapshot.
+    # Switching views starts over on the first page.
+    if ctx.triggered_id in ('btn-processes', 'start-processes'):
+        table.refresh(force=True)
+    if ctx.triggered_id == 'process-view':
+        page_current = 0
 
-    process_data = []
-    for proc in psutil.process_iter(['pid', 'name',  'memory_percent']):
-        try:
-            process_info = proc.info
-            process_data.append(f"🔹 PID: {process_info['pid']} | Name: {process_info['name']}  | RAM: {process_info['memory_percent']}%")
-        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-            pass
+    rows, page_count, total = table.page(page_current, page_size, sort_by, filter_query)
 
-    if not process_data:
-        return html.P("⚠️ No active processes found!", style={'color': 'red'})
+    if not total:
+        return [], 1, f"⚠️ No active {noun} found!", columns, page_current
 
-    return html.Div([html.P(proc, style={'margin': '5px 0'}) for proc in process_data])
+    return rows, page_count, f"{total} {noun}", columns, page_current
 
 
 
 @app.callback(
     [Output('bottleneck-details', 'children'),
      Output('optimization-suggestions', 'children')],
-    Input('btn-bottlenecks', 'n_clicks')
+    [Input('btn-bottlenecks', 'n_clicks'),
+     Input('start-bottlenecks', 'n_clicks')]
 )
-def detect_bottlenecks(n_clicks):
-    cpu_usage = psutil.cpu_percent(interval=1)
-    memory_usage = psutil.virtual_memory().percent
-    disk_usage = psutil.disk_io_counters().read_bytes / 1e6
-    network_usage = psutil.net_io_counters().bytes_sent / 1e6
+@timed
+def detect_bottlenecks(n_clicks, start_clicks):
+    # Anomalies are judged against each metric's learned baseline, not fixed cutoffs
+    state = host_anomalies.get()
+    processes = process_table.refresh()
+    containers = container_table.refresh() if container_table is not None else None
 
     bottlenecks = []
     optimizations = []
 
-    # Image URLs
-    cpu_image = "https://cdn-icons-png.flaticon.com/512/4341/4341026.png"
-    memory_image = "https://cdn-icons-png.flaticon.com/512/1048/1048949.png"
-    disk_image = "https://cdn-icons-png.flaticon.com/512/1027/1027328.png"
-    network_image = "https://cdn-icons-png.flaticon.com/512/857/857708.png"
-
-    # **🚀 CPU Bottleneck Detection**
-    if cpu_usage > 85:
-        bottlenecks.append((cpu_image, "🔥 **High CPU Usage** – Close unused applications or upgrade CPU."))
-        optimizations.append("🔧 **Reduce background tasks, enable power-saving mode, and upgrade CPU if necessary.**")
-    elif 70 <= cpu_usage <= 85:
-        bottlenecks.append((cpu_image, "⚠️ **Moderate CPU Usage** – Running intensive tasks. Consider optimizing performance."))
-        optimizations.append("💡 **Reduce active applications and unnecessary browser tabs to free CPU resources.**")
-
-    # **💾 Memory Bottleneck Detection**
-    if memory_usage > 90:
-        bottlenecks.append((memory_image, "💾 **Critical Memory Usage** – System may freeze! Close programs or add more RAM."))
-        optimizations.append("🛠 **Increase virtual memory, close heavy applications, and upgrade RAM if needed.**")
-    elif 75 <= memory_usage <= 90:
-        bottlenecks.append((memory_image, "⚠️ **High Memory Usage** – Consider closing unused apps or increasing RAM."))
-        optimizations.append("💡 **Clear cache, disable auto-start programs, and increase swap space.**")
-
-    # **📀 Disk Bottleneck Detection**
-    if disk_usage > 300:
-        bottlenecks.append((disk_image, "📀 **High Disk Read/Write Usage** – Reduce disk-intensive tasks."))
-        optimizations.append("💽 **Run disk cleanup, upgrade to an SSD, and disable background disk-heavy processes.**")
-    elif 100 <= disk_usage <= 300:
-        bottlenecks.append((disk_image, "⚠️ **Moderate Disk Usage** – Heavy operations detected."))
-        optimizations.append("💡 **Avoid running multiple disk-heavy apps simultaneously.**")
-
-    # **🌐 Network Bottleneck Detection**
-    if network_usage > 100:
-        bottlenecks.append((network_image, "🌐 **High Network Traffic** – Limit downloads or bandwidth-heavy applications."))
-        optimizations.append("🌍 **Limit streaming quality, check for malware, and optimize router settings.**")
-    elif 50 <= network_usage <= 100:
-        bottlenecks.append((network_image, "⚠️ **Moderate Network Usage** – Check active downloads."))
-        optimizations.append("💡 **Prioritize essential network tasks and close unnecessary network-consuming apps.**")
+    if state is None or not state['warm']:
+        progress = f" ({state['progress']}/{state['warmup']} samples)" if state else ""
+        return html.P(f"⏳ Learning this host's baseline{progress}...",
+                      style={'fontSize': '18px', 'color': '#ffcc00'}), ""
+
+    anomalies = state['anomalies']
+    offenders = explain(anomalies, processes)
+    container_offenders = explain(anomalies, containers, table=CONTAINER_RESOURCES, key='cgroup')
+
+    for feature, value, center, score, level in anomalies:
+        label, unit, image_url, severe_tip, moderate_tip = BOTTLENECK_INFO[feature]
+        icon = "🔥" if level == 'critical' else "⚠️"
+        resource = FEATURE_RESOURCES.get(feature)
+        top = offenders.get(resource, [])
+        top_containers = container_offenders.get(resource, [])[:3]
+        details = (describe(resource, top) if top else []) + \
+            (describe_containers(resource, top_containers) if top_containers else [])
+        bottlenecks.append((image_url, f"{icon} **Unusual {label}** – {value:.1f}{unit} vs. a usual {center:.1f}{unit} "
+                                       f"(severity {score:.1f}σ, {level})", details))
+        tip = severe_tip if level in ('critical', 'high') else moderate_tip
+        if top:
+            pid, name, _, share = top[0]
+            tip += f" Start with {name} (PID {pid}), which accounts for {share:.0%} of host {RESOURCES[resource][1]}."
+        optimizations.append(tip)
+
+    if offenders.get('ctx_switches'):
+        pid, name, _, share = offenders['ctx_switches'][0]
+        bottlenecks.append((process_image, "🔁 **Context switches** behind the CPU load", describe('ctx_switches', offenders['ctx_switches'])))
+        if share >= 0.5:
+            optimizations.append(f"{name} (PID {pid}) causes {share:.0%} of context switches; check it for lock contention or busy polling.")
+
+    # Containers losing a good share of their time waiting on a resource (cgroup PSI) or their CPU limit
+    if containers is not None and len(containers):
+        for column, (what, tip) in CONTAINER_STALLS.items():
+            stalled = containers[containers[column] >= CONTAINER_STALL_PERCENT].nlargest(3, column)
+            for row in stalled.itertuples():
+                bottlenecks.append((process_image, f"📦 **{row.name}** {what} {getattr(row, column):.0f}% of the time",
+                                    [row.cgroup]))
+            if len(stalled):
+                optimizations.append(f"{tip} ({', '.join(stalled['name'])})")
+
+    # Processes that are far off their own baseline
+    if len(processes) and 'anomaly' in processes:
+        top = processes[processes['anomaly'] >= SEVERITY_LEVELS[-1][0]].nlargest(5, 'anomaly')
+        for proc in top.itertuples():
+            bottlenecks.append((process_image, f"🧩 **{proc.name}** (PID {proc.pid}) – {severity_label(proc.anomaly)} anomaly, "
+                                               f"severity {proc.anomaly:.1f}σ", []))
 
     # **No Bottlenecks Detected**
     if not bottlenecks:
-        return html.P(" No bottlenecks detected. System is running optimally!", style={'fontSize': '18px', 'color': 'green'}), ""
+        return html.P(" No anomalies detected. Every metric is within its usual range!", style={'fontSize': '18px', 'color': 'green'}), ""
 
     return html.Div([
         html.Div([
@@ -431,9 +773,11 @@ def detect_bottlenecks(n_clicks):
                 'display': 'block', 'margin': 'auto',
                 'animation': 'zoomIn 1.5s ease-in-out'
             }),
-            html.P(text, style={'fontSize': '18px', 'color': 'white', 'textAlign': 'center'})
-        ], style={'padding': '20px', 'marginBottom': '20px', 'borderRadius': '10px', 'backgroundColor': '#111'})
-        for image_url, text in bottlenecks
+            html.P(text, style={'fontSize': '18px', 'color': 'white', 'textAlign': 'center'}),
+            html.Ul([html.Li(line) for line in details], style={'color': '#ccc', 'textAlign': 'left', 'display': 'inline-block'})
+            if details else None
+        ], style={'padding': '20px', 'marginBottom': '20px', 'borderRadius': '10px', 'backgroundColor': '#111', 'textAlign': 'center'})
+        for image_url, text, details in bottlenecks
     ]), html.Div([
         html.P(tip, style={'fontSize': '18px', 'color': 'cyan'}) for tip in optimizations
     ])
@@ -452,13 +796,17 @@ from dash import ctx
     [State('phs-timer', 'disabled')],
     prevent_initial_call=True
 )
+@timed
 def update_phs(n_clicks, n_intervals, is_timer_disabled):
    
     if ctx.triggered_id == "btn-phs":
         return {'display': 'block'}, {'display': 'none'}, {'display': 'none'}, go.Figure(), "", False  # Start Timer
 
     if n_intervals is not None:  # Timer completed
-        phs_value, reasons = calculate_phs()
+        scored = calculate_phs()
+        if scored is None:
+            return {'display': 'none'}, {'display': 'none'}, {'display': 'block'}, go.Figure(), "⏳ No samples yet – try again in a moment.", True
+        phs_value, reasons = scored
 
       
         phs_graph = go.Figure(go.Indicator(
@@ -483,41 +831,9 @@ app.index_string = '''
 <html>
 <head>
     <title>AI Performance Analyzer</title>
-    <style>
-        /* Zoom-In Animation */
-        @keyframes zoomIn {
-            0% { transform: scale(0.5); opacity: 0; }
-            100% { transform: scale(1); opacity: 1; }
-        }
-
-        /* Spinner Animation */
-        @keyframes spin {
-            0% { transform: rotate(0deg); }
-            100% { transform: rotate(360deg); }
-        }
-
-        /* Center Loader */
-        .loading-circle {
-            width: 50px;
-            height: 50px;
-            border: 5px solid #00ccff;
-            border-top: 5px solid transparent;
-            border-radius: 50%;
-            animation: spin 1s linear infinite;
-            margin: auto;
-            margin-top: 10px;
-        }
-       @keyframes scroll {
-    0% { transform: translateX(0); }
-    100% { transform: translateX(-50%); }
-}
-.animate-scroll {
-    display: flex;
-    animation: scroll 15s linear infinite;
-}
-
-    </style>
-    <script src="https://cdn.tailwindcss.com"></script>
+    {%metas%}
+    {%favicon%}
+    {%css%}
 </head>
 <body>
     {%app_entry%}
@@ -530,27 +846,36 @@ app.index_string = '''
 </html>
 '''
 
+def metric_text(metric, title, value):
+    return f"📌 Current {title}: {value:.2f} {'%' if metric in ['cpu', 'memory'] else 'MB/s'}"
+
+
 # ** Metric Selection Callback (Gauge Indicators for All Metrics)**
 @app.callback(
     Output('selected-metric-container', 'children'),
-    Input('metric-dropdown', 'value')
+    [Input('metric-dropdown', 'value'),
+     Input('host-select', 'value')]
 )
-def update_metric(selected_metric):
+@timed
+def update_metric(selected_metric, host=LOCAL_HOST):
     if not selected_metric:
         return html.P("Please select a metric to display.", className="text-white text-lg text-center")
 
-    #  Fetch Real-time Metrics
-    cpu_usage = psutil.cpu_percent(interval=1)
-    memory_usage = psutil.virtual_memory().percent
-    disk_usage = psutil.disk_io_counters().read_bytes / 1e6  # Convert to MB
-    network_usage = psutil.net_io_counters().bytes_sent / 1e6  # Convert to MB
+    #  Latest snapshot from the background sampler (or the selected agent)
+    metrics = metrics_source(host).latest()
+    if metrics is None:
+        return html.P("Waiting for the first sample...", className="text-white text-lg text-center")
+    cpu_usage = metrics['cpu']
+    memory_usage = metrics['memory']
+    disk_usage = metrics['disk_read']  # MB/s
+    network_usage = metrics['net_sent']  # MB/s
 
     #  Metric Data (Title, Value, Styling, Gauge Color)
     metric_data = {
-        "cpu": ("CPU Usage", cpu_usage, "text-red-400 border-red-500 shadow-red-500", "red"),
-        "memory": ("Memory Usage", memory_usage, "text-blue-400 border-blue-500 shadow-blue-500", "blue"),
-        "disk": ("Disk Read (MB)", disk_usage, "text-yellow-400 border-yellow-500 shadow-yellow-500", "yellow"),
-        "network": ("Network Sent (MB)", network_usage, "text-green-400 border-green-500 shadow-green-500", "green"),
+        "cpu": (METRIC_TITLES['cpu'], cpu_usage, "text-red-400 border-red-500 shadow-red-500", "red"),
+        "memory": (METRIC_TITLES['memory'], memory_usage, "text-blue-400 border-blue-500 shadow-blue-500", "blue"),
+        "disk": (METRIC_TITLES['disk'], disk_usage, "text-yellow-400 border-yellow-500 shadow-yellow-500", "yellow"),
+        "network": (METRIC_TITLES['network'], network_usage, "text-green-400 border-green-500 shadow-green-500", "green"),
     }
 
     #  Ensure a Single Parent Container
@@ -568,6 +893,7 @@ def update_metric(selected_metric):
                         
                         # 📊 Gauge for each metric
                         dcc.Graph(
+                            id={'type': 'metric-gauge', 'metric': key},
                             figure=go.Figure(go.Indicator(
                                 mode="gauge+number",
                                 value=value,
@@ -592,14 +918,14 @@ def update_metric(selected_metric):
 
                         # digital Metric Display
                         html.Div(
-                            className="mt-4 text-center text-white text-md font-semibold",
+                            className="mt-4 text-center text-white text-base font-semibold",
                             children=[
-                                html.P(f"📌 Current {title}: {value:.2f}%", className="mb-2"),
+                                html.P(metric_text(key, title, value), id={'type': 'metric-value', 'metric': key}, className="mb-2"),
                                 html.P("🔎 AI Insights: Optimizing performance...", className="text-gray-400 text-sm italic"),
                             ]
                         )
                     ]
-                ) for title, value, style, color in metric_data.values()
+                ) for key, (title, value, style, color) in metric_data.items()
             ]
         )
 
@@ -640,6 +966,7 @@ def update_metric(selected_metric):
                         
                         #  Centered Gauge
                         dcc.Graph(
+                            id={'type': 'metric-gauge', 'metric': selected_metric},
                             figure=gauge_figure,
                             config={'displayModeBar': False},
                             className="w-full"
@@ -649,7 +976,7 @@ def update_metric(selected_metric):
                         html.Div(
     className="mt-6 text-center text-white text-lg font-semibold",
     children=[
-        html.P(f"📌 Current {title}: {value:.2f} {'%' if selected_metric in ['cpu', 'memory'] else 'MB'}", className="mb-2"),
+        html.P(metric_text(selected_metric, title, value), id={'type': 'metric-value', 'metric': selected_metric}, className="mb-2"),
         html.P("🔎 AI Insights: Optimizing performance...", className="text-gray-400 text-sm italic"),
     ]
 )
@@ -665,6 +992,178 @@ def update_metric(selected_metric):
     return content
 
 
+@app.callback(
+    Output('fleet-interval', 'disabled'),
+    Input('dashboard-content', 'style')
+)
+@timed
+def toggle_live(style):
+    # Only poll while the Dashboard page is visible
+    return (style or {}).get('display') == 'none'
+
+
+@app.callback(
+    Output('live-graph', 'figure'),
+    Input('host-select', 'value'),
+    prevent_initial_call=True
+)
+@timed
+def reset_live(host):
+    # Switching hosts starts the chart over instead of mixing two hosts' points
+    return live_figure
+
+
+# One EventSource per tab while the Dashboard page is visible; each batch of samples then
+# extends the chart and gauges without a server round-trip
+app.clientside_callback(
+    ClientsideFunction('stream', 'follow'),
+    Output('stream-host', 'data'),
+    [Input('dashboard-content', 'style'),
+     Input('host-select', 'value')]
+)
+
+app.clientside_callback(
+    ClientsideFunction('stream', 'render'),
+    [Output('live-graph', 'extendData'),
+     Output({'type': 'metric-gauge', 'metric': ALL}, 'figure'),
+     Output({'type': 'metric-value', 'metric': ALL}, 'children')],
+    Input('live-stream', 'data'),
+    [State('stream-config', 'data'),
+     State({'type': 'metric-gauge', 'metric': ALL}, 'figure')],
+    prevent_initial_call=True
+)
+
+
+@app.callback(
+    [Output('core-heatmap', 'figure')] +
+    [Output(graph_id, 'figure') for graph_id, _, _, _ in DEVICE_SPARKLINES] +
+    [Output('breakdown-state', 'data')],
+    [Input('host-select', 'value'),
+     Input('breakdown-version', 'data')]
+)
+@timed
+def update_breakdown(host, version):
+    # Draws the breakdown for a host, and again when stream.js sees its device set change
+    # (breakdown-version); in between the stream's device rows are appended in the browser
+    source = metrics_source(host)
+    if not hasattr(source, 'device_history'):
+        # Agents only report host totals
+        blank = go.Figure().update_layout(title="Per-core and per-device data is only collected for this machine",
+                                          template="plotly_dark", height=150)
+        return [blank] + [go.Figure()] * len(DEVICE_SPARKLINES) + [{'host': host}]
+
+    labels, rows = source.device_history(LIVE_WINDOW)
+    if not len(rows):
+        raise PreventUpdate
+    outputs = [core_figure(labels, rows)]
+    for _, title, kind, series in DEVICE_SPARKLINES:
+        outputs.append(sparkline_figure(title, kind, series, labels, rows))
+    return outputs + [{'host': host, 'version': labels['version'], 'time': float(rows[-1, 0])}]
+
+
+# Appends the stream's device rows to the breakdown figures, or asks update_breakdown to draw
+# them again when they belong to another host or an older device set
+app.clientside_callback(
+    ClientsideFunction('stream', 'breakdown'),
+    [Output('core-heatmap', 'extendData')] +
+    [Output(graph_id, 'extendData') for graph_id, _, _, _ in DEVICE_SPARKLINES] +
+    [Output('breakdown-version', 'data')],
+    [Input('device-stream', 'data'),
+     Input('breakdown-state', 'data')],
+    State('stream-config', 'data'),
+    prevent_initial_call=True
+)
+
+
+FLEET_FIELDS = ('cpu', 'memory', 'disk_read', 'net_sent')
+
+
+@app.callback(
+    [Output('host-select', 'options'),
+     Output('fleet-overview', 'children')],
+    Input('fleet-interval', 'n_intervals')
+)
+@timed
+def update_fleet(n_intervals):
+    options = [{'label': 'This machine', 'value': LOCAL_HOST}] + [{'label': host, 'value': host} for host in fleet.hosts()]
+    hosts, latest, summary = fleet.aggregate(FLEET_FIELDS)
+    if not hosts:
+        return options, html.P("No agents reporting. Start one with: python monitor.py --agent http://<this server>/ingest",
+                               className="text-gray-400 text-sm italic")
+
+    # Every host's PHS in one vectorized call over the same (hosts, fields) array
+    scores, _ = DEFAULT_SCORER.score_rows(latest, FLEET_FIELDS, reasons=False)
+    figure = go.Figure([
+        go.Bar(x=hosts, y=latest[:, 0], name="CPU %", marker_color='red'),
+        go.Bar(x=hosts, y=latest[:, 1], name="Memory %", marker_color='blue'),
+        go.Bar(x=hosts, y=scores.round(1), name="PHS", marker_color='#00ffcc'),
+    ])
+    figure.update_layout(title=f"🌐 Fleet Overview ({len(hosts)} hosts)", barmode='group', template="plotly_dark",
+                         yaxis={'range': [0, 100]}, margin={'t': 40, 'b': 20})
+
+    return options, html.Div([
+        dcc.Graph(figure=figure, config={'displayModeBar': False}),
+        html.P(f"CPU avg {summary['cpu']['mean']:.1f}% / max {summary['cpu']['max']:.1f}%  |  "
+               f"Memory avg {summary['memory']['mean']:.1f}% / max {summary['memory']['max']:.1f}%  |  "
+               f"Disk read {summary['disk_read']['sum']:.2f} MB/s  |  Network sent {summary['net_sent']['sum']:.2f} MB/s",
+               className="text-white text-base"),
+    ])
+
+
+def zoom_window(relayout):
+    # (start, end) from a zoom on the history chart, or None when it was reset
+    if not relayout or 'xaxis.range[0]' not in relayout:
+        return None
+    return pd.Timestamp(relayout['xaxis.range[0]']).timestamp(), pd.Timestamp(relayout['xaxis.range[1]']).timestamp()
+
+
+@app.callback(
+    Output('history-graph', 'figure'),
+    [Input('history-metric', 'value'),
+     Input('history-range', 'value'),
+     Input('history-envelope', 'value'),
+     Input('host-select', 'value'),
+     Input('history-graph', 'relayoutData')]
+)
+@timed
+def update_history(field, seconds, envelope, host=LOCAL_HOST, relayout=None):
+    end = time.time()
+    start = end - seconds
+    zoomed = zoom_window(relayout) if ctx.triggered_id == 'history-graph' else None
+    if ctx.triggered_id == 'history-graph' and zoomed is None and 'xaxis.autorange' not in (relayout or {}):
+        # Hover/drag events that don't change the window
+        raise PreventUpdate
+    if zoomed is not None:
+        start, end = zoomed
+
+    method = 'minmax' if 'minmax' in (envelope or []) else 'lttb'
+    series = history_for(host).query(field, start, end, HISTORY_POINTS, method)
+    x = (series['time'] * 1000).round().tolist()
+    label = next(label for key, label, _ in LIVE_METRICS if key == field)
+
+    traces = []
+    if series['min'] is not None:
+        traces.append(go.Scatter(x=x, y=series['max'].round(2).tolist(), mode='lines', line={'width': 0}, showlegend=False, hoverinfo='skip'))
+        traces.append(go.Scatter(x=x, y=series['min'].round(2).tolist(), mode='lines', line={'width': 0}, fill='tonexty',
+                                 fillcolor='rgba(0,255,204,0.2)', name="min–max"))
+    traces.append(go.Scatter(x=x, y=series['value'].round(2).tolist(), mode='lines', name=label, line={'color': '#00ffcc'}))
+
+    resolution = series['resolution']
+    step = f"{resolution / 3600:g}h" if resolution >= 3600 else f"{resolution / 60:g}m" if resolution >= 60 else f"{resolution:g}s"
+    figure = go.Figure(traces)
+    figure.update_layout(title=f"{label} history ({len(x)} points at {step} resolution)", template="plotly_dark",
+                         xaxis={'type': 'date'}, margin={'t': 40, 'b': 20}, uirevision=f"{field}-{seconds}-{host}")
+    return figure
+
+
+# Viewers asking for the same thing within a second share one computation and its JSON
+callback_cache = cache_callbacks(app, {
+    detect_bottlenecks: (),
+    update_phs: (),
+    update_metric: None,
+}, ResultCache(make_backend(), ttl=1.0))
+
+
 if __name__ == '__main__':
     app.run(debug=True)
 
@@ -0,0 +1,93 @@
+import os
+import shutil
+
+import numpy as np
+
+
+# Per-container rates drawn at creation: usec of CPU, bytes and ios per second, stall usec per second
+RATE_FIELDS = ('usage_usec', 'throttled_usec', 'rbytes', 'wbytes', 'rios', 'wios', 'pgmajfault',
+               'cpu_stall', 'memory_stall', 'io_stall')
+
+
+class FakeCgroupfs:
+    # Writes a cgroup v2 tree under root with `containers` leaf cgroups (docker scopes, a few
+    # systemd services and kubepods), each with the accounting files CgroupCollector reads.
+    # advance(seconds) moves every counter on by its rate and swaps out `churn` of the
+    # containers, so a collector sees steady rates plus some coming and going.
+
+    def __init__(self, root, containers=200, churn=0.01, seed=0, pressure=True):
+        self.root = root
+        self.churn = churn
+        self.pressure = pressure
+        self._rng = np.random.default_rng(seed)
+        self._next = 0
+        self._groups = {}
+        shutil.rmtree(root, ignore_errors=True)
+        os.makedirs(root)
+        with open(os.path.join(root, 'cgroup.controllers'), 'w') as f:
+            f.write("cpuset cpu io memory pids\n")
+        for _ in range(containers):
+            self._spawn()
+
+    def _spawn(self):
+        rng = self._rng
+        i = self._next
+        self._next += 1
+        if i % 10 == 0:
+            path = f"system.slice/service-{i}.service"
+        elif i % 10 == 1:
+            path = f"kubepods.slice/kubepods-pod{i:08x}.slice/cri-containerd-{rng.bytes(32).hex()}.scope"
+        else:
+            path = f"system.slice/docker-{rng.bytes(32).hex()}.scope"
+        group = {field: 0 for field in RATE_FIELDS}
+        group['rates'] = {
+            'usage_usec': rng.exponential(2e5), 'throttled_usec': rng.exponential(1e4),
+            'rbytes': rng.exponential(1e6), 'wbytes': rng.exponential(5e5),
+            'rios': rng.exponential(100), 'wios': rng.exponential(50), 'pgmajfault': rng.exponential(5),
+            'cpu_stall': rng.exponential(2e4), 'memory_stall': rng.exponential(5e3), 'io_stall': rng.exponential(1e4),
+        }
+        group['memory'] = int(rng.lognormal(19, 1.5))
+        self._groups[path] = group
+        self._write(path, group)
+
+    def _write(self, path, group):
+        directory = os.path.join(self.root, path)
+        os.makedirs(directory, exist_ok=True)
+        memory = group['memory']
+        files = {
+            'cgroup.procs': "",
+            'cpu.stat': f"usage_usec {group['usage_usec']}\nuser_usec {group['usage_usec'] * 2 // 3}\n"
+                        f"system_usec {group['usage_usec'] // 3}\nnr_periods 0\nnr_throttled 0\n"
+                        f"throttled_usec {group['throttled_usec']}\n",
+            'memory.current': f"{memory}\n",
+            'memory.stat': f"anon {memory * 3 // 4}\nfile {memory // 4}\nkernel 0\nsock 0\n"
+                           f"pgfault {group['pgmajfault'] * 100}\npgmajfault {group['pgmajfault']}\n",
+            'io.stat': f"8:0 rbytes={group['rbytes']} wbytes={group['wbytes']} rios={group['rios']} "
+                       f"wios={group['wios']} dbytes=0 dios=0\n"
+                       f"253:0 rbytes={group['rbytes'] // 2} wbytes=0 rios=0 wios=0 dbytes=0 dios=0\n",
+        }
+        if self.pressure:
+            for resource in ('cpu', 'memory', 'io'):
+                stall = group[f"{resource}_stall"]
+                files[f"{resource}.pressure"] = (f"some avg10=0.00 avg60=0.00 avg300=0.00 total={stall}\n"
+                                                 f"full avg10=0.00 avg60=0.00 avg300=0.00 total={stall // 2}\n")
+        for filename, text in files.items():
+            with open(os.path.join(directory, filename), 'w') as f:
+                f.write(text)
+
+    def advance(self, seconds=1.0):
+        n = int(len(self._groups) * self.churn)
+        if n:
+            for path in self._rng.choice(sorted(self._groups), n, replace=False).tolist():
+                del self._groups[path]
+                shutil.rmtree(os.path.join(self.root, path), ignore_errors=True)
+            for _ in range(n):
+                self._spawn()
+        for path, group in self._groups.items():
+            for field, rate in group['rates'].items():
+                group[field] += int(rate * seconds)
+            group['memory'] = max(group['memory'] + int(self._rng.normal(0, 1e6)), 0)
+            self._write(path, group)
+
+    def close(self):
+        shutil.rmtree(self.root, ignore_errors=True)
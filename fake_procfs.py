@@ -0,0 +1,73 @@
+import os
+import shutil
+import time
+
+from fake_psutil import FakeProcess
+
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+
+class FakeProcfs:
+    # Writes a FakePsutil host out as a /proc tree (stat, statm, status, io per pid), so the
+    # psutil backend (via psutil.PROCFS_PATH) and ProcCollector can be timed on the same input
+
+    def __init__(self, fake, root):
+        self.fake = fake
+        self.root = root
+        self.boot_time = int(time.time()) - 86400
+        shutil.rmtree(root, ignore_errors=True)
+        os.makedirs(root)
+        with open('/proc/meminfo') as f:
+            lines = f.read().splitlines()
+        total = f"MemTotal:       {fake._total_memory // 1024} kB"
+        with open(os.path.join(root, 'meminfo'), 'w') as dst:
+            dst.write('\n'.join(total if line.startswith('MemTotal:') else line for line in lines) + '\n')
+        with open(os.path.join(root, 'stat'), 'w') as f:
+            f.write(f"cpu  0 0 0 0 0 0 0 0 0 0\nbtime {self.boot_time}\n")
+        self._written = set()
+        self.write()
+
+    def advance(self):
+        self.fake.advance()
+        self.write()
+
+    def write(self):
+        # Drop exited pids, (re)write every live one with current counters
+        alive = set(self.fake._procs)
+        for pid in self._written - alive:
+            shutil.rmtree(os.path.join(self.root, str(pid)), ignore_errors=True)
+        for pid in alive:
+            self._write_process(FakeProcess(self.fake, pid))
+        self._written = alive
+
+    def _write_process(self, proc):
+        directory = os.path.join(self.root, str(proc.pid))
+        os.makedirs(directory, exist_ok=True)
+        name = proc.name()
+        times = proc.cpu_times()
+        rss_pages = proc.memory_info().rss // PAGE_SIZE
+        threads = proc.num_threads()
+        ctx = proc.num_ctx_switches()
+        io = proc.io_counters()
+        start = int((proc.create_time() - self.boot_time) * CLOCK_TICKS)
+        utime, stime = int(times.user * CLOCK_TICKS), int(times.system * CLOCK_TICKS)
+
+        files = {
+            'stat': f"{proc.pid} ({name}) S 1 {proc.pid} {proc.pid} 0 -1 4194304 0 0 0 0 {utime} {stime} 0 0 20 0 "
+                    f"{threads} 0 {start} {rss_pages * 2 * PAGE_SIZE} {rss_pages} 18446744073709551615 "
+                    + " ".join(['0'] * 28) + "\n",
+            'statm': f"{rss_pages * 2} {rss_pages} 0 0 0 0 0\n",
+            'status': f"Name:\t{name}\nState:\tS (sleeping)\nTgid:\t{proc.pid}\nPid:\t{proc.pid}\nPPid:\t1\n"
+                      f"Uid:\t0\t0\t0\t0\nGid:\t0\t0\t0\t0\nThreads:\t{threads}\n"
+                      f"voluntary_ctxt_switches:\t{ctx.voluntary}\nnonvoluntary_ctxt_switches:\t{ctx.involuntary}\n",
+            'io': f"rchar: {io.read_bytes}\nwchar: {io.write_bytes}\nsyscr: {io.read_count}\nsyscw: {io.write_count}\n"
+                  f"read_bytes: {io.read_bytes}\nwrite_bytes: {io.write_bytes}\ncancelled_write_bytes: 0\n",
+        }
+        for filename, text in files.items():
+            with open(os.path.join(directory, filename), 'w') as f:
+                f.write(text)
+
+    def close(self):
+        shutil.rmtree(self.root, ignore_errors=True)
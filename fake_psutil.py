@@ -0,0 +1,183 @@
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+import numpy as np
+from psutil import AccessDenied, NoSuchProcess, ZombieProcess
+
+
+# Synthetic stand-in for the parts of psutil the analyzer uses. Counters grow linearly with
+# wall time from per-object random rates, so rate engines see realistic, non-zero deltas.
+
+svmem = namedtuple('svmem', 'total available percent used free')
+sdiskio = namedtuple('sdiskio', 'read_count write_count read_bytes write_bytes read_time write_time')
+snetio = namedtuple('snetio', 'bytes_sent bytes_recv packets_sent packets_recv errin errout dropin dropout')
+pcputimes = namedtuple('pcputimes', 'user system children_user children_system')
+pmem = namedtuple('pmem', 'rss vms')
+pio = namedtuple('pio', 'read_count write_count read_bytes write_bytes')
+pctxsw = namedtuple('pctxsw', 'voluntary involuntary')
+
+__all__ = ['FakePsutil', 'AccessDenied', 'NoSuchProcess', 'ZombieProcess']
+
+
+class FakePsutil:
+    NoSuchProcess = NoSuchProcess
+    AccessDenied = AccessDenied
+    ZombieProcess = ZombieProcess
+
+    def __init__(self, processes=1000, disks=4, nics=2, cpus=8, churn=0.01, seed=0):
+        self._rng = np.random.default_rng(seed)
+        self._start = time.monotonic()
+        self._cpus = cpus
+        self.churn = churn
+        self._total_memory = 64 * 1024 ** 3
+        self._next_pid = 1
+        self._procs = {}
+        for _ in range(processes):
+            self._spawn()
+
+        self._disks = {f"nvme{i}n1": self._rng.uniform(1e5, 5e7, 4) for i in range(disks)}
+        self._nics = {f"eth{i}": self._rng.uniform(1e4, 1e7, 4) for i in range(nics)}
+
+    def _spawn(self):
+        pid = self._next_pid
+        self._next_pid += 1
+        rng = self._rng
+        self._procs[pid] = {
+            'name': f"proc-{pid % 97}",
+            'create_time': time.time(),
+            'born': self._elapsed(),
+            'cpu_rate': rng.exponential(0.02),
+            'rss': int(rng.lognormal(17, 1.5)),
+            'threads': int(rng.integers(1, 64)),
+            'io_rate': rng.exponential(2e4, 2),
+            'ctx_rate': rng.exponential(50, 2),
+        }
+
+    def _elapsed(self):
+        return time.monotonic() - self._start
+
+    def advance(self):
+        # Simulate process churn between ticks: some exit, the same number are born
+        n = int(len(self._procs) * self.churn)
+        if n:
+            for pid in self._rng.choice(list(self._procs), n, replace=False).tolist():
+                del self._procs[pid]
+            for _ in range(n):
+                self._spawn()
+
+    # -- host level --
+
+    def cpu_count(self, logical=True):
+        return self._cpus
+
+    def cpu_percent(self, interval=None, percpu=False):
+        if interval:
+            time.sleep(interval)
+        values = self._rng.uniform(0, 100, self._cpus).round(1)
+        return values.tolist() if percpu else float(values.mean().round(1))
+
+    def virtual_memory(self):
+        used = min(sum(p['rss'] for p in self._procs.values()), self._total_memory)
+        return svmem(self._total_memory, self._total_memory - used, round(used / self._total_memory * 100, 1), used, self._total_memory - used)
+
+    def disk_io_counters(self, perdisk=False, nowrap=True):
+        t = self._elapsed()
+        disks = {name: sdiskio(int(r[2] * t / 4096), int(r[3] * t / 4096), int(r[0] * t), int(r[1] * t), 0, 0)
+                 for name, r in self._disks.items()}
+        if perdisk:
+            return disks
+        return sdiskio(*(sum(values) for values in zip(*disks.values())))
+
+    def net_io_counters(self, pernic=False, nowrap=True):
+        t = self._elapsed()
+        nics = {name: snetio(int(r[0] * t), int(r[1] * t), int(r[2] * t / 1000), int(r[3] * t / 1000), 0, 0, 0, 0)
+                for name, r in self._nics.items()}
+        if pernic:
+            return nics
+        return snetio(*(sum(values) for values in zip(*nics.values())))
+
+    # -- process level --
+
+    def pids(self):
+        return list(self._procs)
+
+    def Process(self, pid):
+        if pid not in self._procs:
+            raise NoSuchProcess(pid)
+        return FakeProcess(self, pid)
+
+    def process_iter(self, attrs=None, ad_value=None):
+        for pid in list(self._procs):
+            proc = FakeProcess(self, pid)
+            if attrs is not None:
+                proc.info = proc.as_dict(attrs, ad_value)
+            yield proc
+
+
+class FakeProcess:
+    def __init__(self, host, pid):
+        self._host = host
+        self.pid = pid
+        # Like psutil, a handle remembers the create time of the process it was made for
+        self._create_time = self._state()['create_time']
+
+    def _state(self):
+        try:
+            return self._host._procs[self.pid]
+        except KeyError:
+            raise NoSuchProcess(self.pid) from None
+
+    def _age(self):
+        return self._host._elapsed() - self._state()['born']
+
+    @contextmanager
+    def oneshot(self):
+        yield
+
+    def create_time(self):
+        return self._create_time
+
+    def is_running(self):
+        state = self._host._procs.get(self.pid)
+        return state is not None and state['create_time'] == self._create_time
+
+    def name(self):
+        return self._state()['name']
+
+    def cpu_times(self):
+        busy = self._state()['cpu_rate'] * self._age()
+        return pcputimes(busy * 0.7, busy * 0.3, 0.0, 0.0)
+
+    def cpu_percent(self, interval=None):
+        return round(self._state()['cpu_rate'] * 100, 1)
+
+    def memory_info(self):
+        rss = self._state()['rss']
+        return pmem(rss, rss * 2)
+
+    def memory_percent(self):
+        return self._state()['rss'] / self._host._total_memory * 100
+
+    def num_threads(self):
+        return self._state()['threads']
+
+    def num_ctx_switches(self):
+        rates = self._state()['ctx_rate'] * self._age()
+        return pctxsw(int(rates[0]), int(rates[1]))
+
+    def io_counters(self):
+        read, write = self._state()['io_rate'] * self._age()
+        return pio(int(read / 4096), int(write / 4096), int(read), int(write))
+
+    def as_dict(self, attrs, ad_value=None):
+        info = {}
+        for attr in attrs:
+            if attr == 'pid':
+                info[attr] = self.pid
+                continue
+            try:
+                info[attr] = getattr(self, attr)()
+            except AccessDenied:
+                info[attr] = ad_value
+        return info
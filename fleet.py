@@ -0,0 +1,485 @@
+import hashlib
+import hmac
+import json
+import os
+import queue
+import socket
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+import numpy as np
+
+from instrument import timed
+from sampler import RingBuffer
+from shm_ring import SharedRingBuffer
+
+
+# Batch wire format: MAGIC + zlib(header + field names + little-endian float64 rows)
+MAGIC = b'PAB1'
+_HEADER = struct.Struct('<BHHI')  # version, host length, field-names length, row count
+VERSION = 1
+
+# Most a batch may inflate to; an agent's usual batch of 10 samples is under 1 KB
+MAX_BATCH_BYTES = 4 * 1024 * 1024
+MAX_HOST_LENGTH = 253
+
+
+class FleetFull(Exception):
+    pass
+
+
+def encode_batch(host, fields, rows):
+    rows = np.ascontiguousarray(rows, dtype='<f8')
+    host_bytes = host.encode()
+    names = '\x00'.join(fields).encode()
+    raw = _HEADER.pack(VERSION, len(host_bytes), len(names), len(rows)) + host_bytes + names + rows.tobytes()
+    return MAGIC + zlib.compress(raw, 6)
+
+
+def decode_batch(data, max_size=MAX_BATCH_BYTES):
+    # Raises ValueError (or zlib.error/struct.error) for anything that isn't a well-formed batch
+    if data[:4] != MAGIC:
+        raise ValueError("not a metrics batch")
+    inflater = zlib.decompressobj()
+    raw = inflater.decompress(data[4:], max_size)
+    if inflater.unconsumed_tail:
+        raise ValueError(f"batch inflates past {max_size} bytes")
+    version, host_len, names_len, nrows = _HEADER.unpack_from(raw)
+    if version != VERSION:
+        raise ValueError(f"unsupported batch version {version}")
+    offset = _HEADER.size
+    host = raw[offset:offset + host_len].decode()
+    offset += host_len
+    fields = tuple(raw[offset:offset + names_len].decode().split('\x00'))
+    offset += names_len
+    if not host or len(host) > MAX_HOST_LENGTH or not host.isprintable():
+        raise ValueError("bad host name")
+    if 'time' not in fields or len(set(fields)) != len(fields):
+        raise ValueError("fields must be distinct and include 'time'")
+    if not nrows or len(raw) - offset != nrows * len(fields) * 8:
+        raise ValueError("row data doesn't match the header")
+    rows = np.frombuffer(raw, dtype='<f8', offset=offset).reshape(nrows, len(fields))
+    if not np.isfinite(rows[:, fields.index('time')]).all():
+        raise ValueError("sample times must be finite")
+    return host, fields, rows
+
+
+# -- collector side (runs inside the dashboard's Flask server) --
+
+def insert_rows(buffer, rows, time_at):
+    # Writes rows into a ring in time order. A batch that isn't newer than what is there, such
+    # as a spool replayed after fresher batches got through, is merged into place (a repeated
+    # timestamp keeps the later copy) instead of landing after newer rows; whatever falls off
+    # the start of a full ring is dropped. Writers to one ring must take turns.
+    rows = rows[np.argsort(rows[:, time_at], kind='stable')]
+    start = buffer.count
+    latest = buffer.latest()
+    if latest is not None and rows[0, time_at] <= latest[time_at]:
+        stored = buffer.last()
+        k = len(stored) - int(np.searchsorted(stored[:, time_at], rows[0, time_at]))
+        merged = np.concatenate([stored[len(stored) - k:], rows])
+        merged = merged[np.argsort(merged[:, time_at], kind='stable')]
+        times = merged[:, time_at]
+        rows = merged[np.append(times[1:] != times[:-1], True)]
+        start -= k
+    if len(rows) > buffer.size:
+        start += len(rows) - buffer.size
+        rows = rows[-buffer.size:]
+    buffer.write_at(start, rows)
+
+
+def _interval(rows, time_at):
+    steps = np.diff(np.sort(rows[:, time_at]))
+    steps = steps[steps > 0]
+    return float(np.median(steps)) if len(steps) else 1.0
+
+
+class HostView:
+    # Sampler-like read API over one remote host's ring
+    def __init__(self, buffer, interval):
+        self.buffer = buffer
+        self.interval = interval
+
+    def latest(self):
+        row = self.buffer.latest()
+        return None if row is None else dict(zip(self.buffer.fields, row.tolist()))
+
+    def history(self, field, n=None):
+        return self.buffer.last(n)[:, self.buffer.fields.index(field)]
+
+
+class FleetStore:
+    # Remote hosts' rings in this process's memory; fine for a single worker or the dev server.
+    # A host silent for `ttl` seconds is forgotten, and past max_hosts new hosts are refused.
+
+    def __init__(self, size=3600, stale_after=30.0, ttl=24 * 3600, max_hosts=1000):
+        self.size = size
+        self.stale_after = stale_after
+        self.ttl = ttl
+        self.max_hosts = max_hosts
+        self._hosts = {}
+        self._seen = {}
+        self._swept = 0.0
+        self._lock = threading.Lock()
+
+    @timed
+    def ingest(self, host, fields, rows):
+        time_at = fields.index('time')
+        with self._lock:
+            now = time.time()
+            self._evict(now)
+            view = self._hosts.get(host)
+            if view is None or view.buffer.fields != fields:
+                if view is None and len(self._hosts) >= self.max_hosts:
+                    raise FleetFull(f"already tracking {self.max_hosts} hosts")
+                view = self._hosts[host] = HostView(RingBuffer(self.size, fields), _interval(rows, time_at))
+            insert_rows(view.buffer, rows, time_at)
+            self._seen[host] = now
+
+    def _evict(self, now):
+        if now - self._swept < min(self.ttl, 60.0):
+            return
+        self._swept = now
+        for host, seen in list(self._seen.items()):
+            if now - seen > self.ttl:
+                del self._hosts[host], self._seen[host]
+
+    def hosts(self):
+        with self._lock:
+            return sorted(self._hosts)
+
+    def view(self, host):
+        with self._lock:
+            return self._hosts.get(host)
+
+    def _live(self, now):
+        with self._lock:
+            return [(host, view) for host, view in self._hosts.items() if now - self._seen[host] <= self.stale_after]
+
+    def aggregate(self, fields=('cpu', 'memory', 'disk_read', 'net_sent')):
+        # Latest sample per live host, plus fleet mean/max/sum per field
+        hosts, latest = [], []
+        for host, view in sorted(self._live(time.time()), key=lambda item: item[0]):
+            row = view.latest()
+            if row is not None:
+                hosts.append(host)
+                latest.append([row.get(field, np.nan) for field in fields])
+        latest = np.array(latest, dtype=np.float64).reshape(len(hosts), len(fields))
+        summary = {}
+        if len(hosts):
+            for i, field in enumerate(fields):
+                summary[field] = {
+                    'mean': float(np.nanmean(latest[:, i])),
+                    'max': float(np.nanmax(latest[:, i])),
+                    'sum': float(np.nansum(latest[:, i])),
+                }
+        return hosts, latest, summary
+
+
+class SharedFleetStore(FleetStore):
+    # The same store in a directory every gunicorn worker maps (a tmpfs such as /dev/shm keeps
+    # it in memory), so a host's batches land in one history whichever worker took the POST.
+    # Each host is <key>.json, naming the host, its fields and its current ring file, plus that
+    # ring; the json's mtime is when the host was last heard from. Writers take turns on an
+    # flock of the directory; readers go through the rings' seqlocks without locking.
+
+    def __init__(self, directory, size=3600, stale_after=30.0, ttl=24 * 3600, max_hosts=1000):
+        import fcntl
+
+        super().__init__(size, stale_after, ttl, max_hosts)
+        self._fcntl = fcntl
+        self.directory = directory
+        # key -> (json inode, host, HostView), remapped when a host's json is replaced
+        self._open = {}
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def _key(host):
+        return hashlib.sha1(host.encode()).hexdigest()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    @contextmanager
+    def _locked(self):
+        with open(self._path('.lock'), 'a') as f:
+            self._fcntl.flock(f, self._fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                self._fcntl.flock(f, self._fcntl.LOCK_UN)
+
+    def _keys(self):
+        return sorted(name[:-5] for name in os.listdir(self.directory) if name.endswith('.json'))
+
+    def _attach(self, key):
+        # (host, HostView) for one key, or None once the host is gone
+        try:
+            inode = os.stat(self._path(key + '.json')).st_ino
+            cached = self._open.get(key)
+            if cached is not None and cached[0] == inode:
+                return cached[1:]
+            with open(self._path(key + '.json')) as f:
+                meta = json.load(f)
+            ring = SharedRingBuffer(meta['ring'], fields=tuple(meta['fields']), directory=self.directory, writable=True)
+        except (OSError, ValueError):
+            self._open.pop(key, None)
+            return None
+        self._open[key] = (inode, meta['host'], HostView(ring, ring.interval))
+        return self._open[key][1:]
+
+    @timed
+    def ingest(self, host, fields, rows):
+        time_at = fields.index('time')
+        key = self._key(host)
+        with self._locked():
+            now = time.time()
+            self._evict(now)
+            opened = self._attach(key)
+            if opened is None or opened[1].buffer.fields != fields:
+                if opened is None and len(self._keys()) >= self.max_hosts:
+                    raise FleetFull(f"already tracking {self.max_hosts} hosts")
+                self._create(key, host, fields, _interval(rows, time_at))
+                opened = self._attach(key)
+            insert_rows(opened[1].buffer, rows, time_at)
+            os.utime(self._path(key + '.json'))
+
+    def _create(self, key, host, fields, interval):
+        # A new ring under a new name, then the json pointing at it: readers see the old ring or
+        # the new one, never a mix. The ring it replaces goes once nothing points at it.
+        ring_name = f"{key}-{time.time_ns()}.ring"
+        SharedRingBuffer(ring_name, self.size, fields, create=True, interval=interval, directory=self.directory).close()
+        tmp = self._path(f".{key}.json.tmp")
+        with open(tmp, 'w') as f:
+            json.dump({'host': host, 'fields': list(fields), 'ring': ring_name}, f)
+        os.replace(tmp, self._path(key + '.json'))
+        self._sweep_rings()
+
+    def _sweep_rings(self):
+        current = set()
+        for key in self._keys():
+            try:
+                with open(self._path(key + '.json')) as f:
+                    current.add(json.load(f)['ring'])
+            except (OSError, ValueError):
+                continue
+        for name in os.listdir(self.directory):
+            if name.endswith('.ring') and name not in current:
+                try:
+                    os.remove(self._path(name))
+                except FileNotFoundError:
+                    pass
+
+    def _evict(self, now):
+        if now - self._swept < min(self.ttl, 60.0):
+            return
+        self._swept = now
+        expired = False
+        for key in self._keys():
+            try:
+                if now - os.stat(self._path(key + '.json')).st_mtime > self.ttl:
+                    os.remove(self._path(key + '.json'))
+                    expired = True
+            except FileNotFoundError:
+                continue
+        if expired:
+            self._sweep_rings()
+
+    def hosts(self):
+        return sorted(opened[0] for opened in map(self._attach, self._keys()) if opened is not None)
+
+    def view(self, host):
+        opened = self._attach(self._key(host))
+        return None if opened is None else opened[1]
+
+    def _live(self, now):
+        live = []
+        for key in self._keys():
+            try:
+                fresh = now - os.stat(self._path(key + '.json')).st_mtime <= self.stale_after
+            except FileNotFoundError:
+                continue
+            opened = self._attach(key) if fresh else None
+            if opened is not None:
+                live.append(opened)
+        return live
+
+
+def register_collector(server, store, max_in_flight=8, token=None, max_batch_bytes=MAX_BATCH_BYTES):
+    # Batches beyond max_in_flight concurrent ingests get 503 + Retry-After; agents back off and spool.
+    # Agents send "Authorization: Bearer <token>" (default $ANALYZER_INGEST_TOKEN); with no token
+    # configured only clients on this machine may ingest.
+    import flask
+
+    token = token or os.environ.get('ANALYZER_INGEST_TOKEN')
+    slots = threading.BoundedSemaphore(max_in_flight)
+
+    def authorized(request):
+        if token:
+            return hmac.compare_digest(request.headers.get('Authorization', '').encode(), f"Bearer {token}".encode())
+        return request.remote_addr in ('127.0.0.1', '::1')
+
+    @server.route('/ingest', methods=['POST'])
+    def ingest():
+        if not authorized(flask.request):
+            return flask.Response(status=401, headers={'WWW-Authenticate': 'Bearer'})
+        if not slots.acquire(blocking=False):
+            return flask.Response(status=503, headers={'Retry-After': '1'})
+        try:
+            # Never read more than a batch may be, whatever Content-Length says (or doesn't)
+            data = flask.request.stream.read(max_batch_bytes + 1)
+            if len(data) > max_batch_bytes:
+                return flask.Response(f"batches are at most {max_batch_bytes} bytes", status=413)
+            try:
+                host, fields, rows = decode_batch(data, max_batch_bytes)
+            except (ValueError, zlib.error, struct.error) as e:
+                return flask.Response(str(e), status=400)
+            try:
+                store.ingest(host, fields, rows)
+            except FleetFull as e:
+                return flask.Response(str(e), status=503, headers={'Retry-After': '60'})
+        finally:
+            slots.release()
+        return flask.Response(status=204)
+
+    return server
+
+
+# -- agent side (monitor.py --agent) --
+
+class Shipper:
+    # Sends encoded batches over one keep-alive HTTP session from a background thread.
+    # When the collector is slow the in-memory queue fills and new batches go to the spool
+    # directory; when it is down, failed batches go there too and are replayed oldest first.
+
+    def __init__(self, url, spool_dir='agent_spool', max_queue=32, max_spool_files=10000, timeout=5.0, token=None):
+        import requests
+
+        self.url = url
+        self.spool_dir = spool_dir
+        self.max_spool_files = max_spool_files
+        self.timeout = timeout
+        self._session = requests.Session()
+        self._session.headers['Content-Type'] = 'application/octet-stream'
+        if token:
+            self._session.headers['Authorization'] = f"Bearer {token}"
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._backoff = 0.0
+        self._thread = None
+        os.makedirs(spool_dir, exist_ok=True)
+
+    def submit(self, payload):
+        try:
+            self._queue.put_nowait(payload)
+        except queue.Full:
+            self._spool(payload)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="agent-shipper", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, flush_timeout=5.0):
+        deadline = time.monotonic() + flush_timeout
+        while not self._queue.empty() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        # Whatever could not be delivered survives on disk for the next run
+        while True:
+            try:
+                self._spool(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        self._session.close()
+
+    def _spool(self, payload):
+        files = self._spooled()
+        if len(files) >= self.max_spool_files:
+            os.remove(files[0])
+        name = os.path.join(self.spool_dir, f"batch-{time.time_ns():020d}.bin")
+        with open(name + '.tmp', 'wb') as f:
+            f.write(payload)
+        os.replace(name + '.tmp', name)
+
+    def _spooled(self):
+        return sorted(os.path.join(self.spool_dir, f) for f in os.listdir(self.spool_dir) if f.endswith('.bin'))
+
+    def _send(self, payload):
+        import requests
+
+        try:
+            response = self._session.post(self.url, data=payload, timeout=self.timeout)
+        except requests.RequestException:
+            return False
+        if response.status_code in (429, 503):
+            # Collector asked us to slow down
+            self._backoff = max(float(response.headers.get('Retry-After', 1)), self._backoff)
+            return False
+        if response.status_code in (401, 403):
+            # Not a bad batch but a wrong or missing token: keep it spooled until that's fixed
+            self._backoff = max(self._backoff, 60.0)
+            return False
+        # 4xx other than backpressure means the batch itself is bad; retrying won't help
+        return response.ok or 400 <= response.status_code < 500
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self._backoff:
+                if self._stop.wait(self._backoff):
+                    break
+
+            spooled = self._spooled()
+            if spooled:
+                with open(spooled[0], 'rb') as f:
+                    payload = f.read()
+                if self._send(payload):
+                    os.remove(spooled[0])
+                    self._backoff = 0.0
+                else:
+                    self._backoff = min(max(self._backoff * 2, 1.0), 60.0)
+                continue
+
+            try:
+                payload = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if self._send(payload):
+                self._backoff = 0.0
+            else:
+                self._spool(payload)
+                self._backoff = min(max(self._backoff * 2, 1.0), 60.0)
+
+
+def run_agent(url, host=None, interval=1.0, batch_size=10, spool_dir='agent_spool', duration=None, token=None):
+    from sampler import SAMPLE_FIELDS, MetricsSampler
+
+    host = host or socket.gethostname()
+    sampler = MetricsSampler(interval)
+    shipper = Shipper(url, spool_dir=spool_dir, token=token or os.environ.get('ANALYZER_INGEST_TOKEN')).start()
+    # Prime cpu_percent and the I/O counters so the first batch carries real rates
+    sampler.sample()
+    time.sleep(interval)
+
+    rows = []
+    deadline = None if duration is None else time.monotonic() + duration
+    try:
+        while deadline is None or time.monotonic() < deadline:
+            rows.append(sampler.sample())
+            if len(rows) >= batch_size:
+                shipper.submit(encode_batch(host, SAMPLE_FIELDS, rows))
+                rows = []
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if rows:
+            shipper.submit(encode_batch(host, SAMPLE_FIELDS, rows))
+        shipper.stop()
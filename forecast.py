@@ -0,0 +1,162 @@
+import threading
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import lfilter, lfiltic
+
+from instrument import timed
+
+
+FORECAST_METRICS = ('cpu', 'memory', 'disk_read', 'net_sent')
+PERCENT_METRICS = ('cpu', 'memory')
+
+# Horizons are in sampler ticks (1s by default)
+HORIZONS = (10, 30, 60)
+
+# Two-sided 95% band
+Z_95 = 1.96
+
+
+class ARModel:
+    # AR(p) with intercept, fitted by exponentially weighted least squares.
+    # Only the normal-equation sums are kept, so new samples update the fit in O(p^2)
+    # each and old behaviour fades out with the forgetting factor.
+
+    def __init__(self, order=8, forgetting=0.999, ridge=1e-3):
+        self.order = order
+        self.forgetting = forgetting
+        self.ridge = ridge
+        self._xtx = np.zeros((order + 1, order + 1))
+        self._xty = np.zeros(order + 1)
+        self._yty = 0.0
+        self._weight = 0.0
+        self._tail = np.zeros(0)
+        self.coef = None
+        self.sigma = 0.0
+
+    @property
+    def ready(self):
+        return self.coef is not None
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        series = np.concatenate([self._tail, values])
+        self._tail = series[-self.order:]
+        if len(series) <= self.order:
+            return self
+
+        # Each row is [1, y[t-1], ..., y[t-p]] -> y[t]
+        windows = sliding_window_view(series, self.order + 1)
+        y = windows[:, -1]
+        X = np.empty((len(windows), self.order + 1))
+        X[:, 0] = 1.0
+        X[:, 1:] = windows[:, -2::-1]
+
+        # Newest row gets weight 1, older rows decay geometrically
+        decay = self.forgetting ** np.arange(len(y) - 1, -1, -1)
+        fade = self.forgetting ** len(y)
+        Xw = X * decay[:, None]
+        self._xtx = fade * self._xtx + Xw.T @ X
+        self._xty = fade * self._xty + Xw.T @ y
+        self._yty = fade * self._yty + decay @ (y * y)
+        self._weight = fade * self._weight + decay.sum()
+
+        if self._weight > 2 * (self.order + 1):
+            self._refit()
+        return self
+
+    def _refit(self):
+        A = self._xtx + self.ridge * np.eye(self.order + 1)
+        coef = np.linalg.solve(A, self._xty)
+        sse = self._yty - 2 * coef @ self._xty + coef @ self._xtx @ coef
+        self.sigma = float(np.sqrt(max(sse, 0.0) / max(self._weight - self.order - 1, 1.0)))
+        self.coef = coef
+
+    def forecast(self, horizon):
+        if not self.ready or len(self._tail) < self.order:
+            return None
+        intercept, phi = self.coef[0], self.coef[1:]
+        # Both recursions are the all-pole filter 1 / (1 - phi_1 z^-1 - ... - phi_p z^-p):
+        # the mean is the intercept run through it from the last p values, the psi-weights
+        # are its impulse response
+        a = np.concatenate([[1.0], -phi])
+        mean = lfilter([1.0], a, np.full(horizon, intercept), zi=lfiltic([1.0], a, self._tail[::-1]))[0]
+
+        # Forecast error variance grows with the cumulative squared psi-weights
+        impulse = np.zeros(horizon)
+        impulse[0] = 1.0
+        psi = lfilter([1.0], a, impulse)
+        spread = Z_95 * self.sigma * np.sqrt(np.cumsum(psi ** 2))
+        return mean, mean - spread, mean + spread
+
+
+class Forecaster:
+    # Trains on the sampler's history in a background thread and caches the latest forecast
+    # per (metric, horizon), so callbacks only do a dictionary lookup.
+
+    def __init__(self, sampler, metrics=FORECAST_METRICS, horizons=HORIZONS, order=8, interval=5.0):
+        self.sampler = sampler
+        self.metrics = metrics
+        self.horizons = horizons
+        self.interval = interval
+        self.models = {metric: ARModel(order) for metric in metrics}
+        self._cache = {}
+        self._last_time = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @timed
+    def refit(self):
+        rows = self.sampler.buffer.last()
+        fields = self.sampler.buffer.fields
+        new = rows[rows[:, fields.index('time')] > self._last_time]
+        if not len(new):
+            return
+        self._last_time = new[-1, fields.index('time')]
+
+        forecasts = {}
+        longest = max(self.horizons)
+        for metric, model in self.models.items():
+            model.update(new[:, fields.index(metric)])
+            # Shorter horizons are prefixes of the longest forecast
+            result = model.forecast(longest)
+            if result is None:
+                continue
+            upper_bound = 100.0 if metric in PERCENT_METRICS else np.inf
+            mean, lower, upper = (np.clip(a, 0.0, upper_bound) for a in result)
+            for horizon in self.horizons:
+                forecasts[(metric, horizon)] = {
+                    'time': self._last_time,
+                    'mean': mean[:horizon],
+                    'lower': lower[:horizon],
+                    'upper': upper[:horizon],
+                }
+        with self._lock:
+            self._cache.update(forecasts)
+
+    def get(self, metric, horizon):
+        with self._lock:
+            return self._cache.get((metric, horizon))
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="forecaster", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while True:
+            try:
+                self.refit()
+            except Exception:
+                pass
+            if self._stop.wait(self.interval):
+                break
@@ -0,0 +1,57 @@
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+bind = os.environ.get('BIND', '0.0.0.0:8050')
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+
+# Each /stream viewer holds a connection open; threads keep that from tying up a whole worker
+worker_class = 'gthread'
+threads = int(os.environ.get('THREADS', 64))
+
+# The ring is created in on_starting, so the app must be loaded in the workers (no --preload)
+preload_app = False
+
+# Workers inherit this and attach to the collector's ring instead of sampling psutil themselves
+os.environ.setdefault('ANALYZER_SHM', f'perf-analyzer-{os.getpid()}')
+
+# Callback results are shared between workers through files on tmpfs
+os.environ.setdefault('ANALYZER_CACHE_DIR', f"/dev/shm/{os.environ['ANALYZER_SHM']}-cache")
+
+# Remote agents' rings too, so whichever worker takes an /ingest adds to the same history
+os.environ.setdefault('ANALYZER_FLEET_DIR', f"/dev/shm/{os.environ['ANALYZER_SHM']}-fleet")
+
+_collector = None
+
+
+def on_starting(server):
+    global _collector
+    name = os.environ['ANALYZER_SHM']
+    _collector = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sampler.py'), name])
+    # Workers can only attach once the ring exists
+    deadline = time.monotonic() + 30
+    while not os.path.exists(os.path.join('/dev/shm', name)) and time.monotonic() < deadline:
+        if _collector.poll() is not None:
+            raise RuntimeError(f"metrics collector exited with code {_collector.returncode}")
+        time.sleep(0.1)
+
+
+def on_exit(server):
+    name = os.environ['ANALYZER_SHM']
+    if _collector is not None:
+        _collector.terminate()
+        try:
+            _collector.wait(5)
+        except subprocess.TimeoutExpired:
+            _collector.kill()
+            _collector.wait()
+    # A collector that was killed (or crashed) never unlinked its shared memory
+    for segment in (name, f"{name}-devices", f"{name}-labels", f"{name}-anomalies"):
+        try:
+            os.remove(os.path.join('/dev/shm', segment))
+        except FileNotFoundError:
+            pass
+    shutil.rmtree(os.environ['ANALYZER_CACHE_DIR'], ignore_errors=True)
+    shutil.rmtree(os.environ['ANALYZER_FLEET_DIR'], ignore_errors=True)
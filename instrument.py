@@ -0,0 +1,198 @@
+import functools
+import threading
+import time
+from bisect import bisect_left
+
+
+# Latency buckets in seconds and payload buckets in bytes (upper bounds, +Inf is implicit)
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PAYLOAD_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+CONTROL_FLOW_EXCEPTIONS = ('PreventUpdate',)
+
+
+class Histogram:
+    # Each thread records into its own shard, so observe() never takes a lock after the
+    # first call on a thread. Readers sum the shards; a value may land one scrape late.
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            # counts per bucket (+Inf last), then sum
+            shard = [0] * (len(self.buckets) + 1) + [0.0]
+            with self._shards_lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+    def observe(self, value):
+        shard = self._shard()
+        shard[bisect_left(self.buckets, value)] += 1
+        shard[-1] += value
+
+    def snapshot(self):
+        with self._shards_lock:
+            shards = list(self._shards)
+        counts = [0] * (len(self.buckets) + 1)
+        total = 0.0
+        for shard in shards:
+            for i in range(len(counts)):
+                counts[i] += shard[i]
+            total += shard[-1]
+        return counts, total
+
+
+class Counter:
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+
+    def inc(self, amount=1):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = [0]
+            with self._shards_lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        shard[0] += amount
+
+    def value(self):
+        with self._shards_lock:
+            return sum(shard[0] for shard in self._shards)
+
+
+class _Stats:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.payload = Histogram(PAYLOAD_BUCKETS)
+        self.errors = Counter()
+        self.collisions = Counter()
+        self.cache_hits = Counter()
+        self.cache_misses = Counter()
+        # Threads currently inside the function; set.add/discard are atomic under the GIL
+        self.in_flight = set()
+
+
+class Registry:
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+        self.gauges = []
+
+    def stats(self, name):
+        stats = self._stats.get(name)
+        if stats is None:
+            with self._lock:
+                stats = self._stats.setdefault(name, _Stats())
+        return stats
+
+    def timed(self, func=None, name=None):
+        if func is None:
+            return functools.partial(self.timed, name=name)
+        stats = self.stats(name or f"{func.__module__}.{func.__qualname__}")
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            me = threading.get_ident()
+            if stats.in_flight:
+                stats.collisions.inc()
+            stats.in_flight.add(me)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                # PreventUpdate is Dash control flow, not a failure
+                if type(e).__name__ not in CONTROL_FLOW_EXCEPTIONS:
+                    stats.errors.inc()
+                raise
+            finally:
+                stats.latency.observe(time.perf_counter() - start)
+                stats.in_flight.discard(me)
+
+        return wrapper
+
+    def add_gauges(self, collect):
+        # collect() -> iterable of (metric name, help, value)
+        self.gauges.append(collect)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            items = sorted(self._stats.items())
+
+        def histogram(metric, help_text, buckets, key):
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} histogram")
+            for name, stats in items:
+                counts, total = getattr(stats, key).snapshot()
+                if not sum(counts):
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + (float('inf'),), counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{metric}_bucket{{name="{name}",le="{le}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{name="{name}"}} {total}')
+                lines.append(f'{metric}_count{{name="{name}"}} {cumulative}')
+
+        def counter(metric, help_text, key, only=None):
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} counter")
+            for name, stats in items:
+                if only is None or only(stats):
+                    lines.append(f'{metric}{{name="{name}"}} {getattr(stats, key).value()}')
+
+        histogram('analyzer_call_duration_seconds', "Wall time per instrumented call.", LATENCY_BUCKETS, 'latency')
+        counter('analyzer_call_errors_total', "Calls that raised.", 'errors')
+        counter('analyzer_call_collisions_total', "Calls that started while another call of the same function was running.", 'collisions')
+        cached = lambda stats: stats.cache_hits.value() or stats.cache_misses.value()
+        counter('analyzer_cache_hits_total', "Callback requests answered from the result cache.", 'cache_hits', cached)
+        counter('analyzer_cache_misses_total', "Callback requests that had to be computed.", 'cache_misses', cached)
+        histogram('analyzer_payload_bytes', "Response size of Dash callback updates.", PAYLOAD_BUCKETS, 'payload')
+
+        for collect in self.gauges:
+            try:
+                gauges = list(collect())
+            except Exception:
+                continue
+            for metric, help_text, value in gauges:
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} gauge")
+                lines.append(f"{metric} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+timed = REGISTRY.timed
+
+
+def instrument_dash(app, registry=REGISTRY):
+    # Payload sizes per callback plus a Prometheus text endpoint on the Flask server
+    import flask
+
+    server = app.server
+
+    @server.after_request
+    def record_payload(response):
+        if flask.request.path.endswith('/_dash-update-component') and response.content_length is not None:
+            body = flask.request.get_json(silent=True) or {}
+            entry = app.callback_map.get(body.get('output'), {})
+            func = entry.get('callback')
+            # functools.wraps carries the original module/qualname through Dash's wrapper
+            name = f"{func.__module__}.{func.__qualname__}" if func is not None else body.get('output', 'unknown')
+            registry.stats(name).payload.observe(response.content_length)
+        return response
+
+    @server.route('/metrics')
+    def metrics():
+        return flask.Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+    return server
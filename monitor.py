@@ -1,65 +1,165 @@
 import psutil
-import pandas as pd
+import pyarrow as pa
 import time
 
-
-def calculate_phs():
-    cpu_usage = psutil.cpu_percent()
-    memory_usage = psutil.virtual_memory().percent
-    disk_usage = psutil.disk_io_counters().read_bytes / (1024 * 1024) 
-    network_usage = psutil.net_io_counters().bytes_sent / (1024 * 1024)  
-
-    disk_usage = min(disk_usage / 500 * 100, 100)  
-    network_usage = min(network_usage / 100 * 100, 100)  
-
-    score = 100 - ((cpu_usage * 0.4) + (memory_usage * 0.3) + (disk_usage * 0.2) + (network_usage * 0.1))
-
-    return max(0, min(100, score)) 
-
-
-def get_process_data():
-    processes = []
-    phs_score = calculate_phs()
-
-    for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent', 'io_counters', 'num_threads', 'num_ctx_switches']):
-        try:
-            proc_info = proc.info
-            io_counters = proc_info.pop('io_counters', None)
-            ctx_switches = proc_info.pop('num_ctx_switches', None)
-
-            if io_counters:
-                proc_info['read_bytes'] = io_counters.read_bytes
-                proc_info['write_bytes'] = io_counters.write_bytes
+import numpy as np
+
+from cadence import LEVELS, AdaptiveCadence
+from collector import COLLECTOR_BACKENDS, make_collector
+from instrument import timed
+from phs import phs_score
+from rates import IORates
+from store import TimeSeriesStore
+
+io_rates = IORates()
+process_collector = make_collector()
+
+
+def host_metrics():
+    io = io_rates.sample()
+    return {
+        'cpu': psutil.cpu_percent(),
+        'memory': psutil.virtual_memory().percent,
+        'disk_read': io['read_bytes'] / (1024 * 1024),  # MB/s
+        'disk_write': io['write_bytes'] / (1024 * 1024),  # MB/s
+        'net_sent': io['bytes_sent'] / (1024 * 1024),  # MB/s
+        'net_recv': io['bytes_recv'] / (1024 * 1024),  # MB/s
+    }
+
+
+@timed
+def calculate_phs(metrics=None):
+    # metrics: a sample dict (from a sampler or a replay); read live from psutil when omitted
+    return phs_score(host_metrics() if metrics is None else metrics)[0]
+
+
+@timed
+def get_process_data(pids=None, metrics=None):
+    # Per-interval CPU %, I/O and context-switch rates from the persistent collector (only
+    # for pids when given); the PHS is a host value, kept once on the snapshot rather than on every row
+    snapshot = process_collector.collect(pids)
+    snapshot.host['phs_score'] = calculate_phs(metrics)
+    return snapshot
+
+
+def top_pids(snapshot, n):
+    # The n busiest processes by CPU plus the n largest by memory
+    if snapshot.n <= n:
+        return snapshot['pid'].copy()
+    busiest = np.argpartition(snapshot['cpu_percent'], -n)[-n:]
+    largest = np.argpartition(snapshot['memory_percent'], -n)[-n:]
+    return np.unique(snapshot['pid'][np.concatenate([busiest, largest])])
+
+
+PROCESS_SCHEMA = pa.schema([
+    ('timestamp', pa.float64()),
+    ('pid', pa.int64()),
+    ('name', pa.string()),
+    ('cpu_percent', pa.float64()),
+    ('memory_percent', pa.float64()),
+    ('rss', pa.int64()),
+    ('num_threads', pa.int64()),
+    ('read_bytes', pa.int64()),
+    ('write_bytes', pa.int64()),
+    ('voluntary_ctx_switches', pa.int64()),
+    ('involuntary_ctx_switches', pa.int64()),
+    ('read_bytes_per_sec', pa.float64()),
+    ('write_bytes_per_sec', pa.float64()),
+    ('ctx_switches_per_sec', pa.float64()),
+    ('rss_growth_per_sec', pa.float64()),
+    ('phs_score', pa.float64()),
+])
+
+
+# One row per tick whatever the level, so host metrics stay continuous while process rows thin out
+HOST_SCHEMA = pa.schema([
+    ('timestamp', pa.float64()),
+    ('cpu', pa.float64()),
+    ('memory', pa.float64()),
+    ('disk_read', pa.float64()),
+    ('disk_write', pa.float64()),
+    ('net_sent', pa.float64()),
+    ('net_recv', pa.float64()),
+    ('phs_score', pa.float64()),
+    ('level', pa.string()),
+    ('processes', pa.int64()),
+    ('interval', pa.float64()),
+    ('cpu_seconds', pa.float64()),
+])
+
+
+def save_data_to_store(root="process_data", duration=None, interval=5, retention_hours=24 * 7,
+                       cadence=None, host_root="host_data", top=20):
+    # Appends one row group per tick to hourly Parquet partitions; duration=None runs forever.
+    # With an AdaptiveCadence the pace and the level of detail follow the host and the overhead
+    # budget, and every tick also lands in the host store; without one it's a fixed interval scan.
+    store = TimeSeriesStore(root, PROCESS_SCHEMA, retention_hours=retention_hours).start()
+    host_store = TimeSeriesStore(host_root, HOST_SCHEMA, retention_hours=retention_hours).start() if cadence else None
+    deadline = None if duration is None else time.monotonic() + duration
+    pids = None
+    try:
+        while deadline is None or time.monotonic() < deadline:
+            if cadence is None:
+                store.append(get_process_data().to_arrow())
+                time.sleep(interval)
+                continue
+
+            level = cadence.choose(LEVELS if pids is not None else ('full', 'host'))
+            cadence.begin()
+            metrics = host_metrics()
+            processes = 0
+            if level == 'host':
+                score = calculate_phs(metrics)
             else:
-                proc_info['read_bytes'] = proc_info['write_bytes'] = 0
-
-            if ctx_switches:
-                proc_info['voluntary_ctx_switches'] = ctx_switches.voluntary
-                proc_info['involuntary_ctx_switches'] = ctx_switches.involuntary
-            else:
-                proc_info['voluntary_ctx_switches'] = proc_info['involuntary_ctx_switches'] = 0
-            
-            proc_info['phs_score'] = phs_score  
-
-            processes.append(proc_info)
-
-        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-            pass
-    
-    return processes
-
-
-def save_data_to_csv(filename="process_data.csv",duration=60):
-    while True:
-        data = get_process_data()
-        df = pd.DataFrame(data)
-        
-        
-        df['PHS_Score'] = calculate_phs()  
-
-        df.to_csv(filename, index=False)
-        time.sleep(5)  
+                snapshot = get_process_data(pids if level == 'top' else None, metrics)
+                if level == 'full':
+                    pids = top_pids(snapshot, top)
+                score, processes = snapshot.host['phs_score'], snapshot.n
+                store.append(snapshot.to_arrow())
+            wait = cadence.end(metrics)
+            host_store.append([dict(metrics, phs_score=score, level=level, processes=processes,
+                                    interval=wait, cpu_seconds=cadence.spent)])
+            time.sleep(wait)
+    finally:
+        store.close()
+        if host_store is not None:
+            host_store.close()
+    return store
 
 
 if __name__ == "__main__":
-    save_data_to_csv()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Record local process data, or ship host metrics to a dashboard collector")
+    parser.add_argument('--agent', metavar='URL', help="run as an agent and push batches to URL, e.g. http://dashboard:8050/ingest")
+    parser.add_argument('--host-name', help="name to report in agent mode (default: hostname)")
+    parser.add_argument('--interval', type=float, help="seconds between samples (default: 1 for agents, 5 otherwise); "
+                                                       "the starting interval with --adaptive")
+    parser.add_argument('--adaptive', action='store_true',
+                        help="sample faster when the host is anomalous or changing fast, slower when quiet, within --budget")
+    parser.add_argument('--min-interval', type=float, default=0.5, help="fastest adaptive interval in seconds")
+    parser.add_argument('--max-interval', type=float, default=30.0, help="slowest adaptive interval in seconds")
+    parser.add_argument('--budget', type=float, default=0.01,
+                        help="adaptive overhead budget as a fraction of one core (default: 0.01, i.e. 1%%)")
+    parser.add_argument('--top', type=int, default=20,
+                        help="processes (by CPU and by memory) re-read when the budget has no room for a full scan")
+    parser.add_argument('--batch-size', type=int, default=10, help="samples per batch in agent mode")
+    parser.add_argument('--token', help="bearer token for the collector in agent mode (default: $ANALYZER_INGEST_TOKEN)")
+    parser.add_argument('--spool-dir', default='agent_spool', help="where undeliverable batches wait in agent mode")
+    parser.add_argument('--duration', type=float, help="stop after this many seconds")
+    parser.add_argument('--collector', choices=COLLECTOR_BACKENDS, help="process collector backend (default: $ANALYZER_COLLECTOR or psutil)")
+    args = parser.parse_args()
+
+    if args.collector:
+        process_collector = make_collector(args.collector)
+
+    if args.agent:
+        from fleet import run_agent
+        run_agent(args.agent, host=args.host_name, interval=args.interval or 1.0,
+                  batch_size=args.batch_size, spool_dir=args.spool_dir, duration=args.duration, token=args.token)
+    else:
+        cadence = None
+        if args.adaptive:
+            cadence = AdaptiveCadence(min_interval=args.min_interval, max_interval=args.max_interval,
+                                      interval=args.interval or 5, budget=args.budget)
+        save_data_to_store(duration=args.duration, interval=args.interval or 5, cadence=cadence, top=args.top)
@@ -0,0 +1,124 @@
+import numpy as np
+
+
+# Performance Health Score: 100 minus a weighted load. Each component's load is its sample
+# field as a percentage of a normalizer (the value that counts as fully loaded), capped at 100.
+COMPONENTS = ('cpu', 'memory', 'disk', 'network')
+
+# Component -> sample field
+DEFAULT_FIELDS = {'cpu': 'cpu', 'memory': 'memory', 'disk': 'disk_read', 'network': 'net_sent'}
+DEFAULT_WEIGHTS = {'cpu': 0.4, 'memory': 0.3, 'disk': 0.2, 'network': 0.1}
+# %, %, MB/s, MB/s
+DEFAULT_NORMALIZERS = {'cpu': 100.0, 'memory': 100.0, 'disk': 500.0, 'network': 100.0}
+
+# Below this score, each component past its cutoff (in % load) is named as a reason
+POOR_SCORE = 80.0
+DEFAULT_CUTOFFS = {'cpu': 70.0, 'memory': 75.0, 'disk': 70.0, 'network': 50.0}
+REASONS = {
+    'cpu': "⚠️ High CPU usage detected.",
+    'memory': "💾 High memory usage detected.",
+    'disk': "📀 High disk activity detected.",
+    'network': "🌐 High network traffic detected.",
+}
+
+
+# Elements scored per block; a few arrays of this many float64s fit in L2
+BLOCK = 32768
+
+
+class PHSScorer:
+    # Scores any number of samples in one call: every input is an array of the same (or a
+    # broadcastable) shape, e.g. (timestamps,), (hosts,) or (hosts, timestamps)
+
+    def __init__(self, weights=None, normalizers=None, cutoffs=None, fields=None, poor=POOR_SCORE):
+        for name, given in (('weights', weights), ('normalizers', normalizers), ('cutoffs', cutoffs), ('fields', fields)):
+            unknown = set(given or ()) - set(COMPONENTS)
+            if unknown:
+                raise ValueError(f"unknown PHS components in {name}: {', '.join(sorted(unknown))}")
+        weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        normalizers = dict(DEFAULT_NORMALIZERS, **(normalizers or {}))
+        if any(weight < 0 for weight in weights.values()):
+            raise ValueError("PHS weights must not be negative")
+        if any(normalizer <= 0 for normalizer in normalizers.values()):
+            raise ValueError("PHS normalizers must be positive")
+
+        self.fields = dict(DEFAULT_FIELDS, **(fields or {}))
+        self.weights = np.array([weights[c] for c in COMPONENTS])
+        self.scales = np.array([100.0 / normalizers[c] for c in COMPONENTS])
+        self.cutoffs = np.array([dict(DEFAULT_CUTOFFS, **(cutoffs or {}))[c] for c in COMPONENTS])
+        self.poor = poor
+        # (field, scale, weight, cutoff) per component as plain floats, for score_sample
+        self._terms = list(zip([self.fields[c] for c in COMPONENTS], self.scales.tolist(),
+                               self.weights.tolist(), self.cutoffs.tolist()))
+
+    def score(self, columns, reasons=True):
+        # columns: {sample field: array}. Returns (scores, flags); flags[..., i] says whether
+        # COMPONENTS[i] is a reason for that score (None when reasons=False)
+        loads = np.broadcast_arrays(*(np.asarray(columns[self.fields[c]], dtype=np.float64) for c in COMPONENTS))
+        shape = loads[0].shape
+        scores = np.empty(shape)
+        # Component-major so each component's flags are written contiguously
+        flags = np.empty((len(COMPONENTS),) + shape, dtype=bool) if reasons else None
+
+        # Blocks small enough that the temporaries stay in cache: flat ranges when every input
+        # is contiguous (the usual case), otherwise slices along the first axis
+        if all(load.flags.c_contiguous for load in loads):
+            loads = [load.reshape(-1) for load in loads]
+            out, out_flags, step = scores.reshape(-1), None if flags is None else flags.reshape(len(COMPONENTS), -1), BLOCK
+        else:
+            out, out_flags, step = scores, flags, max(1, BLOCK // max(1, int(np.prod(shape[1:]))))
+        if not out.shape:
+            self._score_block(loads, out, out_flags)
+        for start in range(0, len(out) if out.shape else 0, step):
+            block = slice(start, start + step)
+            self._score_block([load[block] for load in loads], out[block], None if out_flags is None else out_flags[:, block])
+        return scores, None if flags is None else np.moveaxis(flags, 0, -1)
+
+    def _score_block(self, loads, total, flags):
+        total[...] = 0.0
+        load = np.empty(total.shape)
+        for i, values in enumerate(loads):
+            np.multiply(values, self.scales[i], out=load)
+            np.minimum(load, 100.0, out=load)
+            if flags is not None:
+                np.greater(load, self.cutoffs[i], out=flags[i])
+            load *= self.weights[i]
+            total += load
+        np.subtract(100.0, total, out=total)
+        np.clip(total, 0.0, 100.0, out=total)
+        if flags is not None:
+            flags &= total < self.poor
+
+    def score_rows(self, rows, fields, reasons=True):
+        # rows: (..., len(fields)) sample rows, e.g. a sampler ring slice or a fleet array
+        rows = np.asarray(rows)
+        return self.score({field: rows[..., fields.index(field)] for field in set(self.fields.values())}, reasons)
+
+    def reasons(self, flags):
+        # Reason strings for one sample's flags
+        return [REASONS[c] for c, flag in zip(COMPONENTS, np.asarray(flags).tolist()) if flag]
+
+    def score_sample(self, metrics):
+        # One sample dict -> (score, [reason, ...]). Same arithmetic as score() on plain floats;
+        # for a single sample the array setup would cost more than the math.
+        loads = [min(metrics[field] * scale, 100.0) for field, scale, _, _ in self._terms]
+        score = min(max(100.0 - sum(load * weight for load, (_, _, weight, _) in zip(loads, self._terms)), 0.0), 100.0)
+        if score >= self.poor:
+            return score, []
+        return score, [REASONS[c] for c, load, (_, _, _, cutoff) in zip(COMPONENTS, loads, self._terms) if load > cutoff]
+
+
+DEFAULT_SCORER = PHSScorer()
+
+
+def phs_score(metrics, scorer=DEFAULT_SCORER):
+    return scorer.score_sample(metrics)
+
+
+def parse_components(text):
+    # 'cpu=0.5,memory=0.2' -> {'cpu': 0.5, 'memory': 0.2}, for command-line overrides
+    values = {}
+    for part in filter(None, (text or '').split(',')):
+        name, _, value = part.partition('=')
+        values[name.strip()] = float(value)
+    return values
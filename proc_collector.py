@@ -0,0 +1,242 @@
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from instrument import timed
+from snapshot import SnapshotPool
+
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+# Per-process counters parsed into one preallocated array each
+ARRAY_FIELDS = ('starttime', 'ticks', 'rss', 'num_threads', 'read_bytes', 'write_bytes',
+                'voluntary_ctx_switches', 'involuntary_ctx_switches')
+
+# /proc/[pid]/stat fields after the ")" that ends comm: utime, stime, num_threads, starttime, rss
+_UTIME, _STIME, _THREADS, _STARTTIME, _RSS = 11, 12, 17, 19, 21
+
+# comm is cut at 15 bytes; psutil then takes the full name from cmdline, and so do we
+_COMM_LEN = 15
+
+
+def _read(path):
+    # One open/read/close; /proc files are generated in a single read
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        return os.read(fd, 8192)
+    finally:
+        os.close(fd)
+
+
+class _Snapshot:
+    # One tick's worth of preallocated arrays; two are kept and swapped between ticks
+
+    def __init__(self, capacity):
+        self._allocate(capacity)
+        self.n = 0
+
+    def _allocate(self, capacity):
+        self.capacity = capacity
+        self.pids = np.zeros(capacity, dtype=np.int64)
+        self.ok = np.zeros(capacity, dtype=bool)
+        # When each row was last read; rows not re-read by a partial collect() keep their time
+        self.times = np.zeros(capacity)
+        self.arrays = {field: np.zeros(capacity, dtype=np.int64) for field in ARRAY_FIELDS}
+        self.names = [None] * capacity
+
+    def reserve(self, n):
+        # Contents are about to be overwritten, so growing doesn't copy
+        if n > self.capacity:
+            self._allocate(max(n, 2 * self.capacity))
+        self.n = n
+
+    def carry(self, other, rows):
+        # Copy of other's rows, in order, without reading anything
+        self.reserve(len(rows))
+        n = self.n
+        np.take(other.pids, rows, out=self.pids[:n])
+        np.take(other.ok, rows, out=self.ok[:n])
+        np.take(other.times, rows, out=self.times[:n])
+        for field, array in self.arrays.items():
+            np.take(other.arrays[field], rows, out=array[:n])
+        self.names[:n] = [other.names[i] for i in rows.tolist()]
+
+
+class ProcCollector:
+    # Linux-only backend that reads /proc/[pid]/{stat,status,io} directly, three reads per
+    # process, into numpy arrays that are reused across ticks. Files are read by a bounded
+    # thread pool in contiguous chunks. collect() returns the same snapshot as ProcessCollector.
+
+    def __init__(self, proc_root='/proc', max_workers=4, capacity=4096):
+        self.proc_root = proc_root
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix="proc-collector")
+        self._current = _Snapshot(capacity)
+        self._previous = _Snapshot(capacity)
+        self._snapshots = SnapshotPool(capacity)
+        # (pid, starttime) -> name; and processes whose io file we may not read
+        self._names = {}
+        self._io_denied = set()
+        self._lock = threading.Lock()
+
+    def _total_memory(self):
+        for line in _read(os.path.join(self.proc_root, 'meminfo')).split(b'\n'):
+            if line.startswith(b'MemTotal:'):
+                return int(line.split()[1]) * 1024
+        raise RuntimeError("MemTotal missing from meminfo")
+
+    def _pids(self):
+        return np.array(sorted(int(name) for name in os.listdir(self.proc_root) if name.isdigit()), dtype=np.int64)
+
+    def _read_rows(self, snapshot, rows):
+        arrays = snapshot.arrays
+        starttime, ticks, rss, threads = arrays['starttime'], arrays['ticks'], arrays['rss'], arrays['num_threads']
+        read_bytes, write_bytes = arrays['read_bytes'], arrays['write_bytes']
+        voluntary, involuntary = arrays['voluntary_ctx_switches'], arrays['involuntary_ctx_switches']
+        root = self.proc_root
+        for i in rows:
+            pid = int(snapshot.pids[i])
+            base = f"{root}/{pid}/"
+            try:
+                stat = _read(base + 'stat')
+                end = stat.rfind(b')')
+                fields = stat[end + 2:].split()
+                start = int(fields[_STARTTIME])
+                starttime[i] = start
+                ticks[i] = int(fields[_UTIME]) + int(fields[_STIME])
+                threads[i] = int(fields[_THREADS])
+                rss[i] = int(fields[_RSS])
+
+                status = _read(base + 'status')
+                at = status.index(b'\nvoluntary_ctxt_switches:') + 25
+                voluntary[i] = int(status[at:status.index(b'\n', at)])
+                at = status.index(b'\nnonvoluntary_ctxt_switches:') + 28
+                involuntary[i] = int(status[at:status.index(b'\n', at)])
+
+                key = (pid, start)
+                name = self._names.get(key)
+                if name is None:
+                    name = self._names[key] = self._name(base, stat[stat.find(b'(') + 1:end].decode(errors='replace'))
+                snapshot.names[i] = name
+            except (FileNotFoundError, ProcessLookupError, PermissionError, ValueError, IndexError):
+                # Exited mid-read, or not ours to look at
+                snapshot.ok[i] = False
+                continue
+
+            read_bytes[i] = write_bytes[i] = 0
+            if key not in self._io_denied:
+                try:
+                    io = _read(base + 'io')
+                    at = io.index(b'\nread_bytes:') + 12
+                    read_bytes[i] = int(io[at:io.index(b'\n', at)])
+                    at = io.index(b'\nwrite_bytes:') + 13
+                    write_bytes[i] = int(io[at:io.index(b'\n', at)])
+                except PermissionError:
+                    self._io_denied.add(key)
+                except (FileNotFoundError, ProcessLookupError, ValueError):
+                    pass
+            snapshot.ok[i] = True
+
+    @staticmethod
+    def _name(base, comm):
+        if len(comm) < _COMM_LEN:
+            return comm
+        try:
+            cmdline = _read(base + 'cmdline').split(b'\x00')[0]
+        except OSError:
+            return comm
+        exe = os.path.basename(cmdline.decode(errors='replace'))
+        return exe if exe.startswith(comm) else comm
+
+    @timed
+    def collect(self, pids=None):
+        # pids: read only these (e.g. the heaviest from the last full scan). Every other live
+        # process is carried over unread with its old counters and read time, so its rates
+        # come out right whenever it is next read.
+        with self._lock:
+            now = time.monotonic()
+            total_memory = self._total_memory()
+
+            previous, current = self._current, self._previous
+            alive = self._pids()
+            if pids is None or not previous.n:
+                current.reserve(len(alive))
+                current.pids[:current.n] = alive
+                rows = np.arange(current.n)
+            else:
+                current.carry(previous, np.flatnonzero(np.isin(previous.pids[:previous.n], alive)))
+                rows = np.flatnonzero(np.isin(current.pids[:current.n], np.asarray(pids, dtype=np.int64)))
+
+            chunk = max(64, math.ceil(len(rows) / (self.max_workers * 4)))
+            futures = [self._pool.submit(self._read_rows, current, rows[lo:lo + chunk].tolist())
+                       for lo in range(0, len(rows), chunk)]
+            for future in futures:
+                future.result()
+            current.times[rows] = now
+            self._current, self._previous = current, previous
+
+            return self._rows(current, previous, now, total_memory, None if pids is None else rows)
+
+    def _rows(self, current, previous, now, total_memory, read=None):
+        n = current.n
+        ok = current.ok[:n]
+        cur = {field: array[:n] for field, array in current.arrays.items()}
+
+        # Match each pid to its previous row; a different starttime means the pid was reused
+        index = np.full(n, -1)
+        if previous.n:
+            prev_pids = previous.pids[:previous.n]
+            pos = np.clip(np.searchsorted(prev_pids, current.pids[:n]), 0, previous.n - 1)
+            same = (prev_pids[pos] == current.pids[:n]) & previous.ok[pos] & \
+                   (previous.arrays['starttime'][pos] == cur['starttime'])
+            index = np.where(same, pos, -1)
+        # Seconds since each process was last read
+        elapsed = now - previous.times[np.maximum(index, 0)]
+        seen = (index >= 0) & (elapsed > 0)
+        elapsed = np.where(seen, elapsed, 1.0)
+
+        def rate(field, scale=1.0, clamp=True):
+            before = previous.arrays[field][np.maximum(index, 0)]
+            delta = (cur[field] - before).astype(np.float64)
+            if clamp:
+                delta = np.maximum(delta, 0.0)
+            return np.where(seen, delta * scale / elapsed, 0.0)
+
+        rss = cur['rss'] * PAGE_SIZE
+        cpu_percent = rate('ticks', 100.0 / CLOCK_TICKS)
+        read_rate = rate('read_bytes')
+        write_rate = rate('write_bytes')
+        ctx = cur['voluntary_ctx_switches'] + cur['involuntary_ctx_switches']
+        prev_ctx = previous.arrays['voluntary_ctx_switches'] + previous.arrays['involuntary_ctx_switches']
+        ctx_rate = np.where(seen, np.maximum(ctx - prev_ctx[np.maximum(index, 0)], 0) / elapsed, 0.0)
+        rss_growth = rate('rss', PAGE_SIZE, clamp=False)
+
+        rows = np.flatnonzero(ok) if read is None else read[ok[read]]
+        # Forget names and io permissions of processes that are gone (only a full read knows)
+        if read is None and len(self._names) > 2 * len(rows):
+            alive = set(zip(current.pids[rows].tolist(), cur['starttime'][rows].tolist()))
+            self._names = {key: name for key, name in self._names.items() if key in alive}
+            self._io_denied &= alive
+
+        k = len(rows)
+        snapshot = self._snapshots.next(k)
+        for field, values in (('pid', current.pids[:n]), ('cpu_percent', cpu_percent),
+                              ('memory_percent', rss / total_memory * 100), ('rss', rss),
+                              ('num_threads', cur['num_threads']), ('read_bytes', cur['read_bytes']),
+                              ('write_bytes', cur['write_bytes']),
+                              ('voluntary_ctx_switches', cur['voluntary_ctx_switches']),
+                              ('involuntary_ctx_switches', cur['involuntary_ctx_switches']),
+                              ('read_bytes_per_sec', read_rate), ('write_bytes_per_sec', write_rate),
+                              ('ctx_switches_per_sec', ctx_rate), ('rss_growth_per_sec', rss_growth)):
+            np.take(values, rows, out=snapshot.buffer(field)[:k])
+        snapshot.set_names([current.names[i] for i in rows.tolist()])
+        return snapshot
+
+    def close(self):
+        self._pool.shutdown()
+
@@ -0,0 +1,151 @@
+import math
+import threading
+import time
+
+import pandas as pd
+
+from cgroup_collector import CGROUP_ROOT, CgroupCollector
+from collector import make_collector
+from instrument import timed
+
+
+PROCESS_COLUMNS = [
+    {'name': 'PID', 'id': 'pid', 'type': 'numeric'},
+    {'name': 'Name', 'id': 'name', 'type': 'text'},
+    {'name': 'CPU %', 'id': 'cpu_percent', 'type': 'numeric', 'format': {'specifier': '.1f'}},
+    {'name': 'RAM %', 'id': 'memory_percent', 'type': 'numeric', 'format': {'specifier': '.2f'}},
+    {'name': 'Threads', 'id': 'num_threads', 'type': 'numeric'},
+    {'name': 'Read (B/s)', 'id': 'read_bytes_per_sec', 'type': 'numeric', 'format': {'specifier': '.3s'}},
+    {'name': 'Write (B/s)', 'id': 'write_bytes_per_sec', 'type': 'numeric', 'format': {'specifier': '.3s'}},
+    {'name': 'I/O (B/s)', 'id': 'io_bytes_per_sec', 'type': 'numeric', 'format': {'specifier': '.3s'}},
+    {'name': 'Ctx Sw/s', 'id': 'ctx_switches_per_sec', 'type': 'numeric', 'format': {'specifier': '.0f'}},
+    {'name': 'Anomaly (σ)', 'id': 'anomaly', 'type': 'numeric', 'format': {'specifier': '.1f'}},
+]
+
+COLUMN_IDS = [column['id'] for column in PROCESS_COLUMNS]
+
+# Kept in the snapshot for attribution but not shown in the table
+HIDDEN_COLUMNS = ['rss_growth_per_sec']
+
+CONTAINER_COLUMNS = [
+    {'name': 'Container', 'id': 'name', 'type': 'text'},
+    {'name': 'CPU %', 'id': 'cpu_percent', 'type': 'numeric', 'format': {'specifier': '.1f'}},
+    {'name': 'Throttled %', 'id': 'throttled_percent', 'type': 'numeric', 'format': {'specifier': '.1f'}},
+    {'name': 'Memory (B)', 'id': 'memory_bytes', 'type': 'numeric', 'format': {'specifier': '.3s'}},
+    {'name': 'RAM %', 'id': 'memory_percent', 'type': 'numeric', 'format': {'specifier': '.2f'}},
+    {'name': 'Read (B/s)', 'id': 'read_bytes_per_sec', 'type': 'numeric', 'format': {'specifier': '.3s'}},
+    {'name': 'Write (B/s)', 'id': 'write_bytes_per_sec', 'type': 'numeric', 'format': {'specifier': '.3s'}},
+    {'name': 'Major faults/s', 'id': 'major_faults_per_sec', 'type': 'numeric', 'format': {'specifier': '.0f'}},
+    {'name': 'CPU stall %', 'id': 'cpu_pressure', 'type': 'numeric', 'format': {'specifier': '.1f'}},
+    {'name': 'Memory stall %', 'id': 'memory_pressure', 'type': 'numeric', 'format': {'specifier': '.1f'}},
+    {'name': 'I/O stall %', 'id': 'io_pressure', 'type': 'numeric', 'format': {'specifier': '.1f'}},
+    {'name': 'cgroup', 'id': 'cgroup', 'type': 'text'},
+]
+
+CONTAINER_COLUMN_IDS = [column['id'] for column in CONTAINER_COLUMNS]
+
+# DataTable filter_query operators, longest first so '>=' wins over '>'
+FILTER_OPERATORS = [
+    ('ge ', '>='), ('le ', '<='), ('lt ', '<'), ('gt ', '>'), ('ne ', '!='), ('eq ', '='),
+    ('contains ', None), ('datestartswith ', None),
+]
+
+
+def split_filter_part(filter_part):
+    for words in FILTER_OPERATORS:
+        for operator in words:
+            if operator is None or operator not in filter_part:
+                continue
+            name_part, value_part = filter_part.split(operator, 1)
+            name = name_part[name_part.find('{') + 1: name_part.rfind('}')]
+
+            value_part = value_part.strip()
+            if value_part and value_part[0] == value_part[-1] and value_part[0] in ("'", '"', '`'):
+                value = value_part[1:-1].replace('\\' + value_part[0], value_part[0])
+            else:
+                try:
+                    value = float(value_part)
+                except ValueError:
+                    value = value_part
+
+            return name, words[0].strip(), value
+    return None, None, None
+
+
+def apply_filter(df, filter_query):
+    for filter_part in (filter_query or '').split(' && '):
+        name, operator, value = split_filter_part(filter_part)
+        if name not in df.columns:
+            continue
+        column = df[name]
+        if operator == 'contains':
+            df = df.loc[column.astype(str).str.contains(str(value), case=False, regex=False)]
+        elif operator == 'datestartswith':
+            df = df.loc[column.astype(str).str.startswith(str(value))]
+        elif operator in ('eq', 'ne', 'lt', 'le', 'gt', 'ge'):
+            df = df.loc[getattr(column, operator)(value)]
+    return df
+
+
+def _sort_key(column):
+    # Names are categorical with codes in first-seen order; sort them as text
+    return column.astype(str) if isinstance(column.dtype, pd.CategoricalDtype) else column
+
+
+class ProcessTable:
+    # Holds the latest process snapshot server-side; the DataTable only ever receives one page
+    column_ids = COLUMN_IDS
+    hidden_columns = HIDDEN_COLUMNS
+
+    def __init__(self, max_age=5.0, backend=None, collector=None):
+        self.max_age = max_age
+        self.collector = collector or make_collector(backend)
+        self._frame = pd.DataFrame(columns=self.column_ids + self.hidden_columns)
+        self._taken = None
+        self._lock = threading.Lock()
+        # Called with each new snapshot frame; may add derived columns in place
+        self.listeners = []
+
+    @timed
+    def refresh(self, force=False):
+        with self._lock:
+            if force or self._taken is None or time.monotonic() - self._taken > self.max_age:
+                frame = self._collect()
+                for listener in self.listeners:
+                    listener(frame)
+                self._frame = frame
+                self._taken = time.monotonic()
+            return self._frame
+
+    def _collect(self):
+        # A copy: paging and detect_bottlenecks keep reading the frame for as long as it is the
+        # latest, and the collector refills the buffers under it two collects later
+        frame = self.collector.collect().to_pandas().copy()
+        frame['io_bytes_per_sec'] = frame['read_bytes_per_sec'] + frame['write_bytes_per_sec']
+        frame['anomaly'] = 0.0
+        return frame
+
+    @timed
+    def page(self, page_current, page_size, sort_by=None, filter_query=None):
+        df = apply_filter(self.refresh(), filter_query)
+        if sort_by:
+            df = df.sort_values([s['column_id'] for s in sort_by],
+                                ascending=[s['direction'] == 'asc' for s in sort_by],
+                                kind='stable', key=_sort_key)
+
+        total = len(df)
+        start = (page_current or 0) * page_size
+        page = df.iloc[start:start + page_size]
+        return page[self.column_ids].to_dict('records'), max(1, math.ceil(total / page_size)), total
+
+
+class ContainerTable(ProcessTable):
+    # The same server-side paging over cgroup v2 containers, one row per container
+    column_ids = CONTAINER_COLUMN_IDS
+    hidden_columns = ['memory_growth_per_sec']
+
+    def __init__(self, max_age=5.0, root=CGROUP_ROOT):
+        super().__init__(max_age, collector=CgroupCollector(root))
+
+    def _collect(self):
+        return self.collector.collect()
@@ -0,0 +1,110 @@
+import os
+import time
+
+import numpy as np
+import psutil
+
+from instrument import timed
+
+
+DISK_FIELDS = ('read_bytes', 'write_bytes', 'read_count', 'write_count')
+NET_FIELDS = ('bytes_sent', 'bytes_recv', 'packets_sent', 'packets_recv')
+
+# A counter that goes from the top half of a 32-bit field to the bottom half wrapped it;
+# any other step backwards is a reset
+WRAP_32 = 2 ** 32
+
+
+class CounterRates:
+    # Per-device rates from successive snapshots of cumulative counters
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.names = ()
+        self.rates = np.zeros((0, len(fields)))
+        self._index = {}
+        self._counters = np.zeros((0, len(fields)))
+        self._time = None
+
+    def update(self, counters, now=None):
+        now = time.monotonic() if now is None else now
+        names = tuple(counters)
+        current = np.array([[getattr(counters[name], f) for f in self.fields] for name in names],
+                           dtype=np.float64).reshape(len(names), len(self.fields))
+
+        if self._time is None or now <= self._time:
+            rates = np.zeros_like(current)
+        else:
+            # Align with the previous snapshot; devices that just appeared get a zero rate
+            if names == self.names:
+                previous = self._counters
+                known = np.ones(len(names), dtype=bool)
+            else:
+                pos = np.array([self._index.get(name, -1) for name in names], dtype=np.intp)
+                known = pos >= 0
+                previous = current.copy()
+                previous[known] = self._counters[pos[known]]
+
+            delta = current - previous
+            wrapped = (delta < 0) & (previous >= WRAP_32 // 2) & (previous < WRAP_32) & (current < WRAP_32 // 2)
+            delta[wrapped] += WRAP_32
+            # Anything still negative is a counter reset (driver reload, re-plug)
+            np.maximum(delta, 0, out=delta)
+            delta[~known] = 0
+            rates = delta / (now - self._time)
+
+        if names != self.names:
+            self.names = names
+            self._index = {name: i for i, name in enumerate(names)}
+        self._counters = current
+        self._time = now
+        self.rates = rates
+        return names, rates
+
+    def column(self, field):
+        return self.rates[:, self.fields.index(field)]
+
+
+def _is_whole_disk(name):
+    # perdisk also lists partitions on Linux; only whole devices count towards totals
+    if not os.path.isdir('/sys/block'):
+        return True
+    return os.path.exists(os.path.join('/sys/block', name.replace('/', '!')))
+
+
+class IORates:
+    def __init__(self, min_interval=0.5):
+        self.min_interval = min_interval
+        self.disk = CounterRates(DISK_FIELDS)
+        self.net = CounterRates(NET_FIELDS)
+        self._disk_mask = np.zeros(0, dtype=bool)
+        self._disk_names = ()
+        self._whole_disks = ()
+        self._time = None
+
+    @timed
+    def sample(self, now=None):
+        now = time.monotonic() if now is None else now
+        # Back-to-back callers reuse the last rates instead of dividing by a tiny interval
+        if self._time is not None and now - self._time < self.min_interval:
+            return self.totals()
+
+        self.disk.update(psutil.disk_io_counters(perdisk=True, nowrap=False) or {}, now)
+        self.net.update(psutil.net_io_counters(pernic=True, nowrap=False) or {}, now)
+        if self.disk.names != self._disk_names:
+            self._disk_names = self.disk.names
+            self._disk_mask = np.array([_is_whole_disk(name) for name in self._disk_names], dtype=bool)
+            self._whole_disks = tuple(name for name, whole in zip(self._disk_names, self._disk_mask) if whole)
+        self._time = now
+        return self.totals()
+
+    def whole_disks(self):
+        # Names and per-device rates of the disks totals() adds up
+        if not len(self._disk_mask):
+            return (), np.zeros((0, len(DISK_FIELDS)))
+        return self._whole_disks, self.disk.rates[self._disk_mask]
+
+    def totals(self):
+        disk = self.disk.rates[self._disk_mask].sum(axis=0) if len(self._disk_mask) else np.zeros(len(DISK_FIELDS))
+        net = self.net.rates.sum(axis=0) if len(self.net.rates) else np.zeros(len(NET_FIELDS))
+        return dict(zip(DISK_FIELDS + NET_FIELDS, np.concatenate([disk, net]).tolist()))
@@ -0,0 +1,380 @@
+import glob
+import os
+import time
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from anomaly import HostAnomalyMonitor
+from attribution import explain
+from fleet import decode_batch
+from forecast import HORIZONS, Forecaster
+from phs import DEFAULT_SCORER, PHSScorer, parse_components
+from sampler import MB, SAMPLE_FIELDS, MetricsSampler, RingBuffer
+
+
+# Backtesting: recorded or synthetic samples go through the same PHS, anomaly/attribution and
+# forecasting code the dashboard runs, at recorded speed, N times faster, or as fast as possible.
+# Sources yield (row, processes): row is one sample in SAMPLE_FIELDS order, processes is None or
+# a function returning that tick's process DataFrame (only built when an anomaly needs it).
+
+_COLUMN = {field: i for i, field in enumerate(SAMPLE_FIELDS)}
+
+# Synthetic process CPU % adds up to host CPU % times this many cores
+SYNTHETIC_CPUS = 8
+
+# Keep at most this many incidents in a report; counts still cover all of them
+MAX_INCIDENTS = 1000
+
+
+class WallClock:
+    def now(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+
+
+class SimulatedClock:
+    # Time only passes when slept through, so a paced replay runs instantly (for tests and CI)
+
+    def __init__(self, start=0.0):
+        self._now = start
+
+    def now(self):
+        return self._now
+
+    def sleep(self, seconds):
+        self._now += max(seconds, 0.0)
+
+
+class ReplaySampler:
+    # Sampler read API over replayed rows; the anomaly monitor and forecaster take it unchanged
+
+    def __init__(self, interval=1.0, size=3600):
+        self.interval = interval
+        self.buffer = RingBuffer(size)
+
+    latest = MetricsSampler.latest
+    history = MetricsSampler.history
+
+
+# -- sources --
+
+def synthetic_source(duration, interval=1.0, start=None, seed=0, incidents=None, processes=50, chunk=3600):
+    # Daily load curve with noise. incidents: [(offset seconds, length seconds, field, value)];
+    # during one, process 'culprit' carries the extra load so attribution has someone to find.
+    rng = np.random.default_rng(seed)
+    start = time.time() - duration if start is None else start
+    incidents = [(start + offset, start + offset + length, field, value) for offset, length, field, value in incidents or ()]
+    weights = rng.dirichlet(np.ones(processes)) if processes else None
+    pids = np.arange(1000, 1000 + processes)
+    names = np.array([f"proc-{i % 37}" for i in range(processes - 1)] + ['culprit'] if processes else [], dtype=object)
+
+    def frame(row, extra):
+        shares = weights * (row[_COLUMN['cpu']] * SYNTHETIC_CPUS - extra.get('cpu', 0.0))
+        data = {
+            'pid': pids, 'name': names,
+            'cpu_percent': shares,
+            'memory_percent': weights * row[_COLUMN['memory']],
+            'read_bytes_per_sec': weights * (row[_COLUMN['disk_read']] - extra.get('disk_read', 0.0)) * MB,
+            'write_bytes_per_sec': weights * (row[_COLUMN['disk_write']] - extra.get('disk_write', 0.0)) * MB,
+            'ctx_switches_per_sec': weights * 5000,
+            'rss_growth_per_sec': np.zeros(processes),
+        }
+        data['cpu_percent'][-1] += extra.get('cpu', 0.0)
+        data['read_bytes_per_sec'][-1] += extra.get('disk_read', 0.0) * MB
+        data['write_bytes_per_sec'][-1] += extra.get('disk_write', 0.0) * MB
+        return pd.DataFrame(data)
+
+    total = int(duration / interval)
+    for first in range(0, total, chunk):
+        n = min(chunk, total - first)
+        times = start + (first + np.arange(n)) * interval
+        day = np.sin(2 * np.pi * ((times % 86400) / 86400 - 0.25))
+        rows = np.zeros((n, len(SAMPLE_FIELDS)))
+        rows[:, _COLUMN['time']] = times
+        rows[:, _COLUMN['cpu']] = np.clip(35 + 20 * day + rng.normal(0, 4, n), 0, 100)
+        rows[:, _COLUMN['memory']] = np.clip(55 + 5 * day + rng.normal(0, 1, n), 0, 100)
+        rows[:, _COLUMN['disk_read']] = np.maximum(20 + 10 * day + rng.normal(0, 3, n), 0)
+        rows[:, _COLUMN['disk_write']] = np.maximum(10 + 5 * day + rng.normal(0, 2, n), 0)
+        rows[:, _COLUMN['disk_read_iops']] = rows[:, _COLUMN['disk_read']] * 256
+        rows[:, _COLUMN['disk_write_iops']] = rows[:, _COLUMN['disk_write']] * 256
+        rows[:, _COLUMN['net_sent']] = np.maximum(5 + 3 * day + rng.normal(0, 1, n), 0)
+        rows[:, _COLUMN['net_recv']] = np.maximum(8 + 4 * day + rng.normal(0, 1, n), 0)
+        rows[:, _COLUMN['net_packets_sent']] = rows[:, _COLUMN['net_sent']] * 700
+        rows[:, _COLUMN['net_packets_recv']] = rows[:, _COLUMN['net_recv']] * 700
+
+        # Incidents replace the field outright; the excess over normal is what the culprit adds
+        extras = [{} for _ in range(n)] if incidents else None
+        for begin, end, field, value in incidents:
+            hit = np.flatnonzero((times >= begin) & (times < end))
+            if len(hit):
+                column = rows[hit, _COLUMN[field]]
+                rows[hit, _COLUMN[field]] = value
+                for i, excess in zip(hit.tolist(), (value - column).tolist()):
+                    extras[i][field] = excess * (SYNTHETIC_CPUS if field == 'cpu' else 1)
+
+        for i in range(n):
+            row = rows[i]
+            if processes:
+                yield row, (lambda row=row, extra=(extras[i] if extras else {}): frame(row, extra))
+            else:
+                yield row, None
+
+
+def store_source(root, start=None, end=None, cpus=None):
+    # monitor.py output: one Parquet row per process per tick. Host metrics are rebuilt from the
+    # process rows: CPU is their sum over the core count, memory the sum of their shares, disk
+    # the sum of their byte rates. Network isn't recorded per process and replays as 0.
+    from monitor import PROCESS_SCHEMA
+    from store import TIME_COLUMN, TimeSeriesStore
+
+    cpus = cpus or os.cpu_count() or 1
+    store = TimeSeriesStore(root, PROCESS_SCHEMA)
+    hours = [hour for hour, _ in store._partitions()]
+    if not hours:
+        return
+    start = hours[0] if start is None else start
+    end = hours[-1] + 3600 if end is None else end
+
+    hour = start - start % 3600
+    while hour < end:
+        frame = store.read_df(max(hour, start), min(hour + 3600, end) - 1e-6)
+        hour += 3600
+        if not len(frame):
+            continue
+        times = frame[TIME_COLUMN].to_numpy()
+        bounds = np.concatenate([[0], np.flatnonzero(np.diff(times)) + 1, [len(times)]])
+        first = bounds[:-1]
+
+        rows = np.zeros((len(first), len(SAMPLE_FIELDS)))
+        rows[:, _COLUMN['time']] = times[first]
+        rows[:, _COLUMN['cpu']] = np.minimum(np.add.reduceat(frame['cpu_percent'].to_numpy(), first) / cpus, 100)
+        rows[:, _COLUMN['memory']] = np.minimum(np.add.reduceat(frame['memory_percent'].to_numpy(), first), 100)
+        rows[:, _COLUMN['disk_read']] = np.add.reduceat(frame['read_bytes_per_sec'].to_numpy(), first) / MB
+        rows[:, _COLUMN['disk_write']] = np.add.reduceat(frame['write_bytes_per_sec'].to_numpy(), first) / MB
+
+        for i, (a, b) in enumerate(zip(bounds[:-1].tolist(), bounds[1:].tolist())):
+            yield rows[i], (lambda a=a, b=b: frame.iloc[a:b])
+
+
+def batch_source(paths, host=None):
+    # Agent batches (fleet.encode_batch), e.g. files from an agent's spool directory.
+    # Fields the batches don't carry replay as 0.
+    paths = sorted(path for pattern in paths for path in (glob.glob(pattern) or [pattern]))
+    chunks = {}
+    for path in paths:
+        with open(path, 'rb') as f:
+            batch_host, fields, rows = decode_batch(f.read())
+        if host is not None and batch_host != host:
+            continue
+        aligned = np.zeros((len(rows), len(SAMPLE_FIELDS)))
+        for i, field in enumerate(fields):
+            if field in _COLUMN:
+                aligned[:, _COLUMN[field]] = rows[:, i]
+        chunks.setdefault(batch_host, []).append(aligned)
+    if len(chunks) > 1:
+        raise ValueError(f"batches from several hosts ({', '.join(sorted(chunks))}); pick one with host=")
+    if not chunks:
+        return
+    rows = np.concatenate(next(iter(chunks.values())))
+    rows = rows[np.argsort(rows[:, _COLUMN['time']], kind='stable')]
+    for row in rows:
+        yield row, None
+
+
+# -- engine --
+
+class ReplayEngine:
+    # speed: 1 for recorded pace, 100 for 100x, None for as fast as possible.
+    # clock: WallClock() for real pacing, SimulatedClock() to skip the waits.
+    # forecast_every: samples between forecaster refits (the dashboard refits every 5 s).
+    # scorer: a PHSScorer, to try other weights or normalizers against the same data.
+
+    def __init__(self, source, speed=None, clock=None, interval=1.0, forecast_every=5, scorer=DEFAULT_SCORER):
+        self.source = source
+        self.speed = speed
+        self.clock = WallClock() if clock is None else clock
+        self.forecast_every = forecast_every
+        self.scorer = scorer
+        self.sampler = ReplaySampler(interval)
+        self.anomalies = HostAnomalyMonitor(self.sampler)
+        self.forecaster = Forecaster(self.sampler)
+
+    def run(self, limit=None):
+        stages = Counter()
+        scores = []
+        reasons = Counter()
+        anomalies = Counter()
+        offenders = Counter()
+        incidents = []
+        incident_count = 0
+        forecasts = 0
+        incident = None
+
+        first = last = None
+        started = self.clock.now()
+        wall = time.perf_counter()
+        n = 0
+        for row, processes in self.source:
+            if limit is not None and n >= limit:
+                break
+            now = float(row[_COLUMN['time']])
+            if first is None:
+                first = now
+            if self.speed:
+                self.clock.sleep(started + (now - first) / self.speed - self.clock.now())
+            self.sampler.buffer.append(row)
+            last = now
+            n += 1
+
+            tick = time.perf_counter()
+            score, why = self.scorer.score_sample(dict(zip(SAMPLE_FIELDS, row.tolist())))
+            scores.append(score)
+            reasons.update(why)
+            stages['phs'] += time.perf_counter() - tick
+
+            tick = time.perf_counter()
+            self.anomalies.follow()
+            found = self.anomalies.anomalies() if self.anomalies.detector.warm() else []
+            for feature, _, _, severity, level in found:
+                anomalies[(feature, level)] += 1
+            if found:
+                if processes is not None:
+                    for resource, top in explain(found, processes()).items():
+                        if top:
+                            offenders[(resource, top[0][1])] += 1
+                peak = max(severity for *_, severity, _ in found)
+                if incident is None:
+                    incident = {'start': now, 'end': now, 'features': set(), 'peak': peak}
+                    incident_count += 1
+                incident['end'] = now
+                incident['features'].update(feature for feature, *_ in found)
+                incident['peak'] = max(incident['peak'], peak)
+            elif incident is not None:
+                if len(incidents) < MAX_INCIDENTS:
+                    incidents.append(incident)
+                incident = None
+            stages['bottlenecks'] += time.perf_counter() - tick
+
+            if n % self.forecast_every == 0:
+                tick = time.perf_counter()
+                self.forecaster.refit()
+                forecasts += 1
+                stages['forecast'] += time.perf_counter() - tick
+
+        if incident is not None and len(incidents) < MAX_INCIDENTS:
+            incidents.append(incident)
+        wall = time.perf_counter() - wall
+        return self._report(n, first, last, wall, stages, np.asarray(scores), reasons, anomalies, offenders,
+                            incidents, incident_count, forecasts)
+
+    def _report(self, n, first, last, wall, stages, scores, reasons, anomalies, offenders, incidents, incident_count, forecasts):
+        simulated = (last - first) if n else 0.0
+        report = {
+            'samples': n,
+            'speed': self.speed or 'max',
+            'simulated_seconds': simulated,
+            'wall_seconds': wall,
+            'samples_per_second': n / wall if wall > 0 else 0.0,
+            'speedup': simulated / wall if wall > 0 else 0.0,
+            'stages': {stage: {'seconds': seconds, 'per_sample_us': seconds / n * 1e6 if n else 0.0}
+                       for stage, seconds in stages.items()},
+            'phs': {},
+            'reasons': dict(reasons.most_common()),
+            'anomalies': {},
+            'incidents': {'count': incident_count, 'list': [
+                dict(incident, features=sorted(incident['features'])) for incident in incidents]},
+            'offenders': {},
+            'forecasts': {'refits': forecasts, 'latest': {}},
+        }
+        if n:
+            report['phs'] = {
+                'mean': float(scores.mean()),
+                'min': float(scores.min()),
+                'p5': float(np.percentile(scores, 5)),
+                'below_80': float((scores < 80).mean()),
+                'below_50': float((scores < 50).mean()),
+            }
+        for (feature, level), count in sorted(anomalies.items()):
+            report['anomalies'].setdefault(feature, {})[level] = count
+        for (resource, name), count in offenders.most_common():
+            top = report['offenders'].setdefault(resource, {})
+            if len(top) < 5:
+                top[name] = count
+        for metric in self.forecaster.metrics:
+            forecast = self.forecaster.get(metric, HORIZONS[0])
+            if forecast is not None:
+                report['forecasts']['latest'][metric] = float(forecast['mean'][-1])
+        return report
+
+
+def parse_duration(text):
+    # '7d', '12h', '30m', '90s' or plain seconds
+    units = {'d': 86400, 'h': 3600, 'm': 60, 's': 1}
+    text = str(text).strip()
+    if text and text[-1] in units:
+        return float(text[:-1]) * units[text[-1]]
+    return float(text)
+
+
+def parse_time(text):
+    # Epoch seconds or anything pandas reads as a timestamp (naive means UTC)
+    if text is None:
+        return None
+    try:
+        return float(text)
+    except ValueError:
+        stamp = pd.Timestamp(text)
+        return (stamp if stamp.tzinfo else stamp.tz_localize('UTC')).timestamp()
+
+
+def main(argv=None):
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Replay recorded or synthetic samples through the PHS, bottleneck and forecast pipelines")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--store', metavar='DIR', help="monitor.py output directory (process_data)")
+    source.add_argument('--batches', nargs='+', metavar='FILE', help="agent batch files, e.g. 'agent_spool/*.bin'")
+    source.add_argument('--synthetic', metavar='DURATION', help="generate this much data, e.g. 7d")
+    parser.add_argument('--speed', default='max', help="1 for recorded pace, 100 for 100x, or max (default)")
+    parser.add_argument('--simulated-clock', action='store_true', help="pace on a simulated clock instead of sleeping")
+    parser.add_argument('--start', help="first sample to replay (epoch seconds or ISO time)")
+    parser.add_argument('--end', help="last sample to replay")
+    parser.add_argument('--cpus', type=int, help="core count of the recorded host (--store; default: this machine's)")
+    parser.add_argument('--host', help="host to replay when batches hold several (--batches)")
+    parser.add_argument('--interval', type=float, default=1.0, help="sample spacing in seconds (--synthetic)")
+    parser.add_argument('--incident', nargs=4, action='append', metavar=('OFFSET', 'LENGTH', 'FIELD', 'VALUE'),
+                        help="inject an incident into synthetic data, e.g. 2h 10m cpu 97")
+    parser.add_argument('--weights', help="PHS weight overrides, e.g. cpu=0.5,memory=0.2")
+    parser.add_argument('--normalizers', help="PHS full-load values, e.g. disk=2000,network=1000 (MB/s)")
+    parser.add_argument('--limit', type=int, help="stop after this many samples")
+    parser.add_argument('--output', help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    if args.store:
+        samples = store_source(args.store, parse_time(args.start), parse_time(args.end), args.cpus)
+    elif args.batches:
+        samples = batch_source(args.batches, args.host)
+    else:
+        incidents = [(parse_duration(offset), parse_duration(length), field, float(value))
+                     for offset, length, field, value in args.incident or ()]
+        samples = synthetic_source(parse_duration(args.synthetic), args.interval, parse_time(args.start), incidents=incidents)
+
+    speed = None if args.speed == 'max' else float(args.speed)
+    scorer = PHSScorer(parse_components(args.weights), parse_components(args.normalizers))
+    engine = ReplayEngine(samples, speed, SimulatedClock() if args.simulated_clock else None, args.interval, scorer=scorer)
+    text = json.dumps(engine.run(args.limit), indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
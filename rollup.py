@@ -0,0 +1,219 @@
+import threading
+
+import numpy as np
+
+from instrument import timed
+from sampler import RingBuffer
+
+
+ROLLUP_STATS = ('min', 'max', 'avg', 'p95')
+
+# (bucket seconds, buckets kept): 1m for 30 days, 1h for a year
+DEFAULT_TIERS = ((60, 30 * 24 * 60), (3600, 365 * 24))
+
+# A tier is only used when the range holds at most this many of its points per pixel column;
+# finer tiers are preferred so downsampling has real detail to pick from
+MAX_POINTS_PER_PIXEL = 4
+
+
+def lttb(x, y, threshold):
+    # Largest-Triangle-Three-Buckets: keeps first and last points and, per bucket,
+    # the point forming the largest triangle with the previous pick and the next bucket's mean
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.intp)
+    picked = np.empty(threshold, dtype=np.intp)
+    picked[0], picked[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        next_lo, next_hi = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_lo:next_hi].mean() if next_hi > next_lo else x[-1]
+        avg_y = y[next_lo:next_hi].mean() if next_hi > next_lo else y[-1]
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        picked[i + 1] = a
+    return picked
+
+
+def minmax(y, threshold, upper=None):
+    # Keeps the lowest and highest point of each bucket, in time order, so spikes survive.
+    # With `upper` the lows come from y and the highs from upper (a min/max band).
+    upper = y if upper is None else upper
+    n = len(y)
+    if threshold >= n or threshold < 2:
+        return np.arange(n)
+    buckets = threshold // 2
+    starts = np.linspace(0, n, buckets + 1).astype(np.intp)[:-1]
+    lows = np.empty(buckets, dtype=np.intp)
+    highs = np.empty(buckets, dtype=np.intp)
+    ends = np.append(starts[1:], n)
+    for i, (lo, hi) in enumerate(zip(starts, ends)):
+        segment = y[lo:hi]
+        lows[i] = lo + int(np.argmin(segment))
+        highs[i] = lo + int(np.argmax(upper[lo:hi]))
+    return np.unique(np.concatenate([lows, highs]))
+
+
+class RollupTier:
+    # Closes one bucket of min/max/avg/p95 per field every `resolution` seconds.
+    # Raw values of the open bucket are kept so p95 is exact, not an estimate of estimates.
+
+    def __init__(self, fields, resolution, size, interval=1.0):
+        self.fields = tuple(fields)
+        self.resolution = resolution
+        columns = ('time',) + tuple(f"{field}_{stat}" for field in self.fields for stat in ROLLUP_STATS)
+        self.buffer = RingBuffer(size, columns)
+        self._bucket = None
+        self._values = np.empty((max(int(resolution / interval), 1) + 1, len(self.fields)))
+        self._n = 0
+
+    def add(self, times, values):
+        # times ascending, values (rows, fields)
+        buckets = times - times % self.resolution
+        # Split wherever the bucket changes; each run is appended in one slice
+        breaks = np.flatnonzero(np.diff(buckets)) + 1
+        for lo, hi in zip(np.r_[0, breaks], np.r_[breaks, len(times)]):
+            if self._bucket is not None and buckets[lo] != self._bucket:
+                self.buffer.append(self._summarize(self._bucket))
+                self._n = 0
+            self._bucket = buckets[lo]
+            self._extend(values[lo:hi])
+
+    def _extend(self, values):
+        need = self._n + len(values)
+        if need > len(self._values):
+            # Sampler faster than expected; grow rather than drop
+            grown = np.empty((max(need, 2 * len(self._values)), self._values.shape[1]))
+            grown[:self._n] = self._values[:self._n]
+            self._values = grown
+        self._values[self._n:need] = values
+        self._n = need
+
+    def _summarize(self, bucket):
+        values = self._values[:self._n]
+        stats = np.stack([values.min(axis=0), values.max(axis=0), values.mean(axis=0),
+                          np.percentile(values, 95, axis=0)], axis=1)
+        return np.concatenate([[bucket], stats.ravel()])
+
+    def rows(self):
+        # Closed buckets plus the one still filling, oldest first
+        rows = self.buffer.last()
+        if self._n:
+            rows = np.vstack([rows, self._summarize(self._bucket)])
+        return rows
+
+    def column(self, field, stat):
+        return self.buffer.fields.index(f"{field}_{stat}")
+
+
+class MetricHistory:
+    # Follows a sampler's ring and keeps rollup tiers up to date, so long ranges are
+    # answered from pre-aggregated buckets instead of millions of raw samples
+
+    def __init__(self, sampler, tiers=DEFAULT_TIERS, interval=10.0):
+        self.sampler = sampler
+        self.interval = interval
+        fields = [field for field in sampler.buffer.fields if field != 'time']
+        self.fields = tuple(fields)
+        self.tiers = [RollupTier(fields, resolution, size, getattr(sampler, 'interval', 1.0))
+                      for resolution, size in tiers]
+        self._last_time = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @timed
+    def follow(self):
+        with self._lock:
+            rows = self.sampler.buffer.last()
+            fields = self.sampler.buffer.fields
+            times = rows[:, fields.index('time')]
+            new = rows[times > self._last_time]
+            if not len(new):
+                return self
+            columns = [fields.index(field) for field in self.fields]
+            for tier in self.tiers:
+                tier.add(new[:, fields.index('time')], new[:, columns])
+            self._last_time = new[-1, fields.index('time')]
+        return self
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="metric-rollups", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while True:
+            try:
+                self.follow()
+            except Exception:
+                pass
+            if self._stop.wait(self.interval):
+                break
+
+    def _series(self, resolution, field, start, end):
+        # (times, avg, min, max) for one resolution; the raw ring has no band
+        if resolution is None:
+            rows = self.sampler.buffer.last()
+            fields = self.sampler.buffer.fields
+            times = rows[:, fields.index('time')]
+            values = rows[:, fields.index(field)]
+            keep = (times >= start) & (times <= end)
+            return times[keep], values[keep], None, None
+        tier = next(tier for tier in self.tiers if tier.resolution == resolution)
+        with self._lock:
+            rows = tier.rows()
+        times = rows[:, 0]
+        keep = (times + tier.resolution > start) & (times <= end)
+        rows = rows[keep]
+        return (rows[:, 0], rows[:, tier.column(field, 'avg')],
+                rows[:, tier.column(field, 'min')], rows[:, tier.column(field, 'max')])
+
+    def resolution_for(self, start, end, width):
+        # Finest source that covers the range without far more points than the viewport can show
+        raw = self.sampler.buffer.last()
+        oldest = raw[0, self.sampler.buffer.fields.index('time')] if len(raw) else end
+        choices = [(getattr(self.sampler, 'interval', 1.0), None, oldest)]
+        for tier in self.tiers:
+            closed = tier.buffer.last()
+            choices.append((tier.resolution, tier.resolution, closed[0, 0] if len(closed) else self._last_time))
+        budget = width * MAX_POINTS_PER_PIXEL
+        fits = [(resolution, first, first <= start + step) for step, resolution, first in choices
+                if (end - max(start, first)) / step <= budget]
+        # Prefer a source that reaches back to the range start; while none does yet,
+        # the one with the oldest data shows the most of the range
+        for resolution, _, covers in fits:
+            if covers:
+                return resolution
+        if fits:
+            return min(fits, key=lambda fit: fit[1])[0]
+        return choices[-1][1]
+
+    @timed
+    def query(self, field, start, end, width=2000, method='lttb'):
+        # Returns {'time', 'value', 'min', 'max', 'resolution'}, at most about `width` points
+        self.follow()
+        resolution = self.resolution_for(start, end, width)
+        times, values, lows, highs = self._series(resolution, field, start, end)
+        if method == 'minmax':
+            # Rollups carry their own extremes; raw samples are their own envelope
+            idx = minmax(values, width) if lows is None else minmax(lows, width, highs)
+        else:
+            idx = lttb(times, values, width)
+        return {
+            'time': times[idx],
+            'value': values[idx],
+            'min': None if lows is None else lows[idx],
+            'max': None if highs is None else highs[idx],
+            'resolution': resolution or getattr(self.sampler, 'interval', 1.0),
+        }
@@ -0,0 +1,293 @@
+import os
+import signal
+import threading
+import time
+
+import numpy as np
+import psutil
+
+from alerts import AlertEngine
+from anomaly import HostAnomalyMonitor
+from instrument import timed
+from rates import DISK_FIELDS, NET_FIELDS, IORates
+from shm_ring import SharedLabels, SharedRingBuffer
+
+
+# Every sample is one fixed-width row of these fields.
+# Disk and network throughput are MB/s, IOPS and packets are per second.
+SAMPLE_FIELDS = ('time', 'cpu', 'memory',
+                 'disk_read', 'disk_write', 'disk_read_iops', 'disk_write_iops',
+                 'net_sent', 'net_recv', 'net_packets_sent', 'net_packets_recv')
+
+MB = 1024 * 1024
+
+# Per-core CPU % and per-device MB/s go in a second ring of fixed-width rows: a slot per core
+# and per device, so a tick is one row write however many there are. Cores or devices past
+# the slots are dropped; a device that goes away keeps its slot (at zero) for the run.
+MAX_CPUS = 256
+MAX_DEVICES = 64
+DEVICE_HISTORY = 600
+
+# Series -> (which label list names its slots, slot count)
+DEVICE_SERIES = {
+    'cpu': ('cpu', MAX_CPUS),
+    'disk_read': ('disk', MAX_DEVICES),
+    'disk_write': ('disk', MAX_DEVICES),
+    'net_sent': ('nic', MAX_DEVICES),
+    'net_recv': ('nic', MAX_DEVICES),
+}
+DEVICE_FIELDS = ('time',) + tuple(f"{series}{i}" for series, (_, slots) in DEVICE_SERIES.items() for i in range(slots))
+
+
+def _device_slices():
+    slices, start = {}, 1
+    for series, (_, slots) in DEVICE_SERIES.items():
+        slices[series] = slice(start, start + slots)
+        start += slots
+    return slices
+
+
+DEVICE_SLICES = _device_slices()
+
+EMPTY_LABELS = {'version': 0, 'cpu': [], 'disk': [], 'nic': []}
+
+
+class RingBuffer:
+    def __init__(self, size, fields=SAMPLE_FIELDS):
+        self.fields = fields
+        self.size = size
+        self._data = np.zeros((size, len(fields)))
+        self._count = 0
+        self._lock = threading.Lock()
+
+    @property
+    def count(self):
+        return self._count
+
+    def append(self, row):
+        with self._lock:
+            self._data[self._count % len(self._data)] = row
+            self._count += 1
+
+    def write_at(self, start, rows):
+        # Rewrites the slots from write count `start` (at most count) on; count ends after the last row
+        with self._lock:
+            idx = np.arange(start, start + len(rows)) % len(self._data)
+            self._data[idx] = rows
+            self._count = start + len(rows)
+
+    def latest(self):
+        with self._lock:
+            if not self._count:
+                return None
+            return self._data[(self._count - 1) % len(self._data)].copy()
+
+    def last(self, n=None):
+        # Oldest first, at most n rows
+        with self._lock:
+            size = len(self._data)
+            n = min(self._count, size) if n is None else min(n, self._count, size)
+            idx = np.arange(self._count - n, self._count) % size
+            return self._data[idx]
+
+
+class DeviceSlots:
+    # First-come slot per device name, stable for the life of the sampler
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.names = []
+        self._index = {}
+        self._key = None
+        self._positions = np.zeros(0, dtype=np.intp)
+
+    def positions(self, names):
+        # Slot of each name, -1 once the slots are full; recomputed only when the names change
+        if names != self._key:
+            for name in names:
+                if name not in self._index and len(self.names) < self.capacity:
+                    self._index[name] = len(self.names)
+                    self.names.append(name)
+            self._positions = np.array([self._index.get(name, -1) for name in names], dtype=np.intp)
+            self._key = names
+        return self._positions
+
+
+class DeviceLabels:
+    # Names behind the device slots when the sampler lives in this process; SharedLabels otherwise
+
+    def __init__(self):
+        self._value = None
+
+    def get(self):
+        return self._value
+
+    def set(self, value):
+        self._value = value
+
+
+class MetricsSampler:
+    def __init__(self, interval=1.0, size=3600, buffer=None, devices=None, labels=None):
+        self.interval = interval
+        self.buffer = RingBuffer(size) if buffer is None else buffer
+        self.devices = RingBuffer(DEVICE_HISTORY, DEVICE_FIELDS) if devices is None else devices
+        self.labels = DeviceLabels() if labels is None else labels
+        self.io_rates = IORates()
+        self._disk_slots = DeviceSlots(MAX_DEVICES)
+        self._nic_slots = DeviceSlots(MAX_DEVICES)
+        self._device_row = np.zeros(len(DEVICE_FIELDS))
+        self._label_key = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @timed
+    def sample(self):
+        io = self.io_rates.sample()
+        return (
+            time.time(),
+            psutil.cpu_percent(),
+            psutil.virtual_memory().percent,
+            io['read_bytes'] / MB,
+            io['write_bytes'] / MB,
+            io['read_count'],
+            io['write_count'],
+            io['bytes_sent'] / MB,
+            io['bytes_recv'] / MB,
+            io['packets_sent'],
+            io['packets_recv'],
+        )
+
+    @timed
+    def sample_devices(self, now):
+        # Reuses the counters sample() just read; only the per-core split is a new psutil call
+        row = self._device_row
+        row[:] = 0
+        row[0] = now
+        cores = np.asarray(psutil.cpu_percent(percpu=True), dtype=np.float64)[:MAX_CPUS]
+        row[DEVICE_SLICES['cpu']][:len(cores)] = cores
+
+        disks, disk_rates = self.io_rates.whole_disks()
+        self._fill(row, self._disk_slots, disks, disk_rates,
+                   (('disk_read', DISK_FIELDS.index('read_bytes')), ('disk_write', DISK_FIELDS.index('write_bytes'))))
+        self._fill(row, self._nic_slots, self.io_rates.net.names, self.io_rates.net.rates,
+                   (('net_sent', NET_FIELDS.index('bytes_sent')), ('net_recv', NET_FIELDS.index('bytes_recv'))))
+
+        # Slots are only ever added, so their counts tell whether the labels changed
+        key = (len(cores), len(self._disk_slots.names), len(self._nic_slots.names))
+        if key != self._label_key:
+            version = (self.labels.get() or EMPTY_LABELS)['version'] + 1
+            self.labels.set({'version': version, 'cpu': [f"cpu{i}" for i in range(len(cores))],
+                             'disk': list(self._disk_slots.names), 'nic': list(self._nic_slots.names)})
+            self._label_key = key
+        return row
+
+    def _fill(self, row, slots, names, rates, series):
+        positions = slots.positions(names)
+        known = positions >= 0
+        for name, column in series:
+            row[DEVICE_SLICES[name]][positions[known]] = rates[known, column] / MB
+
+    def _tick(self):
+        row = self.sample()
+        self.buffer.append(row)
+        self.devices.append(self.sample_devices(row[0]))
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        # Prime cpu_percent and the counter snapshot so the first real sample covers a full interval
+        psutil.cpu_percent()
+        psutil.cpu_percent(percpu=True)
+        self.io_rates.sample()
+        time.sleep(self.io_rates.min_interval)
+        self._tick()
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="metrics-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self._tick()
+            except Exception:
+                # A failed read must not kill the sampler; the next tick retries
+                pass
+
+    def latest(self):
+        row = self.buffer.latest()
+        if row is None:
+            return None
+        return dict(zip(self.buffer.fields, row.tolist()))
+
+    def history(self, field, n=None):
+        return self.buffer.last(n)[:, self.buffer.fields.index(field)]
+
+    def device_history(self, n=None):
+        # (labels, rows): slot names per kind, and device rows oldest first (see DEVICE_SLICES)
+        return self.labels.get() or EMPTY_LABELS, self.devices.last(n)
+
+
+class SharedSampler:
+    # Read-only view of a ring written by run_collector in another process.
+    # Same read API as MetricsSampler, so callbacks don't care which one they get.
+
+    def __init__(self, name):
+        self.buffer = SharedRingBuffer(name, fields=SAMPLE_FIELDS)
+        self.devices = SharedRingBuffer(f"{name}-devices", fields=DEVICE_FIELDS)
+        self.labels = SharedLabels(f"{name}-labels")
+        self.interval = self.buffer.interval
+
+    latest = MetricsSampler.latest
+    history = MetricsSampler.history
+    device_history = MetricsSampler.device_history
+
+    def stop(self):
+        self.buffer.close()
+        self.devices.close()
+        self.labels.close()
+
+
+def run_collector(name, interval=1.0, size=3600, ready=None):
+    # Single sampling process: every gunicorn worker maps this ring instead of polling psutil itself
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+
+    # The main ring goes last: workers wait for it, and it existing means the others do too
+    devices = SharedRingBuffer(f"{name}-devices", DEVICE_HISTORY, DEVICE_FIELDS, create=True,
+                               generation=os.getpid(), interval=interval)
+    labels = SharedLabels(f"{name}-labels", create=True)
+    anomaly_state = SharedLabels(f"{name}-anomalies", create=True)
+    ring = SharedRingBuffer(name, size, SAMPLE_FIELDS, create=True, generation=os.getpid(), interval=interval)
+    sampler = MetricsSampler(interval, buffer=ring, devices=devices, labels=labels).start()
+    # Alerts run once here rather than in every worker
+    alerts = AlertEngine(sampler).start()
+    # So does the host anomaly baseline; workers read what it publishes
+    anomalies = HostAnomalyMonitor(sampler, output=anomaly_state).start()
+    if ready is not None:
+        ready.set()
+    try:
+        while not stop.wait(1.0):
+            pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        anomalies.stop()
+        alerts.stop()
+        sampler.stop()
+        ring.close()
+        devices.close()
+        labels.close()
+        anomaly_state.close()
+
+
+if __name__ == "__main__":
+    import sys
+    run_collector(sys.argv[1] if len(sys.argv) > 1 else 'perf-analyzer')
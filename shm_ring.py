@@ -0,0 +1,203 @@
+import json
+import mmap
+import os
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+
+# Header slots (int64)
+MAGIC = 0x50455246524E4731  # "PERFRNG1"
+_MAGIC, _SIZE, _FIELDS, _COUNT, _GENERATION, _INTERVAL_MS = range(6)
+HEADER_SLOTS = 8
+
+
+def _attach(name):
+    shm = shared_memory.SharedMemory(name=name)
+    # Before 3.13 attaching registers the segment for unlink at exit; only the creator owns it
+    try:
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    except Exception:
+        pass
+    return shm
+
+
+class _FileSegment:
+    # SharedMemory look-alike over a file, for rings kept in a directory (e.g. on /dev/shm)
+
+    def __init__(self, path, create=False, size=0):
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_EXCL if create else os.O_RDWR, 0o600)
+        try:
+            if create:
+                os.ftruncate(fd, size)
+            self.size = os.fstat(fd).st_size
+            self._mmap = mmap.mmap(fd, self.size)
+        finally:
+            os.close(fd)
+        self.buf = memoryview(self._mmap)
+        self.path = path
+
+    def close(self):
+        self.buf.release()
+        self._mmap.close()
+
+    def unlink(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class SharedRingBuffer:
+    # Fixed-width float64 rows in shared memory, written by one process and read by many.
+    # Every slot carries a sequence number that is odd while the writer is inside it (seqlock),
+    # so readers can detect and retry torn reads without taking a lock. With a directory the
+    # ring is the file <directory>/<name>, left for whoever manages the directory to remove;
+    # writable lets several processes write it, as long as they take turns.
+
+    def __init__(self, name, size=3600, fields=None, create=False, generation=0, interval=1.0,
+                 directory=None, writable=False):
+        nfields = len(fields) if fields is not None else None
+        nbytes = 8 * (HEADER_SLOTS + size + size * nfields) if create else 0
+        if directory is not None:
+            self._shm = _FileSegment(os.path.join(directory, name), create, nbytes)
+        elif create:
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=nbytes)
+        else:
+            self._shm = _attach(name)
+
+        self.name = name
+        self.owner = create and directory is None
+        self._header = np.ndarray((HEADER_SLOTS,), dtype=np.int64, buffer=self._shm.buf)
+        if create:
+            self._header[:] = 0
+            self._header[_SIZE] = size
+            self._header[_FIELDS] = nfields
+            self._header[_GENERATION] = generation
+            self._header[_INTERVAL_MS] = int(interval * 1000)
+            self._header[_MAGIC] = MAGIC
+        elif self._header[_MAGIC] != MAGIC:
+            raise ValueError(f"shared memory segment {name!r} is not a metrics ring")
+
+        size = int(self._header[_SIZE])
+        nfields = int(self._header[_FIELDS])
+        if fields is not None and len(fields) != nfields:
+            raise ValueError(f"ring has {nfields} fields, expected {len(fields)}")
+        self.fields = fields
+        self.size = size
+        self._seq = np.ndarray((size,), dtype=np.int64, buffer=self._shm.buf, offset=8 * HEADER_SLOTS)
+        self._data = np.ndarray((size, nfields), dtype=np.float64, buffer=self._shm.buf,
+                                offset=8 * (HEADER_SLOTS + size))
+        if not create and not writable:
+            self._data.flags.writeable = False
+            self._seq.flags.writeable = False
+
+    @property
+    def count(self):
+        return int(self._header[_COUNT])
+
+    @property
+    def generation(self):
+        return int(self._header[_GENERATION])
+
+    @property
+    def interval(self):
+        return self._header[_INTERVAL_MS] / 1000
+
+    def append(self, row):
+        i = self.count % self.size
+        self._seq[i] += 1
+        self._data[i] = row
+        self._seq[i] += 1
+        self._header[_COUNT] += 1
+
+    def write_at(self, start, rows):
+        # Rewrites the slots from write count `start` (at most count) on, each under its seqlock,
+        # and leaves the count after the last row
+        for j, row in enumerate(rows):
+            i = (start + j) % self.size
+            self._seq[i] += 1
+            self._data[i] = row
+            self._seq[i] += 1
+        self._header[_COUNT] = start + len(rows)
+
+    def view(self):
+        # Zero-copy read-only view of every slot plus the write count; the newest slot may be mid-write
+        return self._data, self.count
+
+    def latest(self, retries=100):
+        for _ in range(retries):
+            count = self.count
+            if not count:
+                return None
+            i = (count - 1) % self.size
+            before = self._seq[i]
+            row = self._data[i].copy()
+            if not before & 1 and self._seq[i] == before:
+                return row
+        raise RuntimeError("writer kept overwriting the newest slot")
+
+    def last(self, n=None, retries=100):
+        for _ in range(retries):
+            count = self.count
+            n_rows = min(count, self.size) if n is None else min(n, count, self.size)
+            idx = np.arange(count - n_rows, count) % self.size
+            before = self._seq[idx]
+            rows = self._data[idx]
+            if not (before & 1).any() and np.array_equal(self._seq[idx], before):
+                return rows
+        raise RuntimeError("writer kept overwriting the requested slots")
+
+    def close(self):
+        # Views must go before the mapping can be released
+        self._header = self._seq = self._data = None
+        self._shm.close()
+        if self.owner:
+            self._shm.unlink()
+
+
+class SharedLabels:
+    # A small JSON document (the names behind a ring's columns) under the same seqlock scheme:
+    # header slots are the sequence number and the document's length in bytes
+
+    def __init__(self, name, size=65536, create=False):
+        if create:
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=16 + size)
+        else:
+            self._shm = _attach(name)
+        self.name = name
+        self.owner = create
+        self._header = np.ndarray((2,), dtype=np.int64, buffer=self._shm.buf)
+        self._data = np.ndarray((self._shm.size - 16,), dtype=np.uint8, buffer=self._shm.buf, offset=16)
+        if create:
+            self._header[:] = 0
+        self._cached = (0, None)
+
+    def set(self, value):
+        data = np.frombuffer(json.dumps(value).encode(), dtype=np.uint8)
+        if len(data) > len(self._data):
+            raise ValueError(f"labels need {len(data)} bytes, segment holds {len(self._data)}")
+        self._header[0] += 1
+        self._data[:len(data)] = data
+        self._header[1] = len(data)
+        self._header[0] += 1
+
+    def get(self, retries=100):
+        # None until the writer has published something; parsed once per version
+        for _ in range(retries):
+            seq = int(self._header[0])
+            if seq & 1:
+                continue
+            if seq == self._cached[0]:
+                return self._cached[1]
+            data = self._data[:int(self._header[1])].tobytes()
+            if int(self._header[0]) == seq:
+                self._cached = (seq, json.loads(data) if data else None)
+                return self._cached[1]
+        raise RuntimeError("writer kept rewriting the labels")
+
+    def close(self):
+        self._header = self._data = None
+        self._shm.close()
+        if self.owner:
+            self._shm.unlink()
@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+
+# Numeric per-process columns, in the order ProcessCollector has always reported them
+NUMERIC_FIELDS = (
+    ('pid', np.int64),
+    ('cpu_percent', np.float64),
+    ('memory_percent', np.float64),
+    ('rss', np.int64),
+    ('num_threads', np.int64),
+    ('read_bytes', np.int64),
+    ('write_bytes', np.int64),
+    ('voluntary_ctx_switches', np.int64),
+    ('involuntary_ctx_switches', np.int64),
+    ('read_bytes_per_sec', np.float64),
+    ('write_bytes_per_sec', np.float64),
+    ('ctx_switches_per_sec', np.float64),
+    ('rss_growth_per_sec', np.float64),
+)
+
+FIELDS = ('pid', 'name') + tuple(field for field, _ in NUMERIC_FIELDS[1:])
+
+
+class NameTable:
+    # Interns process names to small integer codes; append-only, so old snapshots stay readable
+
+    def __init__(self):
+        self.categories = []
+        self._codes = {}
+
+    def code(self, name):
+        code = self._codes.get(name)
+        if code is None:
+            code = self._codes[name] = len(self.categories)
+            self.categories.append(name)
+        return code
+
+    def __len__(self):
+        return len(self.categories)
+
+
+class ProcessSnapshot:
+    # Struct-of-arrays view of one collection tick. Columns are views into buffers that the
+    # collector reuses, so a snapshot (and to_pandas(), which shares them) is valid until the
+    # collector's next-but-one collect(); to_arrow() copies. Host-level values live in `host`.
+
+    def __init__(self, capacity=1024, names=None):
+        self._allocate(capacity)
+        self.names = NameTable() if names is None else names
+        self.n = 0
+        self.host = {}
+
+    def _allocate(self, capacity):
+        self.capacity = capacity
+        self._buffers = {field: np.zeros(capacity, dtype=dtype) for field, dtype in NUMERIC_FIELDS}
+        self._codes = np.zeros(capacity, dtype=np.int32)
+
+    def reset(self, n, names=None):
+        # Contents are about to be overwritten, so growing doesn't copy
+        if n > self.capacity:
+            self._allocate(max(n, 2 * self.capacity))
+        if names is not None:
+            self.names = names
+        self.n = n
+        self.host = {}
+        return self
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, field):
+        if field == 'name':
+            return np.asarray(self.names.categories, dtype=object)[self.codes]
+        return self._buffers[field][:self.n]
+
+    def buffer(self, field):
+        # Whole writable buffer, for collectors filling the snapshot
+        return self._buffers[field]
+
+    @property
+    def codes(self):
+        return self._codes[:self.n]
+
+    def set_names(self, names):
+        code = self.names.code
+        self._codes[:len(names)] = [code(name) for name in names]
+
+    def categorical(self):
+        return pd.Categorical.from_codes(self.codes, self.names.categories)
+
+    def to_pandas(self):
+        # Numeric columns are shared with the snapshot, names are a Categorical over the interned table
+        columns = {'pid': self['pid'], 'name': self.categorical()}
+        columns.update((field, self[field]) for field, _ in NUMERIC_FIELDS[1:])
+        return pd.DataFrame(columns, copy=False)
+
+    def to_arrow(self, host=True):
+        # Copies the columns: tables outlive the snapshot, e.g. buffered in a store until its next
+        # flush, long after the collector has refilled these buffers. Names become a dictionary
+        # array; host values are broadcast only here, for formats that need a value per row.
+        arrays = {'pid': pa.array(self['pid'].copy())}
+        categories = pa.array(self.names.categories, pa.string()) if len(self.names) else pa.array([], pa.string())
+        arrays['name'] = pa.DictionaryArray.from_arrays(pa.array(self.codes.copy()), categories)
+        arrays.update((field, pa.array(self[field].copy())) for field, _ in NUMERIC_FIELDS[1:])
+        if host:
+            for key, value in self.host.items():
+                arrays[key] = pa.array(np.full(self.n, value))
+        return pa.table(arrays)
+
+    def to_records(self):
+        # Old list-of-dicts shape, for callers that still want it
+        columns = [self['pid'].tolist(), self['name'].tolist()] + [self[field].tolist() for field, _ in NUMERIC_FIELDS[1:]]
+        rows = [dict(zip(FIELDS, values)) for values in zip(*columns)]
+        for row in rows:
+            row.update(self.host)
+        return rows
+
+
+class SnapshotPool:
+    # Two snapshots filled alternately, so the one handed out last tick stays intact while
+    # the next is written. They share a name table, replaced once it is mostly names of
+    # long-gone processes; the snapshot still out keeps the old one.
+
+    def __init__(self, capacity=1024):
+        self.names = NameTable()
+        self._snapshots = [ProcessSnapshot(capacity, self.names), ProcessSnapshot(capacity, self.names)]
+        self._turn = 0
+
+    def next(self, n):
+        snapshot = self._snapshots[self._turn]
+        self._turn ^= 1
+        if len(self.names) > max(4096, 4 * n):
+            self.names = NameTable()
+        return snapshot.reset(n, self.names)
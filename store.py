@@ -0,0 +1,194 @@
+import os
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+# Layout: <root>/<YYYY-MM-DD>/<HH>/{seg-*.parquet, compact-*.parquet}, hours in UTC
+PARTITION_FORMAT = "%Y-%m-%d/%H"
+TIME_COLUMN = "timestamp"
+
+
+def _partition(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).strftime(PARTITION_FORMAT)
+
+
+def _hour_start(ts):
+    return ts - ts % 3600
+
+
+class TimeSeriesStore:
+    def __init__(self, root, schema, flush_rows=5000, flush_interval=60,
+                 retention_hours=24 * 7, compact_interval=300, compact_min_segments=4,
+                 row_group_size=65536):
+        self.root = root
+        self.schema = schema
+        self._row_schema = schema.remove(schema.get_field_index(TIME_COLUMN))
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.retention_hours = retention_hours
+        self.compact_interval = compact_interval
+        self.compact_min_segments = compact_min_segments
+        self.row_group_size = row_group_size
+
+        self._pending = []
+        self._pending_rows = 0
+        self._pending_since = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._compactor = None
+        os.makedirs(root, exist_ok=True)
+
+    # -- writing --
+
+    def append(self, rows, ts=None):
+        ts = time.time() if ts is None else ts
+        table = rows if isinstance(rows, pa.Table) else pa.Table.from_pylist(rows, schema=self._row_schema)
+        if TIME_COLUMN not in table.column_names:
+            table = table.append_column(TIME_COLUMN, pa.array([ts] * table.num_rows, pa.float64()))
+        table = table.select(self.schema.names).cast(self.schema)
+
+        with self._lock:
+            self._pending.append(table)
+            self._pending_rows += table.num_rows
+            if self._pending_since is None:
+                self._pending_since = ts
+            due = (self._pending_rows >= self.flush_rows
+                   or ts - self._pending_since >= self.flush_interval
+                   or _partition(ts) != _partition(self._pending_since))
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self._pending_rows = 0
+            self._pending_since = None
+            if not pending:
+                return
+            table = pa.concat_tables(pending)
+            # A buffer may straddle an hour boundary; split it per partition
+            times = table[TIME_COLUMN].to_numpy()
+            starts = times - times % 3600
+            for start in sorted(set(starts.tolist())):
+                part = table.filter(pa.array(starts == start))
+                self._write(os.path.join(self.root, _partition(start)), "seg", part)
+
+    def _write(self, directory, prefix, table):
+        os.makedirs(directory, exist_ok=True)
+        name = f"{prefix}-{int(time.time() * 1000):013d}-{uuid.uuid4().hex[:8]}.parquet"
+        tmp = os.path.join(directory, "." + name + ".tmp")
+        pq.write_table(table, tmp, row_group_size=self.row_group_size)
+        # Readers never see a half-written file
+        os.replace(tmp, os.path.join(directory, name))
+
+    # -- background maintenance --
+
+    def start(self):
+        if self._compactor is None:
+            self._stop.clear()
+            self._compactor = threading.Thread(target=self._maintain, name="store-compactor", daemon=True)
+            self._compactor.start()
+        return self
+
+    def close(self):
+        self._stop.set()
+        if self._compactor is not None:
+            self._compactor.join()
+            self._compactor = None
+        self.flush()
+
+    def _maintain(self):
+        while not self._stop.wait(self.compact_interval):
+            try:
+                self.flush()
+                self.compact()
+                self.enforce_retention()
+            except Exception:
+                pass
+
+    def _partitions(self):
+        for day in sorted(os.listdir(self.root)):
+            day_dir = os.path.join(self.root, day)
+            if not os.path.isdir(day_dir):
+                continue
+            for hour in sorted(os.listdir(day_dir)):
+                hour_dir = os.path.join(day_dir, hour)
+                try:
+                    start = datetime.strptime(f"{day}/{hour}", PARTITION_FORMAT).replace(tzinfo=timezone.utc).timestamp()
+                except ValueError:
+                    continue
+                yield start, hour_dir
+
+    @staticmethod
+    def _files(directory):
+        try:
+            return sorted(os.path.join(directory, f) for f in os.listdir(directory)
+                          if f.endswith(".parquet") and not f.startswith("."))
+        except FileNotFoundError:
+            return []
+
+    def compact(self, now=None):
+        now = time.time() if now is None else now
+        current = _hour_start(now)
+        for start, directory in self._partitions():
+            files = self._files(directory)
+            segments = [f for f in files if os.path.basename(f).startswith("seg-")]
+            # Closed hours are merged down to one file; the open hour only once enough segments pile up
+            if not segments or (start >= current and len(segments) < self.compact_min_segments):
+                continue
+            if len(files) < 2:
+                continue
+            table = pq.read_table(files, schema=self.schema).sort_by(TIME_COLUMN)
+            with self._lock:
+                self._write(directory, "compact", table)
+                for f in files:
+                    os.remove(f)
+
+    def enforce_retention(self, now=None):
+        now = time.time() if now is None else now
+        cutoff = _hour_start(now) - self.retention_hours * 3600
+        for start, directory in list(self._partitions()):
+            if start < cutoff:
+                with self._lock:
+                    shutil.rmtree(directory, ignore_errors=True)
+        for day in os.listdir(self.root):
+            day_dir = os.path.join(self.root, day)
+            if os.path.isdir(day_dir) and not os.listdir(day_dir):
+                os.rmdir(day_dir)
+
+    # -- reading --
+
+    def read(self, start, end=None, columns=None):
+        end = time.time() if end is None else end
+        first = _hour_start(start)
+        wanted = []
+        hour = first
+        while hour <= end:
+            wanted.append(os.path.join(self.root, _partition(hour)))
+            hour += 3600
+
+        for _ in range(3):
+            files = [f for directory in wanted for f in self._files(directory)]
+            if not files:
+                return self.schema.empty_table() if columns is None else self.schema.empty_table().select(columns)
+            try:
+                table = pq.read_table(files, schema=self.schema, columns=columns and list(dict.fromkeys([TIME_COLUMN] + list(columns))),
+                                      filters=[(TIME_COLUMN, ">=", start), (TIME_COLUMN, "<=", end)])
+                break
+            except FileNotFoundError:
+                # The compactor replaced a segment between listing and reading
+                continue
+        else:
+            raise RuntimeError("partitions kept changing while reading")
+
+        table = table.sort_by(TIME_COLUMN)
+        return table.select(columns) if columns else table
+
+    def read_df(self, start, end=None, columns=None):
+        return self.read(start, end, columns).to_pandas()
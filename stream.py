@@ -0,0 +1,236 @@
+import json
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from instrument import timed
+from sampler import DEVICE_SERIES, DEVICE_SLICES
+
+
+# Samples a new subscriber is sent to start from (the live chart keeps 300 points)
+BACKLOG = 300
+# Per-core/per-device rows sent with each poll, and to a new subscriber to bridge the time until
+# its breakdown figures are drawn (the browser skips what the figures already hold)
+DEVICE_BACKLOG = 16
+# Seconds of silence before a comment line goes out, so proxies keep the connection open
+KEEPALIVE = 15.0
+# Milliseconds a browser waits before reconnecting, e.g. after being dropped as too slow
+RETRY_MS = 2000
+
+
+def encode_sample(fields, row):
+    # One SSE frame; the id lets a reconnecting EventSource resume via Last-Event-ID
+    sample = dict(zip(fields, np.round(row, 3).tolist()))
+    # Time stays exact: a resuming client sends it back and subscribe() compares it with the ring
+    sample['time'] = float(row[fields.index('time')])
+    return f"id: {sample['time']!r}\nevent: sample\ndata: {json.dumps(sample, separators=(',', ':'))}\n\n".encode()
+
+
+def encode_devices(labels, row):
+    # Breakdown row for the heatmap and sparklines, only the slots with a device behind them.
+    # No id: Last-Event-ID keeps pointing at the last sample.
+    devices = {'time': float(row[0]), 'version': labels['version']}
+    for series, (kind, _) in DEVICE_SERIES.items():
+        values = row[DEVICE_SLICES[series]][:len(labels[kind])]
+        devices[series] = values.round().astype(int).tolist() if series == 'cpu' else np.round(values, 3).tolist()
+    return f"event: devices\ndata: {json.dumps(devices, separators=(',', ':'))}\n\n".encode()
+
+
+class Subscriber:
+    # One client's bounded queue of encoded frames, filled by the broadcaster
+
+    def __init__(self):
+        self.queue = deque()
+        self.closed = False
+
+
+class Broadcaster:
+    # Follows one sampler's ring on a single thread and hands each new sample (and, for the local
+    # sampler, its device row), encoded once, to every subscriber's queue. Publishing never waits on a client: one whose queue is full is
+    # dropped, and its EventSource reconnects and catches up from the ring via Last-Event-ID.
+    # get_source() returns the sampler (or fleet view) to follow, looked up on every poll.
+
+    def __init__(self, get_source, max_queue=64, max_clients=1000, backlog=BACKLOG, keepalive=KEEPALIVE):
+        self.get_source = get_source
+        self.max_queue = max_queue
+        self.max_clients = max_clients
+        self.backlog = backlog
+        self.keepalive = keepalive
+        self.subscribers = set()
+        self.published = 0
+        self.dropped = 0
+        self._last_time = None
+        self._last_device_time = None
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="stream-broadcaster", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._cond:
+            for subscriber in self.subscribers:
+                subscriber.closed = True
+            self.subscribers.clear()
+            self._cond.notify_all()
+
+    def _run(self):
+        while not self._stop.wait(max(getattr(self.get_source(), 'interval', 1.0) / 2, 0.05)):
+            try:
+                self.poll()
+            except Exception:
+                # A fleet host can vanish or change shape; try again next tick
+                continue
+
+    def _rows_after(self, buffer, since, limit):
+        # Ring rows newer than since, at most limit of them. Usually only a row or two is new:
+        # read a short tail and widen it only while every row in it is new.
+        times_at = buffer.fields.index('time')
+        n = min(16, limit)
+        while True:
+            rows = buffer.last(n)
+            if len(rows) < n or since is None or rows[0, times_at] <= since or n >= limit:
+                break
+            n = min(n * 8, limit)
+        return rows if since is None else rows[rows[:, times_at] > since]
+
+    def _device_rows(self, source):
+        # (labels, rows) of the per-core/per-device ring; the local sampler has one, agents don't
+        if not hasattr(source, 'device_history'):
+            return None, np.zeros((0, 1))
+        return source.device_history(DEVICE_BACKLOG)
+
+    @timed
+    def poll(self):
+        source = self.get_source()
+        if source is None or self._last_time is None:
+            return 0
+        buffer = source.buffer
+        rows = self._rows_after(buffer, self._last_time, self.backlog)
+        labels, devices = self._device_rows(source)
+        devices = devices[devices[:, 0] > (self._last_device_time or 0.0)]
+        if not len(rows) and not len(devices):
+            return 0
+        frames = [encode_sample(buffer.fields, row) for row in rows]
+        frames += [encode_devices(labels, row) for row in devices]
+        with self._cond:
+            for subscriber in list(self.subscribers):
+                # Only a client still sitting on earlier frames is slow; a big batch alone isn't
+                if subscriber.queue and len(subscriber.queue) + len(frames) > self.max_queue:
+                    self._drop(subscriber)
+                else:
+                    subscriber.queue.extend(frames)
+            if len(rows):
+                self._last_time = float(rows[-1, buffer.fields.index('time')])
+            if len(devices):
+                self._last_device_time = float(devices[-1, 0])
+            self.published += len(frames)
+            self._cond.notify_all()
+        return len(frames)
+
+    def _drop(self, subscriber):
+        subscriber.closed = True
+        subscriber.queue.clear()
+        self.subscribers.discard(subscriber)
+        self.dropped += 1
+
+    def subscribe(self, since=None):
+        # -> Subscriber primed with the backlog after `since` (the last event the client saw),
+        # or None when the client limit is reached
+        source = self.get_source()
+        with self._cond:
+            if len(self.subscribers) >= self.max_clients:
+                return None
+            subscriber = Subscriber()
+            if source is not None:
+                buffer = source.buffer
+                rows = buffer.last(self.backlog)
+                times = rows[:, buffer.fields.index('time')]
+                if self._last_time is None:
+                    self._last_time = float(times[-1]) if len(times) else 0.0
+                # Exactly what was published up to now; poll() sends everything after it
+                rows = rows[(times <= self._last_time) & (times > (since or 0.0))]
+                labels, devices = self._device_rows(source)
+                if self._last_device_time is None:
+                    self._last_device_time = float(devices[-1, 0]) if len(devices) else 0.0
+                devices = devices[devices[:, 0] <= self._last_device_time]
+                if len(rows) or len(devices):
+                    subscriber.queue.append(b''.join([encode_sample(buffer.fields, row) for row in rows] +
+                                                     [encode_devices(labels, row) for row in devices]))
+            self.subscribers.add(subscriber)
+        self.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._cond:
+            subscriber.closed = True
+            self.subscribers.discard(subscriber)
+
+    def events(self, subscriber):
+        # Generator of byte chunks for one response: whatever is queued, or a keepalive comment
+        # after `keepalive` seconds of nothing. Ends when the subscriber is dropped or closed.
+        try:
+            yield f"retry: {RETRY_MS}\n\n".encode()
+            while True:
+                with self._cond:
+                    deadline = time.monotonic() + self.keepalive
+                    while not subscriber.queue and not subscriber.closed:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0 or not self._cond.wait(remaining):
+                            break
+                    chunk = b''.join(subscriber.queue)
+                    subscriber.queue.clear()
+                    closed = subscriber.closed
+                if closed:
+                    return
+                yield chunk or b": keepalive\n\n"
+        finally:
+            self.unsubscribe(subscriber)
+
+
+def register_stream(server, get_source, max_queue=64, max_clients=1000):
+    # GET /stream?host=<name>[&since=<time>] on the Flask server: text/event-stream of samples.
+    # get_source(host) -> the sampler (or fleet view) for that host, or None if it is unknown.
+    # One broadcaster per host, made on first use; returns the dict of them.
+    import flask
+
+    broadcasters = {}
+    lock = threading.Lock()
+
+    def broadcaster_for(host):
+        with lock:
+            broadcaster = broadcasters.get(host)
+            if broadcaster is None:
+                broadcaster = broadcasters[host] = Broadcaster(lambda: get_source(host), max_queue, max_clients)
+            return broadcaster
+
+    @server.route('/stream')
+    def stream():
+        host = flask.request.args.get('host', 'local')
+        if get_source(host) is None:
+            return flask.Response(f"unknown host {host!r}\n", status=404, mimetype='text/plain')
+        # A reconnecting EventSource says where it left off; a fresh one may pass ?since=
+        since = flask.request.headers.get('Last-Event-ID') or flask.request.args.get('since')
+        try:
+            since = float(since) if since else None
+        except ValueError:
+            since = None
+        broadcaster = broadcaster_for(host)
+        subscriber = broadcaster.subscribe(since)
+        if subscriber is None:
+            return flask.Response("too many viewers\n", status=503, mimetype='text/plain', headers={'Retry-After': '5'})
+        return flask.Response(broadcaster.events(subscriber), mimetype='text/event-stream',
+                              headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+    return broadcasters
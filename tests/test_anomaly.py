@@ -0,0 +1,45 @@
+import time
+
+from anomaly import HostAnomalyMonitor
+from sampler import SAMPLE_FIELDS, DeviceLabels, RingBuffer
+
+
+class FakeSampler:
+    def __init__(self):
+        self.buffer = RingBuffer(100)
+        self.interval = 0.01
+
+    def add(self, t, cpu):
+        row = [0.0] * len(SAMPLE_FIELDS)
+        row[SAMPLE_FIELDS.index('time')] = t
+        row[SAMPLE_FIELDS.index('cpu')] = cpu
+        self.buffer.append(row)
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_baseline_learns_without_a_reader():
+    sampler = FakeSampler()
+    output = DeviceLabels()
+    monitor = HostAnomalyMonitor(sampler, output=output, warmup=20).start()
+    try:
+        # More samples than the ring holds go by while nobody asks; none may be skipped
+        for t in range(150):
+            sampler.add(1_700_000_000.0 + t, 10.0 + t % 3)
+            if t % 10 == 9:
+                assert wait_for(lambda: monitor.detector.progress() == t + 1)
+        assert wait_for(lambda: (output.get() or {}).get('progress') == 150)
+        state = output.get()
+        assert state['warm'] and state['warmup'] == 20 and state['anomalies'] == []
+
+        sampler.add(1_700_000_150.0, 95.0)
+        assert wait_for(lambda: monitor.get()['progress'] == 151)
+        feature, value, center, score, label = monitor.get()['anomalies'][0]
+        assert (feature, value, label) == ('cpu', 95.0, 'critical')
+    finally:
+        monitor.stop()
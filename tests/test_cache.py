@@ -0,0 +1,111 @@
+import multiprocessing
+import os
+import time
+
+import dash
+from dash import Input, Output, State, html
+
+from cache import FileBackend, ResultCache, cache_callbacks
+
+
+def compute_once(directory, key, counter):
+    # One "worker": its own ResultCache over the shared directory; each compute leaves a line
+    cache = ResultCache(FileBackend(directory), ttl=60)
+
+    def compute():
+        with open(counter, 'a') as f:
+            f.write(f"{os.getpid()}\n")
+        time.sleep(0.2)
+        return b'result'
+
+    assert cache.get_or_compute(key, compute) == b'result'
+
+
+def computes(counter):
+    try:
+        with open(counter) as f:
+            return len(f.read().split())
+    except FileNotFoundError:
+        return 0
+
+
+def test_workers_share_one_computation(tmp_path):
+    directory, counter = str(tmp_path / 'cache'), str(tmp_path / 'computes')
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=compute_once, args=(directory, 'key', counter)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+    assert computes(counter) == 1
+
+    # A worker started afterwards reads it too
+    compute_once(directory, 'key', counter)
+    assert computes(counter) == 1
+
+
+def test_expiry_is_seen_by_every_worker(tmp_path):
+    directory = str(tmp_path)
+    first, second = ResultCache(FileBackend(directory)), ResultCache(FileBackend(directory))
+    first.get_or_compute('key', lambda: b'old', ttl=0.1)
+    assert second.get_or_compute('key', lambda: b'new') == b'old'
+    time.sleep(0.15)
+    assert second.get_or_compute('key', lambda: b'new') == b'new'
+    assert first.get_or_compute('key', lambda: b'newer') == b'new'
+
+
+def test_uncacheable_results_are_not_stored(tmp_path):
+    cache = ResultCache(FileBackend(str(tmp_path)))
+    assert cache.get_or_compute('key', lambda: None) is None
+    assert cache.get_or_compute('key', lambda: b'value') == b'value'
+
+
+def test_eviction_drops_least_recently_used(tmp_path):
+    backend = FileBackend(str(tmp_path), maxsize=4)
+    for i in range(32):
+        backend.set(f"key-{i}", b'x', 60)
+        # mtimes order the LRU; keep them apart on coarse clocks
+        os.utime(backend._path(f"key-{i}"), (i, i))
+    assert [backend.get(f"key-{i}") for i in range(28, 32)] == [b'x'] * 4
+    assert backend.get('key-0') is None
+
+
+def make_app(directory, calls):
+    app = dash.Dash(__name__)
+    app.layout = html.Div([html.Div(id='n'), html.Div(id='other'), html.Div(id='out')])
+
+    @app.callback(Output('out', 'children'), Input('n', 'value'), State('other', 'value'))
+    def render(n, other):
+        calls.append((n, other))
+        return f"{n}-{other}"
+
+    cache_callbacks(app, {render: ['n.value']}, ResultCache(FileBackend(directory), ttl=60))
+    client = app.server.test_client()
+
+    def post(n, other):
+        response = client.post('/_dash-update-component', json={
+            'output': 'out.children',
+            'outputs': {'id': 'out', 'property': 'children'},
+            'inputs': [{'id': 'n', 'property': 'value', 'value': n}],
+            'state': [{'id': 'other', 'property': 'value', 'value': other}],
+            'changedPropIds': ['n.value'],
+        })
+        assert response.status_code == 200
+        return response.get_json()['response']['out']['children']
+
+    return post
+
+
+def test_callback_key_follows_vary_inputs(tmp_path):
+    # Two apps over one directory stand in for two gunicorn workers
+    calls = []
+    first, second = make_app(str(tmp_path), calls), make_app(str(tmp_path), calls)
+    assert first(1, 'a') == '1-a'
+    assert second(1, 'a') == '1-a'
+    # other isn't in vary, so it doesn't change the key
+    assert second(1, 'b') == '1-a'
+    assert second(2, 'b') == '2-b'
+    assert first(2, 'a') == '2-b'
+    assert first(3, 'a') == '3-a'
+    assert calls == [(1, 'a'), (2, 'b'), (3, 'a')]
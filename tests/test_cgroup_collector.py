@@ -0,0 +1,23 @@
+import os
+
+import cgroup_collector
+from cgroup_collector import CgroupCollector
+from fake_cgroupfs import FakeCgroupfs
+
+
+def test_cgroup_removed_during_walk_is_skipped(tmp_path, monkeypatch):
+    fs = FakeCgroupfs(str(tmp_path / 'cgroup'), containers=10, churn=0.0)
+    collector = CgroupCollector(fs.root, total_memory=2 ** 34)
+    gone = os.path.join(fs.root, sorted(fs._groups)[0])
+    stat = os.stat
+
+    def vanishing(path, *args, **kwargs):
+        # The cgroup is listed by scandir, then removed before it is stat'ed
+        if os.fspath(path) == gone:
+            raise FileNotFoundError(path)
+        return stat(path, *args, **kwargs)
+
+    monkeypatch.setattr(cgroup_collector.os, 'stat', vanishing)
+    frame = collector.collect()
+    assert len(frame) == 9
+    assert os.path.relpath(gone, fs.root) not in frame['cgroup'].tolist()
@@ -0,0 +1,59 @@
+import pytest
+
+import collector
+from fake_psutil import AccessDenied, FakePsutil
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    fake = FakePsutil(processes=20, churn=0.0)
+    monkeypatch.setattr(collector, 'psutil', fake)
+    return fake
+
+
+def rows(snapshot):
+    return {row['pid']: row for row in snapshot.to_records()}
+
+
+def test_reused_pid_gets_a_new_entry(fake):
+    c = collector.ProcessCollector()
+    c.collect()
+    pid = fake.pids()[0]
+    old = c._tracked[pid]
+    # The PID now belongs to a new process: new create time, new name, counters from zero
+    fake._procs[pid] = dict(fake._procs[pid], name='newcomer', create_time=fake._procs[pid]['create_time'] + 5,
+                            born=fake._elapsed())
+    row = rows(c.collect())[pid]
+    assert c._tracked[pid] is not old
+    assert row['name'] == 'newcomer'
+    # First read of the new process: no rate against the old one's counters
+    assert row['cpu_percent'] == 0.0
+
+
+def test_known_pids_are_not_rechecked(fake, monkeypatch):
+    checks = []
+    process = type(fake.Process(fake.pids()[0]))
+    monkeypatch.setattr(process, 'is_running', lambda self: checks.append(self.pid) or True)
+    c = collector.ProcessCollector()
+    for _ in range(3):
+        c.collect()
+    assert checks == []
+
+
+def test_access_denied_processes_stay_listed(fake, monkeypatch):
+    c = collector.ProcessCollector()
+    pid = fake.pids()[3]
+
+    def denied(self):
+        if self.pid == pid:
+            raise AccessDenied(pid)
+        return original(self)
+
+    original = type(fake.Process(pid)).memory_info
+    monkeypatch.setattr(type(fake.Process(pid)), 'memory_info', denied)
+    c.collect()
+    snapshot = c.collect()
+    assert len(snapshot) == 20
+    row = rows(snapshot)[pid]
+    assert row['name'] == fake._procs[pid]['name']
+    assert (row['rss'], row['cpu_percent'], row['voluntary_ctx_switches'], row['read_bytes_per_sec']) == (0, 0.0, 0, 0.0)
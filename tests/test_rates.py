@@ -0,0 +1,29 @@
+from collections import namedtuple
+
+from rates import NET_FIELDS, WRAP_32, CounterRates
+
+
+snetio = namedtuple('snetio', NET_FIELDS)
+
+
+def rate(before, after):
+    rates = CounterRates(NET_FIELDS)
+    rates.update({'eth0': snetio(before, 0, 0, 0)}, now=0.0)
+    _, values = rates.update({'eth0': snetio(after, 0, 0, 0)}, now=1.0)
+    return values[0, 0]
+
+
+def test_increasing_counter():
+    assert rate(1000, 5000) == 4000
+
+
+def test_32_bit_wrap_counts_across_the_limit():
+    assert rate(WRAP_32 - 1000, 500) == 1500
+
+
+def test_reset_is_not_a_wrap():
+    # e.g. the interface bounced: the counter starts again from zero
+    assert rate(50_000_000, 1000) == 0
+    assert rate(WRAP_32 - 1000, 3_000_000_000) == 0
+    # 64-bit counters never wrap in practice
+    assert rate(WRAP_32 * 10, 1000) == 0
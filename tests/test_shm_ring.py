@@ -0,0 +1,90 @@
+import fcntl
+import multiprocessing
+import os
+import uuid
+
+import pytest
+
+from shm_ring import SharedRingBuffer
+
+
+FIELDS = ['time', 'a', 'b', 'c']
+
+
+def write_uniform(name, n):
+    # Every row is one value repeated, so a row mixing two writes shows up as unequal columns
+    ring = SharedRingBuffer(name, fields=FIELDS, writable=True)
+    for k in range(1, n + 1):
+        ring.append([float(k)] * len(FIELDS))
+    ring.close()
+
+
+def write_locked(directory, name, writer, n):
+    ring = SharedRingBuffer(name, fields=FIELDS, directory=directory, writable=True)
+    with open(os.path.join(directory, name + '.lock'), 'a') as lock:
+        for k in range(n):
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                ring.append([float(writer), float(k), float(writer), float(k)])
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+    ring.close()
+
+
+def test_readers_never_see_torn_rows():
+    ring = SharedRingBuffer(f"test-ring-{uuid.uuid4().hex[:12]}", size=64, fields=FIELDS, create=True)
+    writer = multiprocessing.get_context('fork').Process(target=write_uniform, args=(ring.name, 200_000))
+    writer.start()
+    try:
+        reads = 0
+        while writer.is_alive() or reads == 0:
+            row = ring.latest()
+            if row is not None:
+                assert (row == row[0]).all()
+            rows = ring.last(32)
+            assert (rows == rows[:, :1]).all()
+            reads += 1
+        writer.join()
+        assert writer.exitcode == 0
+        assert ring.count == 200_000
+        assert ring.latest().tolist() == [200_000.0] * len(FIELDS)
+    finally:
+        writer.join()
+        ring.close()
+
+
+def test_writers_taking_turns_lose_nothing(tmp_path):
+    directory = str(tmp_path)
+    ring = SharedRingBuffer('host.ring', size=4096, fields=FIELDS, create=True, directory=directory)
+    context = multiprocessing.get_context('fork')
+    writers = [context.Process(target=write_locked, args=(directory, 'host.ring', w, 500)) for w in range(4)]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+        assert writer.exitcode == 0
+
+    assert ring.count == 2000
+    rows = ring.last()
+    assert (rows[:, 0] == rows[:, 2]).all() and (rows[:, 1] == rows[:, 3]).all()
+    for w in range(4):
+        assert rows[rows[:, 0] == w, 1].tolist() == [float(k) for k in range(500)]
+    ring.close()
+
+
+def test_slot_mid_write_is_not_returned():
+    ring = SharedRingBuffer(f"test-ring-{uuid.uuid4().hex[:12]}", size=8, fields=FIELDS, create=True)
+    try:
+        ring.append([1.0] * len(FIELDS))
+        ring.append([2.0] * len(FIELDS))
+        # Freeze the writer halfway through the newest slot
+        ring._seq[1] += 1
+        ring._data[1, :2] = 3.0
+        with pytest.raises(RuntimeError):
+            ring.latest(retries=3)
+        with pytest.raises(RuntimeError):
+            ring.last(2, retries=3)
+        # The older slot is still readable
+        assert ring._data[0].tolist() == [1.0] * len(FIELDS)
+    finally:
+        ring.close()
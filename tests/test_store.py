@@ -0,0 +1,52 @@
+import pyarrow as pa
+
+from snapshot import SnapshotPool
+from store import TimeSeriesStore
+
+
+SCHEMA = pa.schema([('timestamp', pa.float64()), ('pid', pa.int64()), ('name', pa.string()),
+                    ('cpu_percent', pa.float64()), ('rss', pa.int64())])
+
+
+def fill(snapshot, tick, n=4):
+    pids = snapshot.buffer('pid')
+    cpu = snapshot.buffer('cpu_percent')
+    rss = snapshot.buffer('rss')
+    for i in range(n):
+        pids[i] = tick * 100 + i
+        cpu[i] = tick + i / 10
+        rss[i] = tick * 1000 + i
+    snapshot.set_names([f"proc-{tick}-{i}" for i in range(n)])
+    return snapshot
+
+
+def test_buffered_snapshots_survive_buffer_reuse(tmp_path):
+    # The pool hands out the same two buffers alternately; every tick must still read back as written
+    store = TimeSeriesStore(str(tmp_path), SCHEMA, flush_rows=10 ** 6, flush_interval=10 ** 6)
+    pool = SnapshotPool(capacity=8)
+    start = 1_700_000_000.0
+    for tick in range(3):
+        snapshot = fill(pool.next(4), tick)
+        store.append(snapshot.to_arrow().select(['pid', 'name', 'cpu_percent', 'rss']), ts=start + tick)
+    # Overwrite both buffers again before anything is flushed
+    fill(pool.next(4), 7)
+    fill(pool.next(4), 8)
+    store.flush()
+
+    df = store.read_df(start, start + 10)
+    assert len(df) == 12
+    for tick in range(3):
+        rows = df[df['timestamp'] == start + tick]
+        assert rows['pid'].tolist() == [tick * 100 + i for i in range(4)]
+        assert rows['cpu_percent'].tolist() == [tick + i / 10 for i in range(4)]
+        assert rows['rss'].tolist() == [tick * 1000 + i for i in range(4)]
+        assert rows['name'].tolist() == [f"proc-{tick}-{i}" for i in range(4)]
+
+
+def test_to_pandas_shares_and_to_arrow_copies():
+    pool = SnapshotPool(capacity=8)
+    snapshot = fill(pool.next(4), 1)
+    frame, table = snapshot.to_pandas(), snapshot.to_arrow()
+    snapshot.buffer('pid')[0] = -1
+    assert frame['pid'].iloc[0] == -1
+    assert table['pid'][0].as_py() == 100
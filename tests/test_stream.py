@@ -0,0 +1,171 @@
+import json
+import re
+
+import flask
+
+from sampler import DEVICE_FIELDS, DEVICE_SLICES, SAMPLE_FIELDS, RingBuffer
+from stream import Broadcaster, register_stream
+
+
+class FakeSource:
+    # Stands in for a sampler: a ring and a long interval, so the broadcaster's own thread
+    # stays asleep and the tests drive poll() themselves
+
+    def __init__(self, times=()):
+        self.buffer = RingBuffer(1000)
+        self.interval = 3600.0
+        for t in times:
+            self.add(t)
+
+    def add(self, t):
+        row = [0.0] * len(SAMPLE_FIELDS)
+        row[SAMPLE_FIELDS.index('time')] = float(t)
+        self.buffer.append(row)
+
+
+class FakeLocalSource(FakeSource):
+    # The local sampler also has per-core/per-device rows, two cores and one disk here
+
+    def __init__(self, times=()):
+        self.devices = RingBuffer(100, DEVICE_FIELDS)
+        self.labels = {'version': 1, 'cpu': ['cpu0', 'cpu1'], 'disk': ['sda'], 'nic': []}
+        super().__init__(times)
+
+    def add(self, t):
+        super().add(t)
+        row = [0.0] * len(DEVICE_FIELDS)
+        row[0] = float(t)
+        row[DEVICE_SLICES['cpu'].start] = 12.4
+        row[DEVICE_SLICES['disk_read'].start] = 0.12345
+        self.devices.append(row)
+
+    def device_history(self, n=None):
+        return self.labels, self.devices.last(n)
+
+
+def ids(data):
+    return [float(t) for t in re.findall(rb'^id: (.*)$', data, re.M)]
+
+
+def device_rows(data):
+    return [json.loads(row) for row in re.findall(rb'^event: devices\ndata: (.*)$', data, re.M)]
+
+
+def drain(subscriber):
+    data = b''.join(subscriber.queue)
+    subscriber.queue.clear()
+    return ids(data)
+
+
+def test_slow_subscriber_is_dropped():
+    source = FakeSource(range(1, 4))
+    broadcaster = Broadcaster(lambda: source, max_queue=4)
+    try:
+        fast, slow = broadcaster.subscribe(), broadcaster.subscribe()
+        assert drain(fast) == [1.0, 2.0, 3.0]
+
+        for t in range(4, 7):
+            source.add(t)
+        assert broadcaster.poll() == 3
+        assert drain(fast) == [4.0, 5.0, 6.0]
+        # Backlog chunk plus three frames: full, but not over
+        assert not slow.closed and len(slow.queue) == 4
+
+        source.add(7)
+        broadcaster.poll()
+        assert slow.closed and not slow.queue
+        assert broadcaster.subscribers == {fast} and broadcaster.dropped == 1
+        assert drain(fast) == [7.0]
+
+        # A burst bigger than the queue still goes to a client that had caught up
+        for t in range(8, 20):
+            source.add(t)
+        assert broadcaster.poll() == 12
+        assert not fast.closed and drain(fast) == [float(t) for t in range(8, 20)]
+    finally:
+        broadcaster.stop()
+
+
+def test_subscribe_resumes_after_since():
+    source = FakeSource(range(1, 11))
+    broadcaster = Broadcaster(lambda: source)
+    try:
+        subscriber = broadcaster.subscribe(since=7.0)
+        assert drain(subscriber) == [8.0, 9.0, 10.0]
+        source.add(11)
+        broadcaster.poll()
+        assert drain(subscriber) == [11.0]
+        # Nothing published is missed or repeated by a client resuming from the middle
+        resumed = broadcaster.subscribe(since=9.0)
+        assert drain(resumed) == [10.0, 11.0]
+    finally:
+        broadcaster.stop()
+
+
+def test_resume_from_sub_millisecond_time():
+    # The id a client resumes from is the exact time, so the last sample it saw isn't sent again
+    source = FakeSource([1760000000.5, 1760000001.123456, 1760000002.9876])
+    broadcaster = Broadcaster(lambda: source)
+    try:
+        first = broadcaster.subscribe()
+        seen = drain(first)
+        assert seen == [1760000000.5, 1760000001.123456, 1760000002.9876]
+        assert drain(broadcaster.subscribe(since=seen[1])) == [1760000002.9876]
+        assert drain(broadcaster.subscribe(since=seen[2])) == []
+    finally:
+        broadcaster.stop()
+
+
+def test_last_event_id_resumes_stream():
+    source = FakeSource(range(1, 11))
+    server = flask.Flask(__name__)
+    broadcasters = register_stream(server, lambda host: source if host == 'local' else None)
+    client = server.test_client()
+    try:
+        response = client.get('/stream', headers={'Last-Event-ID': '6.0'}, buffered=False)
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        chunks = iter(response.response)
+        assert next(chunks).startswith(b'retry: ')
+        assert ids(next(chunks)) == [7.0, 8.0, 9.0, 10.0]
+        response.close()
+
+        # ?since= does the same for a fresh EventSource; a bad id starts from the backlog
+        response = client.get('/stream?since=9', buffered=False)
+        chunks = iter(response.response)
+        next(chunks)
+        assert ids(next(chunks)) == [10.0]
+        response.close()
+
+        response = client.get('/stream', headers={'Last-Event-ID': 'garbage'}, buffered=False)
+        chunks = iter(response.response)
+        next(chunks)
+        assert ids(next(chunks)) == [float(t) for t in range(1, 11)]
+        response.close()
+
+        assert client.get('/stream?host=elsewhere').status_code == 404
+    finally:
+        for broadcaster in broadcasters.values():
+            broadcaster.stop()
+
+
+def test_device_rows_follow_the_samples():
+    source = FakeLocalSource(range(1, 4))
+    broadcaster = Broadcaster(lambda: source)
+    try:
+        subscriber = broadcaster.subscribe(since=2.0)
+        data = b''.join(subscriber.queue)
+        subscriber.queue.clear()
+        # The sample after since, and recent device rows for the browser to pick from; only samples carry ids
+        assert ids(data) == [3.0]
+        devices = device_rows(data)
+        assert [row['time'] for row in devices] == [1.0, 2.0, 3.0]
+        assert devices[-1] == {'time': 3.0, 'version': 1, 'cpu': [12, 0], 'disk_read': [0.123], 'disk_write': [0.0],
+                               'net_sent': [], 'net_recv': []}
+
+        source.add(4)
+        assert broadcaster.poll() == 2
+        data = b''.join(subscriber.queue)
+        assert ids(data) == [4.0] and [row['time'] for row in device_rows(data)] == [4.0]
+    finally:
+        broadcaster.stop()